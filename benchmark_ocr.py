@@ -0,0 +1,29 @@
+import json
+import sys
+from pathlib import Path
+import yaml
+from core.ocr_engine import benchmark_engines
+
+
+def main(config_path="config.yaml", max_pages=10):
+    """在临时图片目录中的页面上对比PaddleOCR与ONNX Runtime引擎"""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+
+    image_dir = Path(config['output']['image_dir'])
+    image_paths = sorted(
+        (p for p in image_dir.glob('*') if p.suffix.lower() in {'.png', '.jpg', '.jpeg'}),
+        key=lambda p: int(p.stem.split('_')[-1])
+    )[:max_pages]
+    if not image_paths:
+        print(f"在目录 {image_dir} 中没有找到图片，请先运行PDF转图片步骤")
+        return None
+
+    print(f"基准测试页数: {len(image_paths)}")
+    report = benchmark_engines(config, image_paths)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
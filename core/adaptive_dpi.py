@@ -0,0 +1,100 @@
+import fitz  # PyMuPDF
+from utils.image_utils import render_page
+
+
+def _merge_rects(rects):
+    """合并相交的矩形，直到没有重叠为止"""
+    merged = [fitz.Rect(r) for r in rects]
+    changed = True
+    while changed:
+        changed = False
+        result = []
+        for rect in merged:
+            for existing in result:
+                if existing.intersects(rect):
+                    existing.include_rect(rect)
+                    changed = True
+                    break
+            else:
+                result.append(fitz.Rect(rect))
+        merged = result
+    return merged
+
+
+class AdaptiveDPIOCR:
+    """两遍OCR：低DPI整页检测，仅对小字号区域按需用高DPI裁剪后重新识别"""
+
+    def __init__(self, config, ocr_func):
+        adaptive_cfg = config.get('adaptive_dpi', {})
+        self.output_dpi = config['processing']['dpi']
+        self.low_dpi = adaptive_cfg.get('low_dpi', 150)  # 第一遍检测DPI
+        self.max_dpi = adaptive_cfg.get('max_dpi', self.output_dpi)  # 小字号区域重新栅格化的DPI上限
+        self.min_text_height = adaptive_cfg.get('min_text_height', 28)  # OCR可靠识别所需的文字高度(像素)
+        self.region_padding = adaptive_cfg.get('region_padding', 6)  # 裁剪区域外扩(pt)
+        self.ocr_func = ocr_func  # 输入RGB数组，返回 rec_texts/rec_scores/rec_boxes 字典
+
+    def process_page(self, page):
+        """对单页执行自适应DPI OCR，返回输出分辨率坐标系下的识别结果"""
+        low_scale = self.low_dpi / 72
+        out_scale = self.output_dpi / 72
+
+        low_result = self.ocr_func(render_page(page, self.low_dpi))
+
+        # 按低分辨率下的文字高度区分大字号与小字号文本
+        small_rects = []
+        region_heights = []
+        keep = []
+        for text, score, box in zip(low_result["rec_texts"], low_result["rec_scores"], low_result["rec_boxes"]):
+            height = box[3] - box[1]
+            if height < self.min_text_height:
+                rect = fitz.Rect(*[v / low_scale for v in box])
+                rect = rect + (-self.region_padding, -self.region_padding, self.region_padding, self.region_padding)
+                small_rects.append(rect & page.rect)
+                region_heights.append((rect, height))
+            else:
+                keep.append((text, score, [v / low_scale for v in box]))
+
+        regions = _merge_rects(small_rects)
+        texts, scores, boxes = [], [], []
+        for text, score, box in keep:
+            # 落入重新识别区域的低分辨率结果会被高分辨率结果替代
+            center = fitz.Point((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)
+            if any(center in region for region in regions):
+                continue
+            texts.append(text)
+            scores.append(score)
+            boxes.append(box)
+
+        for region in regions:
+            if region.is_empty:
+                continue
+            # 按区域内最小文字高度计算所需DPI
+            min_height = min(h for rect, h in region_heights if rect.intersects(region))
+            dpi = min(self.max_dpi, self.low_dpi * self.min_text_height / max(min_height, 1))
+            dpi = max(int(dpi), self.low_dpi)
+            clip_scale = dpi / 72
+            clip_result = self.ocr_func(render_page(page, dpi, clip=region))
+            for text, score, box in zip(clip_result["rec_texts"], clip_result["rec_scores"],
+                                        clip_result["rec_boxes"]):
+                texts.append(text)
+                scores.append(score)
+                boxes.append([
+                    box[0] / clip_scale + region.x0,
+                    box[1] / clip_scale + region.y0,
+                    box[2] / clip_scale + region.x0,
+                    box[3] / clip_scale + region.y0
+                ])
+
+        # 页面坐标(pt)映射回输出图片分辨率
+        rec_boxes = [[int(round(v * out_scale)) for v in box] for box in boxes]
+        return {
+            "rec_texts": texts,
+            "rec_scores": scores,
+            "rec_boxes": rec_boxes,
+            "dt_polys": [[[b[0], b[1]], [b[2], b[1]], [b[2], b[3]], [b[0], b[3]]] for b in rec_boxes],
+            "adaptive_dpi": {
+                "low_dpi": self.low_dpi,
+                "output_dpi": self.output_dpi,
+                "regions": [[round(v, 2) for v in region] for region in regions]
+            }
+        }
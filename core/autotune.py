@@ -0,0 +1,270 @@
+import json
+import math
+import tempfile
+import time
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+from utils import resources
+from utils.metrics import metrics
+from .deadline import DeadlineExceeded
+
+# 调优可能改写的配置项，任务结束时恢复原值
+TUNED_KEYS = (
+    ("processing", "rasterize_threads"),
+    ("page_buffers", "loader_workers"),
+    ("ocr", "cpu_threads"),
+    ("ocr", "onnx", "intra_op_threads"),
+    ("processing", "thread_count"),
+    ("translation", "max_parallel_langs"),
+    ("translation", "max_inflight_requests"),
+)
+
+
+def _get(config, path, default=None):
+    for key in path[:-1]:
+        config = config.get(key) or {}
+    return config.get(path[-1], default)
+
+
+def _set(config, path, value):
+    for key in path[:-1]:
+        config = config.setdefault(key, {})
+    config[path[-1]] = value
+
+
+class AutoTuner:
+    """扫描件并发数自动调优：先对前几页试运行栅格化、解码、OCR、翻译与渲染，
+    再结合进程可用的CPU核数与内存(含cgroup限制)为后续各阶段设置并发数
+
+    决策直接写入本次任务的配置(与截止时间降级DPI的方式相同)，由 restore 在任务结束时恢复。
+    试运行的翻译结果交给翻译器在正式翻译时复用，不重复消耗token。
+    """
+
+    def __init__(self, config):
+        tune_cfg = config.get('auto_tune', {})
+        self.config = config
+        self.enabled = tune_cfg.get('enabled', False)
+        self.probe_pages = max(1, tune_cfg.get('probe_pages', 3))
+        self.probe_requests = tune_cfg.get('probe_requests', 4)
+        self.max_inflight = max(1, tune_cfg.get('max_inflight_requests', 16))  # API限流允许的并发请求数
+        self.memory_fraction = tune_cfg.get('memory_fraction', 0.7)  # 可用内存中允许页面数据占用的比例
+
+    def tune(self, translator, pages=None):
+        """试运行并应用调优结果，pages为本次需要处理的页索引(从0开始)，返回决策；未启用时返回None"""
+        if not self.enabled:
+            return None
+        with fitz.open(self.config['input']['pdf_path']) as doc:
+            page_count = doc.page_count
+        pages = list(range(page_count)) if pages is None else list(pages)
+        if not pages:
+            return None
+
+        print(f"\n自动调优: 试运行前 {min(self.probe_pages, len(pages))} 页...")
+        try:
+            samples, latencies = self.probe(translator, pages[:self.probe_pages])
+        except Exception as e:
+            print(f"自动调优试运行失败，使用配置中的并发设置: {str(e)}")
+            return None
+        if not samples:
+            print("没有可试运行的页面(均为分块页面)，使用配置中的并发设置")
+            return None
+
+        limits = resources.describe()
+        decisions = self.decide(samples, latencies, translator, len(pages), limits)
+        self.apply(decisions)
+        translator.configure_concurrency()
+        self._report(limits, samples, latencies, decisions)
+        return decisions
+
+    # ---------- 试运行 ----------
+
+    def probe(self, translator, pages):
+        """逐页测量各阶段耗时，返回 (每页样本, 翻译请求延迟列表)"""
+        from pdf2image import convert_from_path
+        from PIL import Image
+        from .image_ocr import ImageOCRProcessor
+        from .ocr_engine import create_ocr_engine
+        from .page_tiling import PageTiler
+
+        pdf_path = self.config['input']['pdf_path']
+        dpi = self.config['processing']['dpi']
+        langs = [lang for lang in translator.target_langs if lang != translator.source_lang]
+        ocr = ImageOCRProcessor(self.config)
+        tiler = PageTiler(self.config)
+        engine = create_ocr_engine(self.config)
+
+        samples, latencies = [], []
+        with fitz.open(pdf_path) as doc, tempfile.TemporaryDirectory(prefix="pdf_autotune_") as work_dir:
+            for index in pages:
+                # 分块页面的内存占用由图块大小决定，不参与试运行
+                if tiler.should_tile(doc[index]):
+                    continue
+                page_num = index + 1
+                sample = {"page": page_num}
+
+                start = time.perf_counter()
+                image = convert_from_path(pdf_path, dpi=dpi, first_page=page_num, last_page=page_num)[0]
+                sample["rasterize"] = time.perf_counter() - start
+                sample["page_bytes"] = image.width * image.height * 3  # 解码后的RGB数组大小
+                image_path = Path(work_dir) / f"page_{page_num}.jpg"
+                image.save(image_path, 'JPEG')
+
+                start = time.perf_counter()
+                with Image.open(image_path) as img:
+                    img.convert('RGB').load()
+                sample["decode"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                result = ocr._text_layer_result(page_num)
+                if result is None:
+                    result = ocr._predict_page(engine, image_path)
+                sample["ocr"] = time.perf_counter() - start
+
+                segments = translator.build_segments(result) or []
+                sample["segments"] = len(segments)
+                for segment in segments:
+                    if not langs or len(latencies) >= self.probe_requests:
+                        break
+                    start = time.perf_counter()
+                    try:
+                        translator.prefetch_translation(segment["text"], langs[len(latencies) % len(langs)])
+                    except DeadlineExceeded:
+                        break
+                    latencies.append(time.perf_counter() - start)
+
+                sample["render"] = 0.0
+                if segments:
+                    # 以原文代替译文执行擦除与排版，测量单页渲染与编码耗时
+                    boxes = [{"coords": segment["coords"], "erase_boxes": segment["line_boxes"],
+                              "text": [segment["text"]]} for segment in segments]
+                    start = time.perf_counter()
+                    img = Image.open(image_path).convert('RGB')
+                    translator.draw_boxes(img, boxes)
+                    img.save(Path(work_dir) / f"render_{page_num}.jpg", quality=100)
+                    sample["render"] = time.perf_counter() - start
+                samples.append(sample)
+                print(f"试运行第{page_num}页: 栅格化 {sample['rasterize']:.2f}s, 解码 {sample['decode']:.2f}s, "
+                      f"OCR {sample['ocr']:.2f}s, 渲染 {sample['render']:.2f}s, 段落 {len(segments)}")
+        ocr.close()
+        return samples, latencies
+
+    # ---------- 决策 ----------
+
+    def decide(self, samples, latencies, translator, page_count, limits):
+        """按实测耗时与资源限制计算各阶段并发数，返回 {配置路径: (取值, 原因)}"""
+        cpus = limits["available_cpus"]
+        memory = limits["available_memory"]
+        budget = memory * self.memory_fraction if memory else None
+        page_bytes = max(sample["page_bytes"] for sample in samples)
+
+        def average(key):
+            return sum(sample[key] for sample in samples) / len(samples)
+
+        def fit(count, per_worker):
+            """内存预算能容纳的并发数"""
+            if budget is None:
+                return max(1, count)
+            return max(1, min(count, int(budget // per_worker)))
+
+        decisions = {}
+        # 栅格化：pdftoppm进程数不超过可用核数，每个进程同时持有一页位图
+        rasterize = fit(min(cpus, page_count), page_bytes)
+        decisions[("processing", "rasterize_threads")] = (rasterize, f"{cpus} 个可用核, 单页 {page_bytes / 2**20:.0f}MB")
+
+        # OCR：图片解码超过OCR耗时的10%时用后台进程解码，解码进程数使解码速度跟上OCR；其余核心留给OCR推理
+        ocr_seconds, decode_seconds = average("ocr"), average("decode")
+        if cpus > 1 and ocr_seconds > 0 and decode_seconds > 0.1 * ocr_seconds:
+            # 每个解码进程预先占用两个页面缓冲区
+            loaders = fit(min(cpus - 1, math.ceil(decode_seconds / ocr_seconds)), 2 * page_bytes)
+        else:
+            loaders = 0
+        decisions[("page_buffers", "loader_workers")] = (
+            loaders, f"解码 {decode_seconds:.2f}s/页, OCR {ocr_seconds:.2f}s/页")
+        ocr_threads = max(1, cpus - loaders)
+        engine_path = ("ocr", "onnx", "intra_op_threads") if self.config.get('ocr', {}).get('engine') == "onnx" \
+            else ("ocr", "cpu_threads")
+        decisions[engine_path] = (ocr_threads, f"{cpus} 个可用核减去 {loaders} 个解码进程")
+
+        # 翻译：请求为I/O等待，每页并发请求数取每页段落数与API并发上限；
+        # 并行语言数受渲染占用的CPU与每个语言同时持有的页面图片限制
+        langs = max(1, len([lang for lang in translator.target_langs if lang != translator.source_lang]))
+        parallel_langs = min(max(1, self.config.get('translation', {}).get('max_parallel_langs', 3)),
+                             langs, fit(cpus, page_bytes))
+        decisions[("translation", "max_parallel_langs")] = (
+            parallel_langs, f"{langs} 种目标语言, 渲染 {average('render'):.2f}s/页")
+        if latencies:
+            latency = sum(latencies) / len(latencies)
+            per_page = max(1, min(math.ceil(average("segments")), self.max_inflight // parallel_langs))
+            reason = f"请求延迟 {latency:.2f}s, 每页 {average('segments'):.1f} 段"
+        else:
+            per_page = max(1, self.config['processing'].get('thread_count', 4))
+            reason = "未测得翻译延迟，保持配置值"
+        decisions[("processing", "thread_count")] = (per_page, reason)
+        decisions[("translation", "max_inflight_requests")] = (
+            min(self.max_inflight, parallel_langs * per_page), f"API并发上限 {self.max_inflight}")
+        return decisions
+
+    def apply(self, decisions):
+        """写入调优结果，原值保存在 config['auto_tune']['base'] 中"""
+        tune_cfg = self.config.setdefault('auto_tune', {})
+        base = tune_cfg.setdefault('base', {})
+        for path, (value, _) in decisions.items():
+            key = ".".join(path)
+            if key not in base:
+                base[key] = _get(self.config, path)
+            _set(self.config, path, value)
+            metrics.set_gauge("autotune_setting", value, setting=key)
+
+    @staticmethod
+    def restore(config):
+        """任务结束：恢复被调优改写的配置项"""
+        base = (config.get('auto_tune') or {}).pop('base', None)
+        if not base:
+            return
+        for path in TUNED_KEYS:
+            key = ".".join(path)
+            if key not in base:
+                continue
+            if base[key] is None:
+                parent = config
+                for part in path[:-1]:
+                    parent = parent.get(part) or {}
+                parent.pop(path[-1], None)
+            else:
+                _set(config, path, base[key])
+
+    # ---------- 报告 ----------
+
+    def _report(self, limits, samples, latencies, decisions):
+        base = self.config['auto_tune'].get('base', {})
+        report = {
+            "pdf": self.config['input']['pdf_path'],
+            "resources": limits,
+            "probe": {
+                "samples": [{k: round(v, 4) if isinstance(v, float) else v for k, v in sample.items()}
+                            for sample in samples],
+                "request_latencies": [round(latency, 3) for latency in latencies],
+            },
+            "decisions": {
+                ".".join(path): {"value": value, "previous": base.get(".".join(path)), "reason": reason}
+                for path, (value, reason) in decisions.items()
+            },
+        }
+
+        memory = limits['available_memory']
+        print("自动调优结果:")
+        print(f"  可用CPU: {limits['available_cpus']} (亲和性 {limits['affinity_cpus']}, cgroup配额 {limits['cpu_quota']}), "
+              f"可用内存: {f'{memory / 2**30:.1f}GB' if memory else '未知'}")
+        for key, entry in report["decisions"].items():
+            print(f"  {key}: {entry['previous']} -> {entry['value']} ({entry['reason']})")
+
+        metrics_cfg = self.config.get('metrics', {})
+        report_dir = Path(metrics_cfg.get('report_dir') or Path(self.config['output']['pdf_dir']) / "metrics")
+        report_dir.mkdir(parents=True, exist_ok=True)
+        path = report_dir / f"{Path(self.config['input']['pdf_path']).stem}_autotune.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"调优报告已保存至: {path}")
+        return str(path)
@@ -0,0 +1,117 @@
+import time
+
+# 运行时写入 config['deadline'] 的键，任务结束时清除
+RUNTIME_KEYS = ("requested", "expires_at", "budget", "base_dpi")
+
+
+class DeadlineExceeded(Exception):
+    """截止时间已到，当前页面不再翻译"""
+
+
+class Deadline:
+    """任务截止时间：跨阶段跟踪剩余时间，并据此给出降级决策
+
+    截止时刻以墙钟时间保存在 config['deadline']['expires_at'] 中，配置始终可pickle，
+    各阶段与子进程按需从配置重建本对象。未设置截止时间时所有判断均为"不降级"。
+    """
+
+    def __init__(self, config):
+        deadline_cfg = config.get('deadline') or {}
+        self.expires_at = deadline_cfg.get('expires_at')
+        self.budget = deadline_cfg.get('budget')
+        self.reserve = deadline_cfg.get('reserve_seconds', 30)  # 留给合并PDF的时间
+        self.low_dpi = deadline_cfg.get('low_dpi', 150)
+        self.low_dpi_seconds_per_page = deadline_cfg.get('low_dpi_seconds_per_page', 15)
+        self.min_retries = max(1, deadline_cfg.get('min_retries', 1))
+        self.batch_under_pressure = deadline_cfg.get('batch_under_pressure', True)
+        self.mark_text = deadline_cfg.get('mark_text', "[未翻译 / NOT TRANSLATED]")
+
+    @staticmethod
+    def request(config, seconds):
+        """登记时间预算但不开始计时，由处理器在确定语言(可能需要交互输入)之后调用 begin 开始计时"""
+        config['deadline'] = dict(config.get('deadline') or {}, requested=float(seconds))
+
+    @staticmethod
+    def requested(config):
+        return (config.get('deadline') or {}).get('requested')
+
+    @staticmethod
+    def begin(config):
+        """按登记的预算开始计时(已开始或未登记时不变)，返回当前的截止时间对象"""
+        deadline_cfg = config.get('deadline') or {}
+        if deadline_cfg.get('requested') and deadline_cfg.get('expires_at') is None:
+            return Deadline.start(config, deadline_cfg['requested'])
+        return Deadline(config)
+
+    @staticmethod
+    def start(config, seconds):
+        """开始计时：把截止时刻写入配置"""
+        config['deadline'] = dict(config.get('deadline') or {},
+                                  expires_at=time.time() + float(seconds), budget=float(seconds))
+        return Deadline(config)
+
+    @staticmethod
+    def clear(config):
+        """任务结束：恢复被降级的DPI并移除运行时键"""
+        deadline_cfg = config.get('deadline')
+        if not deadline_cfg:
+            return
+        if deadline_cfg.get('base_dpi'):
+            config['processing']['dpi'] = deadline_cfg['base_dpi']
+        for key in RUNTIME_KEYS:
+            deadline_cfg.pop(key, None)
+
+    @property
+    def active(self):
+        return self.expires_at is not None
+
+    def remaining(self):
+        """扣除合并预留时间后的剩余秒数"""
+        if not self.active:
+            return float('inf')
+        return max(0.0, self.expires_at - time.time() - self.reserve)
+
+    def expired(self):
+        return self.active and self.remaining() <= 0
+
+    def behind(self, started, done, total):
+        """按当前阶段已完成部分的速度，剩余部分无法在截止前完成"""
+        if not self.active or done <= 0:
+            return False
+        projected = (time.time() - started) / done * (total - done)
+        return projected > self.remaining()
+
+    def cap(self, seconds):
+        """等待或超时时长不超过剩余时间"""
+        return min(seconds, self.remaining())
+
+    def retries(self, max_retries, pressured=False):
+        return min(max_retries, self.min_retries) if pressured else max_retries
+
+    def apply_dpi(self, config, page_count):
+        """预算平均到每页低于阈值时，本次任务改用较低的栅格化DPI，返回使用的DPI"""
+        dpi = config['processing']['dpi']
+        if not self.active or page_count <= 0 or self.low_dpi >= dpi:
+            return dpi
+        if self.budget / page_count >= self.low_dpi_seconds_per_page:
+            return dpi
+        config['deadline']['base_dpi'] = dpi
+        config['processing']['dpi'] = self.low_dpi
+        return self.low_dpi
+
+    @staticmethod
+    def resolution(config):
+        """合并PDF时的图片分辨率：降级DPI后保持与原DPI相同的页面尺寸"""
+        base_dpi = (config.get('deadline') or {}).get('base_dpi')
+        return 72 * config['processing']['dpi'] / base_dpi if base_dpi else 72.0
+
+
+def mark_pdf_pages(doc, text):
+    """在PDF每页顶部加上未翻译标记(非扫描件超时的分片)"""
+    import fitz
+
+    for page in doc:
+        rect = fitz.Rect(page.rect.x0 + 10, page.rect.y0 + 6, page.rect.x1 - 10, page.rect.y0 + 28)
+        page.draw_rect(rect, color=(0.85, 0.1, 0.1), fill=(1, 0.95, 0.8), width=0.8)
+        page.insert_textbox(rect + (4, 3, -4, 0), text, fontname="china-s", fontsize=11, color=(0.85, 0.1, 0.1))
+    return doc.page_count
@@ -0,0 +1,372 @@
+import copy
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils.metrics import metrics
+from .page_manifest import PageManifest
+from .deadline import Deadline
+
+# 每页依次经过的阶段，translate阶段包含翻译与渲染
+STAGES = ("rasterize", "ocr", "translate")
+
+
+class PageJobQueue:
+    """基于SQLite的页面级任务队列，数据库放在各主机共享的目录中
+
+    每页一行记录当前阶段与状态，工作进程以租约方式领取任务并定期续约，
+    租约过期的任务可被其他工作进程重新领取。共享文件系统上不使用WAL模式。
+    """
+
+    def __init__(self, db_path, lease_seconds=300, max_attempts=3):
+        self.db_path = str(db_path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    @contextmanager
+    def _connect(self, immediate=False):
+        # 每次操作使用独立连接，可在心跳线程中安全调用
+        conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def initialize(self, page_count, job_config):
+        """创建队列；已存在相同任务的队列时保留进度(断点续跑)"""
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect(immediate=True) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "page INTEGER PRIMARY KEY, stage TEXT NOT NULL, status TEXT NOT NULL, "
+                "worker TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "error TEXT, updated REAL)"
+            )
+            row = conn.execute("SELECT value FROM meta WHERE key = 'pdf_path'").fetchone()
+            if row and row[0] == job_config['input']['pdf_path']:
+                # 失败页面重新排队，已完成的阶段不再重复
+                conn.execute("UPDATE pages SET status = 'pending', attempts = 0 WHERE status = 'failed'")
+                resumed = True
+            else:
+                conn.execute("DELETE FROM pages")
+                conn.executemany(
+                    "INSERT INTO pages (page, stage, status, updated) VALUES (?, ?, 'pending', ?)",
+                    [(page, STAGES[0], time.time()) for page in range(1, page_count + 1)]
+                )
+                resumed = False
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('pdf_path', ?)", (job_config['input']['pdf_path'],))
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('config', ?)", (json.dumps(job_config),))
+        return resumed
+
+    def load_config(self):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'config'").fetchone()
+        if row is None:
+            raise RuntimeError(f"任务队列尚未初始化: {self.db_path}")
+        return json.loads(row[0])
+
+    def claim(self, worker, translate_ready=True):
+        """领取一个待处理或租约已过期的任务，返回 (页码, 阶段) 或 None"""
+        now = time.time()
+        stages = STAGES if translate_ready else STAGES[:-1]
+        placeholders = ", ".join("?" for _ in stages)
+        with self._connect(immediate=True) as conn:
+            # 优先推进靠后的阶段，让已开始的页面尽快完成
+            row = conn.execute(
+                f"SELECT page, stage FROM pages WHERE stage IN ({placeholders}) "
+                "AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) "
+                "ORDER BY CASE stage WHEN 'translate' THEN 0 WHEN 'ocr' THEN 1 ELSE 2 END, page LIMIT 1",
+                (*stages, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE pages SET status = 'leased', worker = ?, lease_expires = ?, updated = ? WHERE page = ?",
+                (worker, now + self.lease_seconds, now, row[0])
+            )
+        return row[0], row[1]
+
+    def heartbeat(self, worker, page, stage):
+        """续约，返回False表示租约已被其他工作进程接管"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE pages SET lease_expires = ?, updated = ? "
+                "WHERE page = ? AND stage = ? AND worker = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, page, stage, worker)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, worker, page, stage):
+        """完成当前阶段并进入下一阶段"""
+        index = STAGES.index(stage)
+        next_stage, status = (STAGES[index + 1], 'pending') if index + 1 < len(STAGES) else ('done', 'done')
+        with self._connect(immediate=True) as conn:
+            cursor = conn.execute(
+                "UPDATE pages SET stage = ?, status = ?, worker = NULL, lease_expires = NULL, "
+                "attempts = 0, error = NULL, updated = ? WHERE page = ? AND stage = ? AND worker = ?",
+                (next_stage, status, time.time(), page, stage, worker)
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, worker, page, stage, error):
+        """记录失败，未超过最大尝试次数时重新排队"""
+        with self._connect(immediate=True) as conn:
+            conn.execute(
+                "UPDATE pages SET attempts = attempts + 1, error = ?, worker = NULL, lease_expires = NULL, "
+                "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END, updated = ? "
+                "WHERE page = ? AND stage = ? AND worker = ?",
+                (str(error), self.max_attempts, time.time(), page, stage, worker)
+            )
+
+    def summary(self):
+        """各阶段/状态的页数，如 {"ocr/leased": 2, "done/done": 10}"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT stage, status, COUNT(*) FROM pages GROUP BY stage, status").fetchall()
+        return {f"{stage}/{status}": count for stage, status, count in rows}
+
+    def translate_ready(self):
+        """翻译阶段需要全文档OCR完成(用于页眉页脚等重复文本检测)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM pages WHERE stage IN ('rasterize', 'ocr') AND status != 'failed'"
+            ).fetchone()
+        return row[0] == 0
+
+    def finished(self):
+        with self._connect() as conn:
+            row = conn.execute("SELECT COUNT(*) FROM pages WHERE status NOT IN ('done', 'failed')").fetchone()
+        return row[0] == 0
+
+    def failed_pages(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT page, stage, error FROM pages WHERE status = 'failed' ORDER BY page")
+            return rows.fetchall()
+
+
+def shared_layout(config, work_dir):
+    """将各阶段的中间目录指向共享工作目录"""
+    job_config = copy.deepcopy(config)
+    job_config['output'] = dict(
+        job_config['output'],
+        image_dir=str(Path(work_dir) / "images"),
+        json_dir=str(Path(work_dir) / "json"),
+        translated_image_dir=str(Path(work_dir) / "translated"),
+    )
+    # 截止时刻只对本次运行有效，不写入可被续跑任务复用的共享配置
+    Deadline.clear(job_config)
+    return job_config
+
+
+class DistributedWorker:
+    """工作进程：从共享队列中领取页面任务并执行，所有页面完成后退出"""
+
+    def __init__(self, work_dir, worker_id=None):
+        self.work_dir = Path(work_dir)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        bootstrap = PageJobQueue(self.work_dir / "queue.db")
+        self.config = bootstrap.load_config()
+        dist_cfg = self.config.get('distributed', {})
+        self.queue = PageJobQueue(
+            self.work_dir / "queue.db",
+            lease_seconds=dist_cfg.get('lease_seconds', 300),
+            max_attempts=dist_cfg.get('max_attempts', 3)
+        )
+        self.heartbeat_interval = dist_cfg.get('heartbeat_interval', 30)
+        self.poll_interval = dist_cfg.get('poll_interval', 2)
+        # 启用重复文本检测时，翻译阶段需等待全文档OCR完成
+        self.translate_barrier = self.config.get('text_filter', {}).get('recurring_enabled', True)
+        self._ocr = None
+        self._engine = None
+        self._translator = None
+        self._recurring_scanned = False
+
+    def run(self):
+        processed = 0
+        print(f"工作进程 {self.worker_id} 启动, 队列: {self.queue.db_path}")
+        try:
+            while True:
+                ready = not self.translate_barrier or self.queue.translate_ready()
+                job = self.queue.claim(self.worker_id, ready)
+                if job is None:
+                    if self.queue.finished():
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+
+                page, stage = job
+                if self._run_job(page, stage):
+                    processed += 1
+        finally:
+            if self._ocr is not None:
+                self._ocr.dedup.save()
+            if self._translator is not None:
+                self._translator.deduplicator.save()
+        print(f"工作进程 {self.worker_id} 退出, 共完成 {processed} 个任务")
+        return processed
+
+    def _run_job(self, page, stage):
+        """执行任务，期间后台线程定期续约"""
+        stop = threading.Event()
+
+        def keep_alive():
+            while not stop.wait(self.heartbeat_interval):
+                if not self.queue.heartbeat(self.worker_id, page, stage):
+                    print(f"第{page}页 {stage} 租约已失效")
+                    return
+
+        heartbeat = threading.Thread(target=keep_alive, daemon=True)
+        heartbeat.start()
+        try:
+            getattr(self, f"_stage_{stage}")(page)
+        except Exception as e:
+            metrics.inc("stage_errors_total", stage=stage)
+            print(f"第{page}页 {stage} 失败: {str(e)}")
+            self.queue.fail(self.worker_id, page, stage, e)
+            return False
+        finally:
+            stop.set()
+            heartbeat.join()
+        return self.queue.complete(self.worker_id, page, stage)
+
+    def _stage_rasterize(self, page):
+        from .pdf_to_image import PDFToImageConverter
+        PDFToImageConverter(self.config).convert(pages=[page - 1])
+
+    def _stage_ocr(self, page):
+        if self._ocr is None:
+            from .image_ocr import ImageOCRProcessor
+            from .ocr_engine import create_ocr_engine
+            self._ocr = ImageOCRProcessor(self.config)
+            self._engine = create_ocr_engine(self.config)
+        self._ocr.process_page(self._engine, page)
+
+    def _stage_translate(self, page):
+        output = self.config['output']
+        if self._translator is None:
+            from .image_translator import ImageTranslator
+            self._translator = ImageTranslator(self.config)
+        if self.translate_barrier and not self._recurring_scanned:
+            # 屏障之后全部页面的OCR结果都已登记
+            json_files = [path for _, path in self._translator.manifest.load().items("ocr")]
+            self._translator.scan_recurring_text(json_files)
+            self._recurring_scanned = True
+
+        json_file = str(Path(output['json_dir']) / f"page_{page}" / f"page_{page}_res.json")
+        output_dirs = self._translator.output_directories(output['translated_image_dir'])
+        for lang, output_directory in output_dirs.items():
+            if not self._translator.process_single_image(json_file, output['image_dir'], output_directory, lang):
+                raise RuntimeError(f"第{page}页翻译为{lang}失败")
+
+
+def run_worker(work_dir, worker_id=None):
+    """工作进程入口(本机子进程或其他主机上的独立进程)"""
+    return DistributedWorker(work_dir, worker_id).run()
+
+
+class DistributedCoordinator:
+    """协调进程：初始化共享队列、可选启动本机工作进程、等待完成后按页序合并PDF"""
+
+    def __init__(self, config):
+        dist_cfg = config.get('distributed', {})
+        self.config = config
+        self.work_dir = Path(dist_cfg.get('work_dir') or Path(config['output']['pdf_dir']) / "distributed")
+        self.local_workers = dist_cfg.get('local_workers', 2)
+        self.poll_interval = dist_cfg.get('poll_interval', 2)
+        self.queue = PageJobQueue(
+            self.work_dir / "queue.db",
+            lease_seconds=dist_cfg.get('lease_seconds', 300),
+            max_attempts=dist_cfg.get('max_attempts', 3)
+        )
+
+    def _resolve_languages(self, job_config):
+        """远程工作进程无法交互，提前确定源语言与目标语言并写入任务配置"""
+        from .image_translator import ImageTranslator
+        translator = ImageTranslator(self.config)
+        job_config['translation'] = dict(
+            job_config.get('translation', {}),
+            source_lang=translator.source_lang,
+            target_langs=translator.target_langs,
+        )
+        return translator.target_langs
+
+    def run(self):
+        import fitz
+
+        job_config = shared_layout(self.config, self.work_dir)
+        target_langs = self._resolve_languages(job_config)
+        with fitz.open(self.config['input']['pdf_path']) as doc:
+            page_count = doc.page_count
+
+        resumed = self.queue.initialize(page_count, job_config)
+        if not resumed:
+            PageManifest(job_config).reset()
+        print(f"分布式任务{'(续跑)' if resumed else ''}: {page_count}页, 共享目录 {self.work_dir}")
+        print(f"其他主机可运行: python distributed_worker.py {self.work_dir}")
+
+        context = multiprocessing.get_context("spawn")
+        workers = [
+            context.Process(target=run_worker, args=(str(self.work_dir), f"{socket.gethostname()}-local-{i}"))
+            for i in range(self.local_workers)
+        ]
+        for process in workers:
+            process.start()
+
+        last_summary = None
+        while not self.queue.finished():
+            summary = self.queue.summary()
+            if summary != last_summary:
+                print(f"进度: {summary}")
+                last_summary = summary
+            if workers and not any(process.is_alive() for process in workers) and not self.queue.finished():
+                print("本机工作进程已全部退出，等待其他主机的工作进程...")
+                workers = []
+            time.sleep(self.poll_interval)
+        for process in workers:
+            process.join()
+
+        return self._assemble(job_config, target_langs)
+
+    def _assemble(self, job_config, target_langs):
+        """按页序合并各语言的翻译结果，失败页面使用原图"""
+        from .image_to_pdf import ImageToPDFConverter
+
+        failed = self.queue.failed_pages()
+        for page, stage, error in failed:
+            print(f"第{page}页在 {stage} 阶段失败: {error}")
+
+        output = job_config['output']
+        manifest = PageManifest(job_config)
+        converter = ImageToPDFConverter(job_config)
+        multi_lang = len(target_langs) > 1
+        outputs = []
+        for lang in target_langs:
+            lang_dir = Path(output['translated_image_dir']) / lang if multi_lang else Path(output['translated_image_dir'])
+            lang_dir.mkdir(parents=True, exist_ok=True)
+            lang_suffix = f"_{lang}" if lang != "en" else ""
+            for page, _, _ in failed:
+                source = Path(output['image_dir']) / f"page_{page}.jpg"
+                if source.exists():
+                    target = lang_dir / f"translated{lang_suffix}_page_{page}.jpg"
+                    shutil.copyfile(source, target)
+                    manifest.register(page, f"translated:{lang}", target)
+            pdf_path = converter.convert(str(lang_dir), lang if multi_lang else None)
+            if pdf_path:
+                outputs.append(pdf_path)
+
+        if not outputs:
+            return None
+        return outputs if multi_lang else outputs[0]
@@ -0,0 +1,234 @@
+import json
+import math
+import tempfile
+import time
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+from .glossary import Glossary
+from .prompts import estimate_message_tokens, estimate_tokens, pdf2zh_messages, pdf2zh_prompt
+
+
+def sample_indices(page_count, sample_size):
+    """在全文档中均匀抽取页索引(从0开始)"""
+    if page_count <= 0:
+        return []
+    sample_size = max(1, min(sample_size, page_count))
+    step = page_count / sample_size
+    return sorted({min(page_count - 1, int(step * i + step / 2)) for i in range(sample_size)})
+
+
+class JobEstimator:
+    """预估任务的token用量与耗时：只对抽样页面运行文本提取/OCR，不调用翻译API
+
+    各阶段按抽样页面实测的平均耗时外推到全文档，翻译阶段按请求数、配置的单次请求耗时与并发数估算。
+    """
+
+    def __init__(self, config):
+        estimate_cfg = config.get('estimate', {})
+        self.config = config
+        self.sample_size = estimate_cfg.get('sample_pages', 5)
+        self.seconds_per_request = estimate_cfg.get('seconds_per_request', 3.0)  # 单次API请求的预计耗时
+        self.output_token_ratio = estimate_cfg.get('output_token_ratio', 1.2)  # 译文与原文token数之比
+
+    # ---------- 扫描件 ----------
+
+    def estimate_scanned(self, translator):
+        """扫描件：抽样页面栅格化、OCR、分段，并用原文试排版测量渲染耗时"""
+        from pdf2image import convert_from_path
+        from PIL import Image
+        from .image_ocr import ImageOCRProcessor
+        from .ocr_engine import create_ocr_engine
+        from .page_tiling import PageTiler
+
+        pdf_path = self.config['input']['pdf_path']
+        dpi = self.config['processing']['dpi']
+        langs = [lang for lang in translator.target_langs if lang != translator.source_lang]
+        ocr = ImageOCRProcessor(self.config)
+        tiler = PageTiler(self.config)
+
+        setup_start = time.perf_counter()
+        engine = create_ocr_engine(self.config)
+        setup_seconds = time.perf_counter() - setup_start
+
+        samples = []
+        with fitz.open(pdf_path) as doc, tempfile.TemporaryDirectory(prefix="pdf_estimate_") as work_dir:
+            page_count = doc.page_count
+            for index in sample_indices(page_count, self.sample_size):
+                page_num = index + 1
+                sample = {"page": page_num, "rasterize": 0.0, "render": 0.0}
+                print(f"抽样: 第{page_num}页")
+
+                # 分块页面在OCR过程中逐块栅格化，不单独统计栅格化耗时
+                tiled = tiler.should_tile(doc[index])
+                image_path = None
+                if not tiled:
+                    start = time.perf_counter()
+                    image = convert_from_path(pdf_path, dpi=dpi, first_page=page_num, last_page=page_num)[0]
+                    image_path = Path(work_dir) / f"page_{page_num}.jpg"
+                    image.save(image_path, 'JPEG')
+                    sample["rasterize"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                result = ocr._text_layer_result(page_num)
+                if result is None and tiled:
+                    result = tiler.ocr_page(engine, doc[index])
+                elif result is None:
+                    result = ocr._predict_page(engine, image_path)
+                sample["ocr"] = time.perf_counter() - start
+
+                segments = translator.build_segments(result) or []
+                sample["segments"] = len(segments)
+                sample["chars"] = sum(len(segment["text"]) for segment in segments)
+                sample["input_tokens"] = sum(
+                    estimate_message_tokens(translator.build_messages(segment["text"], lang))
+                    for segment in segments for lang in langs
+                ) / max(len(langs), 1)
+                sample["output_tokens"] = sum(estimate_tokens(segment["text"]) for segment in segments) \
+                    * self.output_token_ratio
+
+                if segments and image_path is not None:
+                    # 以原文代替译文执行擦除与排版，测量单页渲染与编码耗时
+                    boxes = [{"coords": segment["coords"], "erase_boxes": segment["line_boxes"],
+                              "text": [segment["text"]]} for segment in segments]
+                    start = time.perf_counter()
+                    img = Image.open(image_path).convert('RGB')
+                    translator.draw_boxes(img, boxes)
+                    img.save(Path(work_dir) / f"render_{page_num}.jpg", quality=100)
+                    sample["render"] = time.perf_counter() - start
+                samples.append(sample)
+        ocr.close()
+
+        concurrency = min(translator.max_parallel_langs, max(len(langs), 1))
+        per_page = self._average(samples)
+        requests_per_lang = per_page["segments"] * page_count
+        stages = {
+            "setup": setup_seconds,
+            "rasterize": per_page["rasterize"] * page_count,
+            "ocr": per_page["ocr"] * page_count,
+            # 每种语言逐页翻译，页内最多 thread_count 个请求并发，多个语言按 max_parallel_langs 并行
+            "translate": math.ceil(len(langs) / concurrency) * page_count
+            * (math.ceil(per_page["segments"] / translator.page_workers) * self.seconds_per_request
+               + per_page["render"]) if langs else 0.0,
+        }
+        return self._report("scanned", page_count, samples, per_page, langs, requests_per_lang, stages,
+                            {"thread_count": translator.page_workers, "max_parallel_langs": concurrency})
+
+    # ---------- 非扫描件 ----------
+
+    def estimate_non_scanned(self, src_lang, target_langs, layout_model=None):
+        """非扫描件：抽样页面运行版面检测与文本提取，按pdf2zh的提示词模板估算token"""
+        import numpy as np
+        from .pdf_sharding import ShardedTranslator
+
+        pdf_path = self.config['input']['pdf_path']
+        langs = [lang for lang in target_langs if lang != src_lang]
+        thread_count = max(1, self.config['non_scanned'].get('thread_count', 4))
+        glossary = Glossary.get(self.config)
+        templates = {lang: pdf2zh_prompt(glossary.find_in_pdf(pdf_path, lang) if glossary.enabled else None)
+                     for lang in langs}
+
+        samples = []
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+            for index in sample_indices(page_count, self.sample_size):
+                page = doc[index]
+                sample = {"page": index + 1, "layout": 0.0}
+                if layout_model is not None:
+                    # 与pdf2zh相同的渲染方式执行一次版面检测
+                    start = time.perf_counter()
+                    pix = page.get_pixmap()
+                    image = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width, 3)[:, :, ::-1]
+                    layout_model.predict(image, imgsz=int(pix.height / 32) * 32)
+                    sample["layout"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                paragraphs = []
+                for block in page.get_text("dict")["blocks"]:
+                    if block.get("type") != 0:
+                        continue
+                    text = " ".join("".join(span["text"] for span in line["spans"]) for line in block["lines"]).strip()
+                    if any(char.isalpha() for char in text):
+                        paragraphs.append(text)
+                sample["extract"] = time.perf_counter() - start
+                sample["segments"] = len(paragraphs)
+                sample["chars"] = sum(len(text) for text in paragraphs)
+                sample["input_tokens"] = sum(
+                    estimate_message_tokens(pdf2zh_messages(text, src_lang, lang, templates[lang]))
+                    for text in paragraphs for lang in langs
+                ) / max(len(langs), 1)
+                sample["output_tokens"] = sum(estimate_tokens(text) for text in paragraphs) * self.output_token_ratio
+                samples.append(sample)
+
+        sharder = ShardedTranslator(self.config)
+        workers = min(sharder.workers, math.ceil(page_count / sharder.pages_per_shard)) \
+            if sharder.should_shard(pdf_path) else 1
+        concurrency = min(max(1, self.config.get('translation', {}).get('max_parallel_langs', 3)), max(len(langs), 1))
+        per_page = self._average(samples)
+        requests_per_lang = per_page["segments"] * page_count
+        stages = {
+            "layout": per_page["layout"] * page_count / workers,
+            # pdf2zh在每个分片进程内以thread_count个线程并发请求
+            "translate": math.ceil(len(langs) / concurrency) * page_count
+            * (per_page["segments"] * self.seconds_per_request / thread_count + per_page["extract"]) / workers
+            if langs else 0.0,
+        }
+        return self._report("non_scanned", page_count, samples, per_page, langs, requests_per_lang, stages,
+                            {"thread_count": thread_count, "shard_workers": workers, "max_parallel_langs": concurrency})
+
+    # ---------- 汇总 ----------
+
+    @staticmethod
+    def _average(samples):
+        keys = {"segments", "input_tokens", "output_tokens", "rasterize", "ocr", "render", "layout", "extract"}
+        keys.update(key for sample in samples for key in sample if key != "page")
+        return {key: sum(sample.get(key, 0.0) for sample in samples) / max(len(samples), 1) for key in keys}
+
+    def _report(self, mode, page_count, samples, per_page, langs, requests_per_lang, stages, concurrency):
+        input_tokens = round(per_page["input_tokens"] * page_count * len(langs))
+        output_tokens = round(per_page["output_tokens"] * page_count * len(langs))
+        estimate = {
+            "mode": mode,
+            "pdf": self.config['input']['pdf_path'],
+            "pages": page_count,
+            "sampled_pages": [sample["page"] for sample in samples],
+            "target_langs": langs,
+            "segments": round(per_page["segments"] * page_count),
+            "requests": round(requests_per_lang * len(langs)),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "concurrency": concurrency,
+            "seconds_per_request": self.seconds_per_request,
+            "stage_seconds": {stage: round(seconds, 1) for stage, seconds in stages.items()},
+            "wall_seconds": round(sum(stages.values()), 1),
+            "samples": [{k: round(v, 4) if isinstance(v, float) else v for k, v in sample.items()}
+                        for sample in samples],
+        }
+        self._print(estimate)
+        self._save(estimate)
+        return estimate
+
+    @staticmethod
+    def _print(estimate):
+        print("\n" + "=" * 50)
+        print("任务预估 (未调用翻译API)")
+        print("=" * 50)
+        print(f"页数: {estimate['pages']} (抽样: {', '.join(map(str, estimate['sampled_pages']))})")
+        print(f"目标语言: {', '.join(estimate['target_langs']) or '无'}")
+        print(f"预计段落数: {estimate['segments']}, API请求数: {estimate['requests']}")
+        print(f"预计token: 输入 {estimate['input_tokens']}, 输出 {estimate['output_tokens']}")
+        for stage, seconds in estimate["stage_seconds"].items():
+            print(f"  {stage}: {seconds / 60:.1f} 分钟")
+        print(f"预计总耗时: {estimate['wall_seconds'] / 60:.1f} 分钟")
+        print("=" * 50)
+
+    def _save(self, estimate):
+        metrics_cfg = self.config.get('metrics', {})
+        report_dir = Path(metrics_cfg.get('report_dir') or Path(self.config['output']['pdf_dir']) / "metrics")
+        report_dir.mkdir(parents=True, exist_ok=True)
+        path = report_dir / f"{Path(self.config['input']['pdf_path']).stem}_estimate.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(estimate, f, ensure_ascii=False, indent=2)
+        print(f"预估报告已保存至: {path}")
+        return str(path)
@@ -0,0 +1,223 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+from utils.metrics import metrics
+from utils.resources import available_cpus
+
+logger = logging.getLogger(__name__)
+
+# 可由fontTools直接解析的嵌入字体类型
+SUBSETTABLE_EXTS = {"ttf", "otf"}
+
+
+def _font_key(name):
+    """字体名归一化：去掉子集前缀(如 ABCDEF+)与PDF名称转义，只保留小写字母数字
+
+    同一字体在不同位置的写法不同，如 "DejaVu#20Sans#20Book" 与 "DejaVuSans-Book"。
+    """
+    name = re.sub(r'#([0-9A-Fa-f]{2})', lambda m: chr(int(m.group(1), 16)), (name or '').lstrip('/'))
+    name = re.sub(r'^[A-Z]{6}\+', '', name)
+    return re.sub(r'[^0-9a-z]', '', name.lower())
+
+
+def _ref(value):
+    """解析 '12 0 R' 或 '[12 0 R]' 形式的间接引用"""
+    match = re.search(r'(\d+)\s+0\s+R', value or '')
+    return int(match.group(1)) if match else None
+
+
+def _descendant(doc, font_xref):
+    """Type0字体的后代CIDFont xref，其他字体返回自身"""
+    kind, value = doc.xref_get_key(font_xref, "DescendantFonts")
+    if kind == "array":
+        return _ref(value)
+    if kind == "xref":
+        return _ref(doc.xref_object(_ref(value)))
+    return font_xref
+
+
+def _descriptor(doc, font_xref):
+    target = _descendant(doc, font_xref)
+    if target is None:
+        return None
+    kind, value = doc.xref_get_key(target, "FontDescriptor")
+    return _ref(value) if kind == "xref" else None
+
+
+def font_names(doc, font_xref):
+    """字体对象可能出现在文本跟踪中的全部名称(归一化后)：Type0的BaseFont、后代CIDFont的BaseFont、
+    FontDescriptor的FontName；get_texttrace()报告的是后者之一，与get_fonts()的名称不一定相同"""
+    names = set()
+    descendant = _descendant(doc, font_xref)
+    for xref, key in ((font_xref, "BaseFont"), (descendant, "BaseFont"), (_descriptor(doc, font_xref), "FontName")):
+        if xref is None:
+            continue
+        kind, value = doc.xref_get_key(xref, key)
+        if kind == "name":
+            names.add(_font_key(value))
+    names.discard("")
+    return names
+
+
+def collect_glyphs(doc):
+    """统计每个嵌入字体在文档中实际使用的字形ID，按字体xref汇总"""
+    glyphs = defaultdict(set)  # 字体xref -> 字形ID
+    names_by_xref = {}
+    for page in doc:
+        fonts_by_name = defaultdict(set)  # 本页字体名 -> 字体xref
+        for xref, ext, *_ in page.get_fonts(full=True):
+            if ext not in SUBSETTABLE_EXTS:
+                continue
+            if xref not in names_by_xref:
+                names_by_xref[xref] = font_names(doc, xref)
+            for name in names_by_xref[xref]:
+                fonts_by_name[name].add(xref)
+        if not fonts_by_name:
+            continue
+
+        for span in page.get_texttrace():
+            xrefs = fonts_by_name.get(_font_key(span.get("font")))
+            if not xrefs:
+                continue
+            gids = {char[1] for char in span.get("chars", ()) if char[1] >= 0}
+            for xref in xrefs:
+                glyphs[xref].update(gids)
+    return glyphs
+
+
+def font_file_xref(doc, font_xref):
+    """定位字体对象对应的字体文件流 (xref, 键名)，Type0字体经由DescendantFonts查找"""
+    descriptor = _descriptor(doc, font_xref)
+    if descriptor is None:
+        return None
+    for key in ("FontFile2", "FontFile3"):
+        kind, value = doc.xref_get_key(descriptor, key)
+        if kind == "xref":
+            return _ref(value), key
+    return None
+
+
+def subset_font(data, gids):
+    """用fontTools按字形ID生成子集；保留原字形ID，PDF内容流中的CID无需改写"""
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+
+    options = subset.Options()
+    options.retain_gids = True
+    options.notdef_outline = True
+    options.name_IDs = ["*"]
+    options.name_languages = ["*"]
+    options.layout_features = ["*"]
+
+    font = TTFont(io.BytesIO(data), fontNumber=0)
+    subsetter = subset.Subsetter(options=options)
+    subsetter.populate(gids=sorted(set(gids) | {0}))
+    subsetter.subset(font)
+    output = io.BytesIO()
+    font.save(output)
+    return output.getvalue()
+
+
+def subset_document(pdf_path, cache_dir=None):
+    """对单个PDF的嵌入字体做子集化(结果按 字体哈希+字形集合哈希 缓存)，返回 (原大小, 新大小)"""
+    before = os.path.getsize(pdf_path)
+    cache_dir = Path(cache_dir) if cache_dir else None
+    replaced = 0
+
+    with fitz.open(pdf_path) as doc:
+        for font_xref, gids in collect_glyphs(doc).items():
+            located = font_file_xref(doc, font_xref)
+            if not located or not gids:
+                continue
+            file_xref, key = located
+            _, ext, _, data = doc.extract_font(font_xref)
+            if ext not in SUBSETTABLE_EXTS or not data:
+                continue
+
+            font_hash = hashlib.sha1(data).hexdigest()
+            glyph_hash = hashlib.sha1(",".join(map(str, sorted(gids))).encode()).hexdigest()
+            cache_path = cache_dir / f"{font_hash[:20]}_{glyph_hash[:20]}.{ext}" if cache_dir else None
+
+            if cache_path is not None and cache_path.exists():
+                metrics.record_cache("font_subset", True)
+                subset_data = cache_path.read_bytes()
+            else:
+                metrics.record_cache("font_subset", False)
+                try:
+                    subset_data = subset_font(data, gids)
+                except Exception as e:
+                    logger.warning(f"Font subsetting failed for xref {font_xref}: {str(e)}")
+                    continue
+                if cache_path is not None:
+                    # 先写临时文件再替换，并行子集化时不会读到不完整的缓存
+                    cache_dir.mkdir(parents=True, exist_ok=True)
+                    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(subset_data)
+                    os.replace(tmp_path, cache_path)
+
+            if len(subset_data) >= len(data):
+                continue
+            doc.update_stream(file_xref, subset_data)
+            if key == "FontFile2":
+                doc.xref_set_key(file_xref, "Length1", str(len(subset_data)))
+            replaced += 1
+
+        if replaced:
+            tmp_output = f"{pdf_path}.subset.pdf"
+            doc.save(tmp_output, garbage=3, deflate=True)
+    if replaced:
+        os.replace(tmp_output, pdf_path)
+    return before, os.path.getsize(pdf_path)
+
+
+class FontSubsetter:
+    """翻译完成后的字体子集化阶段：只保留译文实际用到的字形，批量输出时多进程并行"""
+
+    def __init__(self, config):
+        subset_cfg = config.get('font_subset', {})
+        self.enabled = subset_cfg.get('enabled', True)
+        self.cache_dir = subset_cfg.get('cache_dir') or None
+        self.workers = subset_cfg.get('workers', 0) or available_cpus()
+
+    def subset_documents(self, pdf_paths):
+        """对多个输出文件做子集化，返回 {路径: (原大小, 新大小)}"""
+        pdf_paths = [str(path) for path in pdf_paths if path and Path(path).exists()]
+        if not (self.enabled and pdf_paths):
+            return {}
+
+        results = {}
+        with metrics.timer("font_subset"):
+            workers = min(self.workers, len(pdf_paths))
+            if workers > 1:
+                # fontTools为纯Python实现，多个文件在独立进程中并行处理
+                context = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                    futures = {path: executor.submit(subset_document, path, self.cache_dir) for path in pdf_paths}
+                    for path, future in futures.items():
+                        results[path] = self._collect(path, future.result)
+            else:
+                for path in pdf_paths:
+                    results[path] = self._collect(path, lambda: subset_document(path, self.cache_dir))
+        return results
+
+    @staticmethod
+    def _collect(path, get_result):
+        try:
+            before, after = get_result()
+        except Exception as e:
+            logger.warning(f"Font subsetting skipped for {path}: {str(e)}")
+            return None
+        metrics.inc("font_subset_bytes_saved_total", max(0, before - after))
+        logger.info(f"Font subset: {Path(path).name} {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+        return before, after
@@ -0,0 +1,291 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from collections import Counter, deque
+from pathlib import Path
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 磁盘缓存格式版本，结构变化时递增
+CACHE_VERSION = 1
+
+
+def _is_word_char(char):
+    """拉丁等按空格分词的文字：术语两侧不能紧邻字母数字(CJK不做边界检查)"""
+    return char.isalnum() and not ('\u3040' <= char <= '\u30ff' or '\u4e00' <= char <= '\u9fff'
+                                   or '\uac00' <= char <= '\ud7a3')
+
+
+class TermMatcher:
+    """Aho-Corasick多模式匹配自动机：一次扫描找出文本中出现的全部术语，耗时与术语数量无关"""
+
+    def __init__(self, terms=()):
+        self.goto = [{}]  # 状态 -> {字符: 下一状态}
+        self.fail = [0]
+        self.out = [()]  # 状态 -> 在此结束的术语编号(含失败链上的)
+        self.terms = []
+        for term in terms:
+            self._insert(term)
+        self._build()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def _insert(self, term):
+        state = 0
+        for char in term:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+            state = next_state
+        self.out[state] = self.out[state] + (len(self.terms),)
+        self.terms.append(term)
+
+    def _build(self):
+        """按广度优先计算失败链接，并把失败链上的输出合并到每个状态"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                if self.out[self.fail[next_state]]:
+                    self.out[next_state] = self.out[next_state] + self.out[self.fail[next_state]]
+
+    def iter_matches(self, text):
+        """产出 (起始位置, 结束位置, 术语)"""
+        goto, fail, out, terms = self.goto, self.fail, self.out, self.terms
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for term_id in out[state]:
+                term = terms[term_id]
+                yield index + 1 - len(term), index + 1, term
+
+
+class Glossary:
+    """术语表：编译后的多模式匹配器缓存到磁盘，只把文本中实际出现的术语注入提示词，并在翻译后校验
+
+    术语表文件为CSV/TSV(列: source,target[,lang]，lang为空表示适用于全部目标语言)或JSON
+    ({原文: 译文} 或 {语言: {原文: 译文}})。文件更新后只把新增术语编入增量自动机，
+    增量部分超过主自动机的一定比例时才整体重建。
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, config):
+        """获取本进程共享的术语表(首次调用时加载或编译)"""
+        glossary_cfg = config.get('glossary', {})
+        key = (glossary_cfg.get('path') if glossary_cfg.get('enabled', False) else None,
+               glossary_cfg.get('case_sensitive', False))
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(config)
+            return cls._instances[key]
+
+    def __init__(self, config):
+        glossary_cfg = config.get('glossary', {})
+        self.path = Path(glossary_cfg['path']) if glossary_cfg.get('path') else None
+        self.enabled = glossary_cfg.get('enabled', False) and self.path is not None
+        self.case_sensitive = glossary_cfg.get('case_sensitive', False)
+        self.max_terms = glossary_cfg.get('max_terms', 40)  # 单个请求注入的术语数上限
+        self.max_document_terms = glossary_cfg.get('max_document_terms', 100)  # 非扫描件整份文档的上限
+        self.verify_enabled = glossary_cfg.get('verify', True)
+        self.retry_missing = glossary_cfg.get('retry_missing', True)
+        self.compact_ratio = glossary_cfg.get('compact_ratio', 0.1)  # 增量术语占比超过此值时整体重建
+        cache_dir = glossary_cfg.get('cache_dir') or (self.path.parent if self.path else None)
+        self.cache_path = Path(cache_dir) / f"{self.path.stem}.glossary.pkl" if self.path else None
+
+        self._lock = threading.Lock()
+        self.entries = {}  # 归一化原文 -> {语言或"*": (原文, 译文)}
+        self.main = TermMatcher()
+        self.delta = TermMatcher()
+        if self.enabled:
+            self.load()
+
+    # ---------- 加载与缓存 ----------
+
+    def _normalize(self, text):
+        if self.case_sensitive:
+            return text
+        lowered = text.lower()
+        # 个别字符转小写后长度改变，逐字符处理以保持位置一一对应
+        return lowered if len(lowered) == len(text) else "".join(
+            c.lower() if len(c.lower()) == 1 else c for c in text)
+
+    def _read_file(self):
+        """解析术语表文件，返回 {归一化原文: {语言或"*": (原文, 译文)}}"""
+        entries = {}
+
+        def add(source, target, lang=None):
+            source, target = (source or "").strip(), (target or "").strip()
+            if source and target:
+                entries.setdefault(self._normalize(source), {})[(lang or "").strip() or "*"] = (source, target)
+
+        if self.path.suffix.lower() == ".json":
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for key, value in data.items():
+                if isinstance(value, dict):
+                    for source, target in value.items():
+                        add(source, target, key)
+                else:
+                    add(key, value)
+            return entries
+
+        with open(self.path, 'r', encoding='utf-8-sig', newline='') as f:
+            delimiter = "\t" if self.path.suffix.lower() == ".tsv" else ","
+            for row in csv.DictReader(f, delimiter=delimiter):
+                add(row.get("source"), row.get("target"), row.get("lang"))
+        return entries
+
+    def load(self):
+        """读取术语表；文件未变化时直接使用磁盘缓存，新增术语只编入增量自动机"""
+        digest = hashlib.sha1(self.path.read_bytes()).hexdigest()
+        cache = self._read_cache()
+        if cache is not None and cache["digest"] == digest:
+            self.entries, self.main, self.delta = cache["entries"], cache["main"], cache["delta"]
+            metrics.record_cache("glossary", True)
+            logger.info(f"Glossary loaded from cache: {len(self.entries)} terms")
+            return self
+
+        metrics.record_cache("glossary", False)
+        entries = self._read_file()
+        if cache is not None:
+            self.main, self.delta = cache["main"], cache["delta"]
+            known = set(self.main.terms) | set(self.delta.terms)
+            self.entries = entries
+            self.update_terms([term for term in entries if term not in known], save=False)
+        else:
+            self.entries = entries
+            self.main, self.delta = TermMatcher(entries), TermMatcher()
+        self._write_cache(digest)
+        logger.info(f"Glossary compiled: {len(self.entries)} terms "
+                    f"(main {len(self.main)}, incremental {len(self.delta)})")
+        return self
+
+    def update_terms(self, new_terms, save=True):
+        """增量加入术语：小批量更新只重建增量自动机，累积过多时与主自动机合并重建"""
+        with self._lock:
+            stale = len(set(self.main.terms) - set(self.entries))  # 已删除但仍在主自动机中的术语
+            delta_terms = [term for term in self.delta.terms if term in self.entries] + list(new_terms)
+            if len(delta_terms) + stale > self.compact_ratio * max(len(self.main), 1):
+                self.main, self.delta = TermMatcher(self.entries), TermMatcher()
+            elif new_terms or len(delta_terms) != len(self.delta):
+                self.delta = TermMatcher(delta_terms)
+        if save:
+            self._write_cache(hashlib.sha1(self.path.read_bytes()).hexdigest())
+
+    def add(self, source, target, lang=None):
+        """运行时追加单个术语(不改写术语表文件)"""
+        key = self._normalize(source.strip())
+        is_new = key not in self.entries
+        self.entries.setdefault(key, {})[lang or "*"] = (source.strip(), target.strip())
+        if is_new:
+            self.update_terms([key], save=False)
+
+    def _read_cache(self):
+        if not self.cache_path.exists():
+            return None
+        try:
+            with open(self.cache_path, 'rb') as f:
+                cache = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Glossary cache unreadable, rebuilding: {str(e)}")
+            return None
+        if cache.get("version") != CACHE_VERSION or cache.get("case_sensitive") != self.case_sensitive:
+            return None
+        return cache
+
+    def _write_cache(self, digest):
+        cache = {"version": CACHE_VERSION, "case_sensitive": self.case_sensitive, "digest": digest,
+                 "entries": self.entries, "main": self.main, "delta": self.delta}
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再替换，多个进程同时加载时不会读到不完整的缓存
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_path.parent, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.cache_path)
+
+    # ---------- 匹配与校验 ----------
+
+    def find(self, text, lang, limit=None):
+        """文本中出现的术语 [(原文, 译文)]，按出现次数排序，最多limit条"""
+        if not self.enabled or not text:
+            return []
+        normalized = self._normalize(text)
+        spans = [match for matcher in (self.main, self.delta) for match in matcher.iter_matches(normalized)
+                 if match[2] in self.entries]
+
+        # 优先保留最左、最长的匹配，重叠的较短术语丢弃
+        spans.sort(key=lambda span: (span[0], -(span[1] - span[0])))
+        counts = Counter()
+        covered = 0
+        for start, end, term in spans:
+            if start < covered:
+                continue
+            if (start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start])) or \
+                    (end < len(text) and _is_word_char(text[end]) and _is_word_char(text[end - 1])):
+                continue  # 术语是某个更长单词的一部分
+            counts[term] += 1
+            covered = end
+
+        terms = []
+        for term, _ in counts.most_common(limit or self.max_terms):
+            translations = self.entries[term]
+            entry = translations.get(lang) or translations.get("*")
+            if entry:
+                terms.append(entry)
+        return terms
+
+    def find_in_pdf(self, pdf_path, lang):
+        """非扫描件：整份文档(或分片)中出现的术语"""
+        import fitz
+
+        with fitz.open(pdf_path) as doc:
+            text = "\n".join(page.get_text() for page in doc)
+        return self.find(text, lang, limit=self.max_document_terms)
+
+    def verify(self, translated, terms):
+        """校验译文是否使用了术语表译法，返回缺失的术语"""
+        if not (self.verify_enabled and terms):
+            return []
+        normalized = self._normalize(" ".join(translated.split()))
+        missing = [(source, target) for source, target in terms
+                   if self._normalize(" ".join(target.split())) not in normalized]
+        metrics.inc("glossary_terms_total", len(terms) - len(missing), result="ok")
+        metrics.inc("glossary_terms_total", len(missing), result="missing")
+        return missing
+
+    def verify_pdf(self, pdf_path, terms):
+        """校验译文PDF，缺失的术语写入日志"""
+        if not (self.verify_enabled and terms and pdf_path):
+            return []
+        import fitz
+
+        with fitz.open(pdf_path) as doc:
+            text = "\n".join(page.get_text() for page in doc)
+        missing = self.verify(text, terms)
+        if missing:
+            logger.warning(f"Glossary: {len(missing)}/{len(terms)} terms not found in {Path(pdf_path).name}: "
+                           + ", ".join(f"{source} => {target}" for source, target in missing[:10]))
+        return missing
@@ -1,57 +1,309 @@
-from pathlib import Path
-from paddleocr import PaddleOCR
-import time
-from datetime import datetime
-
-
-class ImageOCRProcessor:
-    def __init__(self, config):
-        self.config = config
-
-    def process(self):
-        """运行OCR处理"""
-        print("\n" + "=" * 50)
-        print("步骤2: 运行OCR处理")
-        print("=" * 50)
-
-        input_dir = Path(self.config['output']['image_dir'])
-        output_dir = Path(self.config['output']['json_dir'])
-
-        output_dir.mkdir(parents=True, exist_ok=True)
-
-        # Initialize PaddleOCR instance with similar config to the example
-        pipeline = PaddleOCR(
-            use_doc_orientation_classify=False,
-            use_doc_unwarping=False,
-            use_textline_orientation=False
-        )
-
-        # 获取所有图片文件并按数字顺序排序
-        image_files = []
-        for img_path in input_dir.glob('*'):
-            if img_path.suffix.lower() in {'.png', '.jpg', '.jpeg', '.bmp', '.tiff'}:
-                image_files.append(img_path)
-
-        # 按页码数字排序
-        image_files.sort(key=lambda x: int(x.stem.split('_')[-1]))
-
-        for img_path in image_files:
-            start_time = time.time()
-            print(f"\n处理: {img_path.name}")
-
-            try:
-                output = pipeline.predict(input=str(img_path))
-            except Exception as e:
-                print(f"处理失败: {str(e)}")
-                continue
-
-            img_output_dir = output_dir / img_path.stem
-            img_output_dir.mkdir(exist_ok=True)
-
-            for res in output:
-                # PP-OCRv5 has slightly different output handling
-                res.print()  # Print results to console
-                res.save_to_img(save_path=str(img_output_dir))
-                res.save_to_json(save_path=str(img_output_dir))
-
-            print(f"处理完成: {img_path.name} (耗时: {time.time() - start_time:.2f}秒)")
\ No newline at end of file
+import json
+import multiprocessing
+from collections import deque
+from pathlib import Path
+import time
+from datetime import datetime
+from utils.metrics import metrics
+import numpy as np
+from PIL import Image
+from .ocr_engine import create_ocr_engine, offset_ocr_result
+from .page_prepass import PagePrepass
+from .page_dedup import PageDeduplicator
+from .page_tiling import PageTiler
+from .page_manifest import PageManifest
+from .text_layer import TextLayerExtractor
+from .deadline import Deadline
+from utils.image_hash import block_signature, phash
+from utils.page_buffer import PageBufferPool, load_image_into
+
+
+class ImageOCRProcessor:
+    def __init__(self, config):
+        self.config = config
+        self.prepass = PagePrepass(config)
+        self.dedup = PageDeduplicator(config)
+        self.tiler = PageTiler(config)
+        self.manifest = PageManifest(config)
+        self.text_layer = TextLayerExtractor(config)
+        self.deadline = Deadline(config)
+        self._source_doc = None  # 按需打开的源PDF(分块OCR与文本层读取)
+        # 大于0时由后台进程解码页面图片到共享缓冲区，与OCR重叠执行
+        self.loader_workers = config.get('page_buffers', {}).get('loader_workers', 0)
+
+    def process(self):
+        """运行OCR处理"""
+        print("\n" + "=" * 50)
+        print("步骤2: 运行OCR处理")
+        print("=" * 50)
+
+        input_dir = Path(self.config['output']['image_dir'])
+        output_dir = Path(self.config['output']['json_dir'])
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        # 按配置创建OCR引擎(PaddleOCR或ONNX Runtime)
+        engine = create_ocr_engine(self.config)
+        save_visualization = self.config.get('ocr', {}).get('save_visualization', False)
+
+        adaptive_cfg = self.config.get('adaptive_dpi', {})
+        if adaptive_cfg.get('enabled', False):
+            self._process_adaptive(engine, input_dir, output_dir)
+            return
+
+        pages = self._list_pages(input_dir)
+
+        for index, (page_num, img_path, image) in enumerate(self._load_pages(pages)):
+            start_time = time.time()
+            metrics.set_queue_depth("ocr", len(pages) - index)
+            name = img_path.name if img_path else f"page_{page_num} (分块)"
+            if self.deadline.expired():
+                self._save_deadline_skipped(output_dir, page_num)
+                continue
+            print(f"\n处理: {name}")
+
+            try:
+                with metrics.timer("ocr", page=page_num):
+                    result = self._text_layer_result(page_num)
+                    if result is None and img_path is None:
+                        result = self.tiler.ocr_page(engine, self._get_source_doc()[page_num - 1])
+                    elif result is None:
+                        result = self._predict_page(engine, img_path, image)
+            except Exception as e:
+                metrics.inc("stage_errors_total", stage="ocr")
+                print(f"处理失败: {str(e)}")
+                continue
+
+            img_output_dir = self._save_result(output_dir, page_num, result)
+            self.manifest.register(page_num, "ocr", img_output_dir / f"page_{page_num}_res.json")
+            if "page_hash" in result and "duplicate_of" not in result:
+                self.dedup.register_ocr(int(result["page_hash"], 16), result.get("page_signature"),
+                                        img_output_dir / f"page_{page_num}_res.json")
+            if save_visualization and img_path is not None and hasattr(engine, "save_last_visualization"):
+                engine.save_last_visualization(img_output_dir)
+
+            if result.get("blank_page"):
+                print("空白页，跳过OCR")
+            elif "text_layer" in result:
+                print(f"使用PDF已有文本层，跳过OCR (文本行: {len(result['rec_texts'])})")
+            elif "duplicate_of" in result:
+                print(f"与已处理页面重复，复用OCR结果: {result['duplicate_of']}")
+            else:
+                print(f"识别文本行: {len(result['rec_texts'])}")
+            print(f"处理完成: {name} (耗时: {time.time() - start_time:.2f}秒)")
+
+        metrics.set_queue_depth("ocr", 0)
+        self.close()
+        self.dedup.save()
+
+    def _get_source_doc(self):
+        if self._source_doc is None:
+            import fitz
+            self._source_doc = fitz.open(self.config['input']['pdf_path'])
+        return self._source_doc
+
+    def close(self):
+        if self._source_doc is not None:
+            self._source_doc.close()
+            self._source_doc = None
+
+    def _text_layer_result(self, page_num):
+        """页面已有可信的文本层时直接使用，返回None表示需要运行OCR"""
+        if not self.text_layer.enabled:
+            return None
+        result = self.text_layer.extract(self._get_source_doc()[page_num - 1])
+        metrics.inc("text_layer_pages_total", result="reused" if result is not None else "rejected")
+        return result
+
+    def _list_pages(self, input_dir):
+        """本次运行栅格化的页面 [(页码, 图片路径)]，分块页面的路径为None；优先使用页面产物索引"""
+        self.manifest.load()
+        pages = [(page_num, Path(path)) for page_num, path in self.manifest.items("image")]
+        pages.extend((page_num, None) for page_num, _ in self.manifest.items("tiles"))
+
+        if not pages:
+            # 没有索引(如单独运行OCR步骤)时退回扫描图片目录
+            for img_path in input_dir.glob('*'):
+                if img_path.suffix.lower() in {'.png', '.jpg', '.jpeg', '.bmp', '.tiff'}:
+                    pages.append((int(img_path.stem.split('_')[-1]), img_path))
+            # 超大页面没有整页图片，以图块目录参与排序
+            pages.extend((page_num, None) for page_num in PageTiler.tiled_pages(input_dir))
+
+        # 按页码数字排序
+        pages.sort(key=lambda item: item[0])
+        return pages
+
+    def process_page(self, engine, page_num):
+        """识别单个页面并保存结果(供分布式工作进程按页调用)，返回识别结果"""
+        input_dir = Path(self.config['output']['image_dir'])
+        output_dir = Path(self.config['output']['json_dir'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        with metrics.timer("ocr", page=page_num):
+            image_path = self.manifest.get(page_num, "image")
+            result = self._text_layer_result(page_num)
+            tiled = image_path is None and (self.manifest.get(page_num, "tiles") or PageTiler.is_tiled(input_dir, page_num))
+            if result is None and tiled:
+                result = self.tiler.ocr_page(engine, self._get_source_doc()[page_num - 1])
+            elif result is None:
+                img_path = Path(image_path) if image_path else input_dir / f"page_{page_num}.jpg"
+                if not img_path.exists():
+                    raise FileNotFoundError(f"找不到第{page_num}页的图片")
+                result = self._predict_page(engine, img_path)
+
+        img_output_dir = self._save_result(output_dir, page_num, result)
+        self.manifest.register(page_num, "ocr", img_output_dir / f"page_{page_num}_res.json")
+        if "page_hash" in result and "duplicate_of" not in result:
+            self.dedup.register_ocr(int(result["page_hash"], 16), result.get("page_signature"),
+                                    img_output_dir / f"page_{page_num}_res.json")
+        return result
+
+    def _load_pages(self, pages):
+        """逐页产出 (页码, 图片路径, 像素数组)；未启用后台解码或为分块页面时数组为None
+
+        后台解码进程只接收缓冲区句柄并写入共享内存，主进程直接读取视图，像素数据不经过pickle。
+        """
+        if self.loader_workers <= 0:
+            for page_num, img_path in pages:
+                yield page_num, img_path, None
+            return
+
+        context = multiprocessing.get_context("spawn")
+        with PageBufferPool(self.config) as pool, context.Pool(self.loader_workers) as loaders:
+            pending = deque()
+            remaining = iter(pages)
+
+            def submit():
+                for page_num, img_path in remaining:
+                    if img_path is None:
+                        pending.append((page_num, None, None, None))
+                        return
+                    with Image.open(img_path) as img:
+                        width, height = img.size
+                    handle = pool.acquire((height, width, 3))
+                    pending.append((page_num, img_path, handle,
+                                    loaders.apply_async(load_image_into, (str(img_path), handle))))
+                    return
+
+            # 预先解码的页数，决定同时占用的缓冲区数量
+            for _ in range(self.loader_workers * 2):
+                submit()
+
+            while pending:
+                page_num, img_path, handle, job = pending.popleft()
+                if handle is None:
+                    yield page_num, img_path, None
+                else:
+                    try:
+                        job.get()
+                        image = pool.array(handle)
+                    except Exception as e:
+                        print(f"后台解码失败，改为直接读取: {str(e)}")
+                        image = None
+                    try:
+                        yield page_num, img_path, image
+                    finally:
+                        # 本页处理完毕后缓冲区才可复用
+                        image = None
+                        pool.release(handle)
+                submit()
+
+    def _predict_page(self, engine, img_path, image=None):
+        """预检页面：重复页复用已有结果，空白页直接跳过，其余页面只对墨迹区域做OCR"""
+        if not (self.prepass.enabled or self.dedup.enabled):
+            return engine.predict(img_path if image is None else image)
+
+        if image is None:
+            with Image.open(img_path) as img:
+                image = np.asarray(img.convert('RGB'))
+
+        page_hash = signature = None
+        if self.dedup.enabled:
+            # 感知哈希找候选，分块灰度签名确认是同一页面(容忍重复扫描的噪声)
+            page_hash, signature = phash(image), block_signature(image)
+            cached_path = self.dedup.find_ocr(page_hash, signature)
+            metrics.record_cache("page_ocr", cached_path is not None)
+            if cached_path:
+                with open(cached_path, 'r', encoding='utf-8') as f:
+                    result = json.load(f)
+                result["page_hash"] = f"{page_hash:016x}"
+                result["page_signature"] = signature
+                result["duplicate_of"] = str(cached_path)
+                return result
+
+        result = self._predict_content(engine, image)
+        if page_hash is not None:
+            result["page_hash"] = f"{page_hash:016x}"
+            result["page_signature"] = signature
+        return result
+
+    def _predict_content(self, engine, image):
+        """对页面墨迹区域执行OCR"""
+        analysis = self.prepass.analyze(image)
+        if analysis["blank"]:
+            metrics.inc("pages_skipped_total", reason="blank")
+            return {"rec_texts": [], "rec_scores": [], "rec_boxes": [], "rec_polys": [], "dt_polys": [],
+                    "blank_page": True}
+
+        x0, y0, x1, y1 = analysis["bbox"]
+        saved = 1 - (x1 - x0) * (y1 - y0) / (image.shape[0] * image.shape[1])
+        metrics.observe("ocr_crop_saved_ratio", saved, buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.75, 1.0))
+        result = engine.predict(np.ascontiguousarray(image[y0:y1, x0:x1]))
+        result = offset_ocr_result(result, x0, y0)
+        result["content_bbox"] = [x0, y0, x1, y1]
+        return result
+
+    def _save_result(self, output_dir, page_num, result):
+        """按 page_N/page_N_res.json 的布局保存识别结果"""
+        img_output_dir = output_dir / f"page_{page_num}"
+        img_output_dir.mkdir(exist_ok=True)
+        with open(img_output_dir / f"page_{page_num}_res.json", 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        return img_output_dir
+
+    def _save_deadline_skipped(self, output_dir, page_num):
+        """截止时间已到：不再识别，写入带标记的空结果，翻译阶段据此输出带未翻译标记的原图"""
+        result = {"rec_texts": [], "rec_scores": [], "rec_boxes": [], "rec_polys": [], "dt_polys": [],
+                  "deadline_skipped": True}
+        img_output_dir = self._save_result(output_dir, page_num, result)
+        self.manifest.register(page_num, "ocr", img_output_dir / f"page_{page_num}_res.json")
+        metrics.inc("pages_skipped_total", reason="deadline")
+        print(f"截止时间已到，跳过第{page_num}页的OCR")
+
+    def _process_adaptive(self, engine, input_dir, output_dir):
+        """自适应DPI模式：直接从PDF低分辨率检测，小字号区域再高分辨率识别"""
+        from .adaptive_dpi import AdaptiveDPIOCR
+
+        adaptive = AdaptiveDPIOCR(self.config, engine.predict)
+        doc = self._get_source_doc()
+        # 只处理已栅格化(需要渲染译文)的页面
+        page_nums = [page_num for page_num, _ in self._list_pages(input_dir)]
+        for index, page_num in enumerate(page_nums):
+            start_time = time.time()
+            page = doc[page_num - 1]
+            metrics.set_queue_depth("ocr", len(page_nums) - index)
+            if self.deadline.expired():
+                self._save_deadline_skipped(output_dir, page_num)
+                continue
+            print(f"\n处理: 第{page_num}页 (自适应DPI)")
+
+            try:
+                with metrics.timer("ocr", page=page_num):
+                    # 已有可信文本层的页面与普通模式一样直接使用，不做检测与识别
+                    result = self._text_layer_result(page_num)
+                    if result is None:
+                        result = adaptive.process_page(page)
+            except Exception as e:
+                metrics.inc("stage_errors_total", stage="ocr")
+                print(f"处理失败: {str(e)}")
+                continue
+
+            img_output_dir = self._save_result(output_dir, page_num, result)
+            self.manifest.register(page_num, "ocr", img_output_dir / f"page_{page_num}_res.json")
+            if "text_layer" in result:
+                print(f"使用PDF已有文本层，跳过OCR (文本行: {len(result['rec_texts'])})")
+            print(f"处理完成: 第{page_num}页, 高分辨率区域 {len(result.get('adaptive_dpi', {}).get('regions', []))} 个 "
+                  f"(耗时: {time.time() - start_time:.2f}秒)")
+
+        metrics.set_queue_depth("ocr", 0)
+        self.close()
\ No newline at end of file
@@ -1,74 +1,132 @@
-import os
-from pathlib import Path
-from PIL import Image
-import re
-
-
-class ImageToPDFConverter:
-    def __init__(self, config):
-        self.config = config
-
-    def natural_sort_key(self, s):
-        """
-        自然排序键函数，用于按数字顺序排序文件名
-        例如：page_1.jpg, page_2.jpg,..., page_10.jpg
-        """
-        return [int(text) if text.isdigit() else text.lower()
-                for text in re.split('([0-9]+)', str(s))]
-
-    def convert(self):
-        """将翻译后的图片按数字顺序合并为PDF"""
-        print("\n" + "=" * 50)
-        print("步骤4: 将翻译后的图片合并为PDF")
-        print("=" * 50)
-
-        input_dir = self.config['output']['translated_image_dir']
-        output_dir = self.config['output']['pdf_dir']
-
-        # 确保输出目录存在
-        Path(output_dir).mkdir(parents=True, exist_ok=True)
-
-        # 获取原始PDF文件名(不含扩展名)
-        pdf_name = Path(self.config['input']['pdf_path']).stem
-        output_pdf = os.path.join(output_dir, f"{pdf_name}_translated.pdf")
-
-        # 收集所有图片文件并按自然顺序排序
-        image_list = []
-        for f in os.listdir(input_dir):
-            if f.lower().endswith((".png", ".jpg", ".jpeg")):
-                image_list.append(os.path.join(input_dir, f))
-
-        if not image_list:
-            print("错误: 没有找到翻译后的图片")
-            return None
-
-        # 按数字顺序排序图片文件
-        image_list.sort(key=self.natural_sort_key)
-
-        print("按以下顺序合并图片:")
-        for img_path in image_list:
-            print(f"- {os.path.basename(img_path)}")
-
-        try:
-            # 打开所有图片并转换为RGB模式
-            images = []
-            for img_path in image_list:
-                img = Image.open(img_path)
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                images.append(img)
-
-            # 保存为PDF，第一张图片使用save，后续图片使用append
-            if images:
-                images[0].save(
-                    output_pdf,
-                    save_all=True,
-                    append_images=images[1:],
-                    quality=100
-                )
-                print(f"\nPDF已保存至: {output_pdf}")
-                return output_pdf
-
-        except Exception as e:
-            print(f"合并PDF时出错: {e}")
+import os
+from pathlib import Path
+from PIL import Image
+import re
+from utils.metrics import metrics
+from .page_tiling import PageTiler
+from .page_manifest import PageManifest
+from .deadline import Deadline
+
+
+class ImageToPDFConverter:
+    def __init__(self, config):
+        self.config = config
+
+    def natural_sort_key(self, s):
+        """
+        自然排序键函数，用于按数字顺序排序文件名
+        例如：page_1.jpg, page_2.jpg,..., page_10.jpg
+        """
+        return [int(text) if text.isdigit() else text.lower()
+                for text in re.split('([0-9]+)', str(s))]
+
+    def collect_images(self, input_dir=None):
+        """待合并的译文图片 [(页码, 路径)]，按页码排序，即合并后PDF的页序"""
+        input_dir = input_dir or self.config['output']['translated_image_dir']
+        # 优先使用页面产物索引中本次运行登记的译文图片(已按页码排序)，不受目录中残留文件影响
+        images = PageManifest(self.config).items_in(input_dir)
+        if images or not os.path.isdir(input_dir):
+            return images
+
+        # 收集所有图片文件并按自然顺序排序
+        image_list = []
+        for f in os.listdir(input_dir):
+            if f.lower().endswith((".png", ".jpg", ".jpeg")):
+                image_list.append(os.path.join(input_dir, f))
+            elif f.endswith("_tiles") and PageTiler.is_tiled_dir(os.path.join(input_dir, f)):
+                # 超大页面以图块目录的形式保存
+                image_list.append(os.path.join(input_dir, f))
+
+        # 按数字顺序排序图片文件，文件名中的数字(page_3.jpg、page_3_tiles)即页码，没有数字时为None
+        image_list.sort(key=self.natural_sort_key)
+        return [(int(numbers[-1]) if numbers else None, path)
+                for path, numbers in ((path, re.findall(r'\d+', os.path.basename(path))) for path in image_list)]
+
+    def convert(self, input_dir=None, lang_code=None):
+        """将翻译后的图片按数字顺序合并为PDF
+
+        多目标语言时分别传入各语言的图片目录与语言代码，输出文件名带语言后缀。
+        """
+        print("\n" + "=" * 50)
+        print("步骤4: 将翻译后的图片合并为PDF")
+        print("=" * 50)
+
+        input_dir = input_dir or self.config['output']['translated_image_dir']
+        output_dir = self.config['output']['pdf_dir']
+
+        # 确保输出目录存在
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+        # 获取原始PDF文件名(不含扩展名)
+        pdf_name = Path(self.config['input']['pdf_path']).stem
+        lang_suffix = f"_{lang_code}" if lang_code else ""
+        output_pdf = os.path.join(output_dir, f"{pdf_name}_translated{lang_suffix}.pdf")
+
+        image_list = [path for _, path in self.collect_images(input_dir)]
+        if not image_list:
+            print("错误: 没有找到翻译后的图片")
+            return None
+
+        print("按以下顺序合并图片:")
+        for img_path in image_list:
+            print(f"- {os.path.basename(img_path)}")
+
+        if any(os.path.isdir(path) for path in image_list):
+            return self._convert_with_tiles(image_list, output_pdf)
+
+        try:
+            # 打开所有图片并转换为RGB模式
+            images = []
+            for page_num, img_path in enumerate(image_list, 1):
+                with metrics.timer("assemble", page=page_num):
+                    img = Image.open(img_path)
+                    if img.mode != 'RGB':
+                        img = img.convert('RGB')
+                images.append(img)
+
+            # 保存为PDF，第一张图片使用save，后续图片使用append
+            if images:
+                with metrics.timer("assemble"):
+                    images[0].save(
+                        output_pdf,
+                        save_all=True,
+                        append_images=images[1:],
+                        quality=100,
+                        resolution=Deadline.resolution(self.config)
+                    )
+                print(f"\nPDF已保存至: {output_pdf}")
+                return output_pdf
+
+        except Exception as e:
+            print(f"合并PDF时出错: {e}")
+            return None
+
+    def _convert_with_tiles(self, image_list, output_pdf):
+        """包含分块页面时用PyMuPDF逐页嵌入图片，图块按清单中的位置拼接，不解码整页图像"""
+        import fitz
+
+        dpi = self.config['processing']['dpi']
+        scale = 72 / dpi
+        try:
+            with fitz.open() as doc:
+                for page_num, path in enumerate(image_list, 1):
+                    with metrics.timer("assemble", page=page_num):
+                        if os.path.isdir(path):
+                            manifest = PageTiler.load_manifest(path)
+                            page = doc.new_page(width=manifest["width"] * scale, height=manifest["height"] * scale)
+                            for tile in manifest["tiles"]:
+                                x0, y0, x1, y1 = tile["box"]
+                                rect = fitz.Rect(x0 * scale, y0 * scale, x1 * scale, y1 * scale)
+                                page.insert_image(rect, filename=os.path.join(path, tile["name"]))
+                        else:
+                            with Image.open(path) as img:
+                                width, height = img.size
+                            page = doc.new_page(width=width * scale, height=height * scale)
+                            page.insert_image(page.rect, filename=path)
+                with metrics.timer("assemble"):
+                    doc.save(output_pdf, garbage=3, deflate=True)
+            print(f"\nPDF已保存至: {output_pdf}")
+            return output_pdf
+        except Exception as e:
+            print(f"合并PDF时出错: {e}")
             return None
\ No newline at end of file
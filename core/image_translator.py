@@ -1,651 +1,1090 @@
-import os
-import json
-import requests
-from PIL import Image, ImageDraw, ImageFont
-import platform
-import subprocess
-import re
-import time
-import hashlib
-from tqdm import tqdm
-from langdetect import detect, DetectorFactory
-
-DetectorFactory.seed = 0  # 确保结果可重复
-
-
-def detect_pdf_language(pdf_path):
-    """从PDF中提取文本并识别占比最多的语言"""
-    try:
-        import fitz  # PyMuPDF
-        from collections import defaultdict
-
-        # 支持的语言及其Unicode范围 (与non_scanned_pdf_processor.py保持一致)
-        LANGUAGE_RANGES = {
-            'zh': [('\u4e00', '\u9fff')],  # 中文
-            'ja': [('\u3040', '\u30ff'), ('\u31f0', '\u31ff')],  # 日文
-            'ko': [('\uac00', '\ud7a3')],  # 韩文
-            'ru': [('\u0400', '\u04ff')],  # 俄文
-            'en': [],  # 英文(无特定范围)
-            'es': [],  # 西班牙文
-            'fr': [],  # 法文
-            'de': []  # 德文
-        }
-
-        # 从PDF中提取样本文本 (使用fitz而非pdfplumber)
-        doc = fitz.open(pdf_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-            if len(text) > 500:  # 500字符足够检测语言
-                break
-        text = text[:500]
-
-        if not text:
-            return None  # 不设置默认语言
-
-        # 统计各语言字符数
-        lang_counts = defaultdict(int)
-        total_chars = 0
-
-        for char in text:
-            total_chars += 1
-            char_matched = False
-
-            # 检查特定Unicode范围的文字
-            for lang, ranges in LANGUAGE_RANGES.items():
-                if not ranges:  # 拉丁语系
-                    continue
-
-                for (start, end) in ranges:
-                    if start <= char <= end:
-                        lang_counts[lang] += 1
-                        char_matched = True
-                        break
-                if char_matched:
-                    break
-
-            # 未匹配特定范围的字符归类为拉丁语系
-            if not char_matched and char.isalpha():
-                try:
-                    lang = detect(char)
-                    if lang in LANGUAGE_RANGES:
-                        lang_counts[lang] += 1
-                except:
-                    pass
-
-        # 如果没有检测到任何特定语言字符，使用langdetect检测全文
-        if not lang_counts and len(text) > 10:
-            try:
-                lang = detect(text[:1000])
-                if lang in LANGUAGE_RANGES:
-                    return lang
-            except:
-                pass
-
-            return None
-
-        # 返回占比最高的语言
-        if lang_counts:
-            return max(lang_counts.items(), key=lambda x: x[1])[0]
-
-        return None
-
-    except Exception as e:
-        print(f"语言检测失败: {e}")
-        return None
-
-class ImageTranslator:
-    LANGUAGE_MAP = {
-        "en": ("English", "latin"),
-        "zh": ("简体中文", "cjk"),
-        "ko": ("한국어", "korean"),
-        "ru": ("Русский", "cyrillic"),
-        "ja": ("日本語", "japanese"),
-        "es": ("Español", "latin"),
-        "fr": ("Français", "latin"),
-        "de": ("Deutsch", "latin")
-    }
-
-    def __init__(self, config):
-        self.config = config
-        self.api_key = config['api']['deepseek_key']
-        self.source_lang = self.detect_source_language()  # 新增自动检测
-        self.target_lang = self.select_target_language()  # 修改为交互式选择
-        self.api_url = config['api']['deepseek_url']
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-        self.font_cache = {}
-        self.setup_fonts()
-        self.max_retries = config['api'].get('max_retries', 3)  # 从配置获取或默认3次
-        self.retry_delay = config['api'].get('retry_delay', 5)  # 从配置获取或默认5秒
-
-    def detect_source_language(self):
-        """自动检测源PDF语言，处理未识别情况"""
-        pdf_path = self.config['input']['pdf_path']
-
-        # 提取样本文本
-        try:
-            import fitz
-            doc = fitz.open(pdf_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-                if len(text) > 500:
-                    break
-            text_sample = text[:500]
-        except Exception as e:
-            print(f"提取PDF文本失败: {e}")
-            text_sample = ""
-
-        # 检测语言
-        try:
-            from langdetect import detect, LangDetectException
-            DetectorFactory.seed = 0
-            lang_code = detect(text_sample) if text_sample else None
-        except LangDetectException:
-            lang_code = None
-
-        if lang_code is None:
-            print("\n无法自动确定文档语言，请手动选择:")
-        else:
-            lang_name = self.LANGUAGE_MAP.get(lang_code, ('未知', ''))[0]
-            print(f"\n检测到输入PDF可能语言: {lang_name}")
-            confirm = input("是否使用此语言作为源语言? (Y/n): ").strip().lower()
-            if confirm != 'n':
-                return lang_code
-
-        # 手动选择语言
-        print("\n请选择源语言:")
-        for i, (code, (name, _)) in enumerate(self.LANGUAGE_MAP.items(), 1):
-            print(f"{i}. {name} ({code})")
-
-        while True:
-            try:
-                choice = input("请输入数字选择语言: ").strip()
-                if choice:
-                    lang_map = {str(i): code for i, (code, _) in enumerate(self.LANGUAGE_MAP.items(), 1)}
-                    return lang_map[choice]
-            except:
-                print("无效输入，请重新选择")
-
-    def _translate_with_deepseek(self, text: str, src_lang: str, target_lang: str) -> str:
-        """使用DeepSeek API翻译文本"""
-        try:
-            if src_lang == target_lang:
-                return text
-
-            target_language_name = self.LANGUAGE_MAP.get(target_lang, ("未知语言", ""))[0]
-            source_language_name = self.LANGUAGE_MAP.get(src_lang, ("未知语言", ""))[0]
-
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            prompt = (
-                f"你是一名专业的翻译官，能够将{source_language_name}准确翻译成{target_language_name}。\n"
-                f"严格只输出翻译后的内容，不要添加任何解释、注解或额外信息。\n"
-                f"保持专业术语准确，保留换行和格式。\n"
-                f"请将以下{source_language_name}内容翻译成{target_language_name}：\n{text}"
-            )
-
-            payload = {
-                "model": "deepseek-chat",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "你是一名专业的翻译官，能够准确翻译各种语言内容。严格只输出翻译后的内容，不要添加任何解释、注解或额外信息。"
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "temperature": 0.3,
-                "max_tokens": 2000
-            }
-
-            response = requests.post(self.api_url, headers=headers, json=payload)
-            response.raise_for_status()
-
-            return response.json()["choices"][0]["message"]["content"]
-
-        except Exception as e:
-            print(f"翻译失败: {str(e)}")
-            return f"[TRANSLATION ERROR] {text}"
-
-    def select_target_language(self):
-        """交互式选择目标语言"""
-        print("\n请选择目标语言:")
-        for i, (code, (name, _)) in enumerate(self.LANGUAGE_MAP.items(), 1):
-            print(f"{i}. {name} ({code})")
-
-        while True:
-            try:
-                choice = input("请输入数字选择语言 (默认1-英语): ").strip()
-                if not choice:
-                    return "en"
-
-                lang_map = {str(i): code for i, (code, _) in enumerate(self.LANGUAGE_MAP.items(), 1)}
-                target_lang = lang_map.get(choice, "en")
-                print(f"\n已选择: {self.LANGUAGE_MAP.get(target_lang, ('英语', ''))[0]}")
-                return target_lang
-            except Exception as e:
-                print(f"无效输入: {e}")
-
-
-    def setup_fonts(self):
-        """初始化多语言字体支持"""
-        self.font_dirs = [
-            "/usr/share/fonts",
-            "/usr/local/share/fonts",
-            os.path.expanduser("~/.local/share/fonts"),
-            os.path.expanduser("~/.fonts"),
-            "/mnt/c/Windows/Fonts"
-        ]
-
-    def find_font(self, font_name):
-        """在系统中查找字体文件"""
-        for font_dir in self.font_dirs:
-            if not os.path.exists(font_dir):
-                continue
-
-            for root, _, files in os.walk(font_dir):
-                for filename in files:
-                    if filename.lower() == font_name.lower():
-                        return os.path.join(root, filename)
-
-        try:
-            result = subprocess.run(["fc-match", "-f", "%{file}", font_name],
-                                    capture_output=True,
-                                    text=True,
-                                    check=True)
-            if result.returncode == 0 and os.path.exists(result.stdout.strip()):
-                return result.stdout.strip()
-        except:
-            pass
-
-        return None
-
-    def get_best_font(self, text, is_bold=False):
-        """根据文本内容选择最合适的字体"""
-        script = self.detect_script(text)
-
-        if script == "cjk":
-            font_name = "NotoSansCJK-Regular.ttc" if not is_bold else "NotoSansCJK-Bold.ttc"
-        elif script == "korean":
-            font_name = "NanumGothic.ttf" if not is_bold else "NanumGothicBold.ttf"
-        elif script == "japanese":
-            font_name = "NotoSansJP-Regular.otf" if not is_bold else "NotoSansJP-Bold.otf"
-        elif script == "cyrillic":
-            font_name = "NotoSans-Regular.ttf" if not is_bold else "NotoSans-Bold.ttf"
-        else:
-            font_name = "Arial.ttf" if not is_bold else "Arial Bold.ttf"
-
-        font_key = f"{font_name}_{is_bold}"
-        if font_key in self.font_cache:
-            return self.font_cache[font_key]
-
-        font_path = self.find_font(font_name)
-        if font_path:
-            self.font_cache[font_key] = font_path
-            return font_path
-
-        fallback = self.find_font("Arial.ttf") or self.find_font("DejaVuSans.ttf")
-        if fallback:
-            self.font_cache[font_key] = fallback
-            return fallback
-
-        raise ValueError(f"找不到合适的字体: {font_name}")
-
-    def detect_script(self, text):
-        """检测文本的主要文字系统"""
-        if not text:
-            return "latin"
-
-        for char in text:
-            if '\u4e00' <= char <= '\u9fff':
-                return "cjk"
-            elif '\uac00' <= char <= '\ud7a3':
-                return "korean"
-            elif '\u3040' <= char <= '\u30ff':
-                return "japanese"
-            elif '\u0400' <= char <= '\u04ff':
-                return "cyrillic"
-
-        return "latin"
-
-    def translate_text(self, text):
-        """使用 DeepSeek Chat API 进行翻译"""
-        if self.source_lang == self.target_lang:
-            return text  # 相同语言不翻译
-
-        target_language_name = self.LANGUAGE_MAP.get(self.target_lang, ("英语", ""))[0]
-        source_language_name = self.LANGUAGE_MAP.get(self.source_lang, ("自动检测", ""))[0]
-
-        payload = {
-            "model": "deepseek-chat",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": f"你是一名专业的翻译官，能够将{source_language_name}准确翻译成{target_language_name}。"
-                               "严格只输出翻译后的内容，不要添加任何解释、注解或额外信息。"
-                               "保持专业术语准确，保留换行和格式。"
-                },
-                {
-                    "role": "user",
-                    "content": f"请将以下{source_language_name}内容翻译成{target_language_name}：\n{text}"
-                }
-            ],
-            "temperature": 0.1,
-        }
-
-        for attempt in range(self.max_retries):
-            try:
-                response = requests.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=self.config['api'].get('timeout', 30)
-                )
-                response.raise_for_status()
-                translated_text = response.json()["choices"][0]["message"]["content"]
-                return translated_text.strip()
-
-            except requests.exceptions.RequestException as e:
-                print(f"翻译尝试 {attempt + 1}/{self.max_retries} 失败: {str(e)}")
-                if attempt < self.max_retries - 1:
-                    wait_time = self.retry_delay * (attempt + 1)
-                    print(f"等待 {wait_time}秒后重试...")
-                    time.sleep(wait_time)
-                else:
-                    print("达到最大重试次数，保留原文")
-                    return text
-            except Exception as e:
-                print(f"翻译过程中发生意外错误: {str(e)}")
-                return text
-
-    def load_json_file(self, json_file):
-        """安全加载JSON文件"""
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return [data] if isinstance(data, dict) else data if isinstance(data, list) else []
-        except Exception as e:
-            print(f"加载JSON文件失败: {e}")
-            return []
-
-    def process_blocks(self, json_file):
-        """处理JSON文件中的区块 - 修改为读取所有文本框的坐标和文本信息"""
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception as e:
-            print(f"加载JSON文件失败: {e}")
-            return self.get_default_blocks()
-
-        boxes = []
-
-        # 检查并处理文本框信息
-        if "rec_texts" in data and "rec_boxes" in data and len(data["rec_texts"]) == len(data["rec_boxes"]):
-            for text, box_coords in zip(data["rec_texts"], data["rec_boxes"]):
-                if text.strip() and len(box_coords) == 4:
-                    translated = self.translate_text(text.strip())
-                    text_lines = [line.strip() for line in translated.split('\n') if line.strip()]
-
-                    boxes.append({
-                        "coords": box_coords,
-                        "text": text_lines,
-                        "is_bold": False,
-                        "left_margin": 30
-                    })
-
-        # 如果没有找到文本框信息，尝试使用dt_polys作为备选
-        elif "dt_polys" in data and len(data["dt_polys"]) > 0:
-            for poly in data["dt_polys"]:
-                if len(poly) >= 4:
-                    # 计算文本框的边界坐标
-                    x_coords = [p[0] for p in poly]
-                    y_coords = [p[1] for p in poly]
-                    box_coords = [min(x_coords), min(y_coords), max(x_coords), max(y_coords)]
-
-                    # 添加一个默认文本（因为没有识别到的文本内容）
-                    boxes.append({
-                        "coords": box_coords,
-                        "text": ["[待翻译文本]"],
-                        "is_bold": False,
-                        "left_margin": 30
-                    })
-
-        return boxes if boxes else self.get_default_blocks()
-
-    def get_default_blocks(self):
-        """获取默认处理块配置"""
-        return [{
-            "coords": [100, 100, 500, 200],
-            "text": ["默认标题"],
-            "is_bold": True,
-            "left_margin": 50
-        }]
-
-    def wrap_text(self, text, font, max_width):
-        """将文本按单词分割为多行"""
-        if self.detect_script(text) in ["cjk", "korean", "japanese"]:
-            # CJK文本按字符换行
-            lines = []
-            current_line = []
-            current_width = 0
-            for char in text:
-                char_width = font.getbbox(char)[2] - font.getbbox(char)[0]
-                if current_line and current_width + char_width > max_width:
-                    lines.append(''.join(current_line))
-                    current_line = [char]
-                    current_width = char_width
-                else:
-                    current_line.append(char)
-                    current_width += char_width
-            if current_line:
-                lines.append(''.join(current_line))
-            return lines
-        else:
-            # 非CJK文本按单词换行
-            words = text.split(' ')
-            lines = []
-            current_line = []
-            current_width = 0
-            space_width = font.getbbox(' ')[2]
-            for word in words:
-                word_width = font.getbbox(word)[2] - font.getbbox(word)[0]
-                if current_line and current_width + word_width > max_width:
-                    lines.append(' '.join(current_line))
-                    current_line = [word]
-                    current_width = word_width
-                else:
-                    current_line.append(word)
-                    current_width += word_width + space_width
-            if current_line:
-                lines.append(' '.join(current_line))
-            return lines
-
-    def get_optimal_font(self, draw, text_lines, font_path, box_width, box_height):
-        """计算最佳字体大小"""
-        max_font_size = 150
-        min_font_size = 8
-        full_text = '\n'.join(text_lines)
-        paragraphs = full_text.split('\n')
-
-        for font_size in range(max_font_size, min_font_size - 1, -1):
-            try:
-                font = ImageFont.truetype(font_path, font_size)
-                total_height = 0
-                is_fit = True
-                for para in paragraphs:
-                    wrapped_lines = self.wrap_text(para, font, box_width * 0.95)
-                    for line in wrapped_lines:
-                        line_width = font.getbbox(line)[2] - font.getbbox(line)[0]
-                        line_height = font.getbbox(line)[3] - font.getbbox(line)[1]
-                        total_height += line_height
-                        if line_width > box_width * 0.95:
-                            is_fit = False
-                            break
-                    total_height += 5
-                    if not is_fit or total_height > box_height * 0.95:
-                        is_fit = False
-                        break
-                if is_fit:
-                    return font_size
-            except:
-                continue
-        return min_font_size
-
-    def clear_area(self, draw, coords):
-        """更精确的清除区域方法"""
-        # 计算实际文本区域(可根据字体大小调整)
-        text_width = coords[2] - coords[0]
-        text_height = coords[3] - coords[1]
-        effective_coords = [
-            coords[0] + text_width * 0,  # 左边界内缩0%
-            coords[1] + text_height * 0.15,  # 上边界内缩15%
-            coords[2] - text_width * 0,  # 右边界内缩0%
-            coords[3] - text_height * 0  # 下边界内缩0%
-        ]
-        draw.rectangle(effective_coords, fill='white', outline='white')
-
-    def add_text(self, draw, coords, text_lines, is_bold=False, left_margin=30, right_margin=0):
-        """在指定区域添加文本（严格左对齐）"""
-        try:
-            full_text = '\n'.join(text_lines)
-            font_path = self.get_best_font(full_text, is_bold)
-            if not font_path:
-                print("警告: 找不到合适的字体")
-                return
-
-            box_width = coords[2] - coords[0] - left_margin - right_margin
-            box_height = coords[3] - coords[1]
-            font_size = self.get_optimal_font(draw, text_lines, font_path, box_width, box_height)
-            font = ImageFont.truetype(font_path, font_size)
-
-            paragraphs = full_text.split('\n')
-            wrapped_lines_all = []
-            for para in paragraphs:
-                wrapped_lines = self.wrap_text(para, font, box_width)
-                wrapped_lines_all.extend(wrapped_lines)
-
-            # 计算起始位置（严格左对齐）
-            x_pos = coords[0] + left_margin  # 固定左边距
-            y_pos = coords[1]  # 从文本框顶部开始
-
-            for line in wrapped_lines_all:
-                # 绘制文本阴影（可选）
-                for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
-                    draw.text((x_pos + dx, y_pos + dy), line, font=font, fill='white')
-
-                # 绘制文本（严格左对齐）
-                draw.text((x_pos, y_pos), line, font=font, fill='black')
-
-                # 移动到下一行（使用字体实际高度）
-                y_pos += font.getbbox(line)[3] - font.getbbox(line)[1] + 2  # 2像素行间距
-        except Exception as e:
-            print(f"文本添加错误: {e}")
-
-    def process_single_image(self, json_file, image_directory, output_directory):
-        """处理单张图片（带完善错误处理）"""
-        try:
-            # 从JSON文件名推断图片文件名
-            json_basename = os.path.basename(json_file)
-            image_filename = json_basename.replace('_res.json',
-                                                   '.jpg') if '_res.json' in json_basename else json_basename.replace(
-                '.json', '.jpg')
-
-            # 查找对应的图片文件
-            image_path = None
-            for root, _, files in os.walk(image_directory):
-                if image_filename in files:
-                    image_path = os.path.join(root, image_filename)
-                    break
-
-            if not image_path:
-                print(f"警告: 找不到图片文件 {image_filename}")
-                return False
-
-            # 准备输出路径
-            lang_suffix = f"_{self.target_lang}" if self.target_lang != "en" else ""
-            output_filename = f"translated{lang_suffix}_{os.path.basename(image_filename)}"
-            output_path = os.path.join(output_directory, output_filename)
-
-            print(f"\n处理文件: {json_file}")
-            print(f"使用图片: {image_path}")
-            print(f"输出到: {output_path}")
-
-            # 处理图片
-            img = Image.open(image_path).convert('RGB')
-            draw = ImageDraw.Draw(img)
-            boxes = self.process_blocks(json_file)
-
-            for box in boxes:
-                coords = box["coords"]
-                self.clear_area(draw, coords)
-                if box.get("text"):
-                    self.add_text(
-                        draw=draw,
-                        coords=coords,
-                        text_lines=box["text"],
-                        is_bold=box.get("is_bold", False),
-                        left_margin=box.get("left_margin", 30)
-                    )
-
-            os.makedirs(output_directory, exist_ok=True)
-            img.save(output_path, quality=100)
-            return True
-        except Exception as e:
-            print(f"处理文件 {json_file} 失败: {e}")
-            return False
-
-    def batch_process_images(self, json_directory, image_directory, output_directory):
-        """批量处理目录中的所有JSON文件（按数字顺序）"""
-        os.makedirs(output_directory, exist_ok=True)
-
-        # 获取所有JSON文件
-        json_files = []
-        for root, _, files in os.walk(json_directory):
-            for file in files:
-                if file.lower().endswith('.json'):
-                    json_files.append(os.path.join(root, file))
-
-        # 按数字顺序排序（关键修改点）
-        json_files.sort(key=lambda x: int(re.search(r'page_(\d+)', x).group(1)))
-
-        if not json_files:
-            print(f"在目录 {json_directory} 中没有找到JSON文件")
-            return
-
-        processed_count = 0
-        failed_count = 0
-
-        for json_file in tqdm(json_files, desc="处理进度"):
-            try:
-                if self.process_single_image(json_file, image_directory, output_directory):
-                    processed_count += 1
-                else:
-                    failed_count += 1
-                    time.sleep(10)
-            except Exception as e:
-                print(f"处理文件 {json_file} 时发生严重错误: {e}")
-                failed_count += 1
-
-        print(f"\n处理完成! 成功处理 {processed_count} 个文件, 失败 {failed_count} 个")
-
-    def translate_images(self):
-        """翻译图片内容"""
-        print("\n" + "=" * 50)
-        print("步骤3: 翻译图片内容")
-        print("=" * 50)
-
-        json_directory = self.config['output']['json_dir']
-        image_directory = self.config['output']['image_dir']
-        output_directory = self.config['output']['translated_image_dir']
-
-        self.batch_process_images(json_directory, image_directory, output_directory)
\ No newline at end of file
+import os
+import json
+import requests
+from PIL import Image, ImageDraw, ImageFont
+import platform
+import shutil
+import subprocess
+import re
+import time
+import hashlib
+import threading
+from contextlib import nullcontext
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+from langdetect import detect, DetectorFactory
+from utils.metrics import metrics
+from utils.profiling import profiled, profiler
+from .segment_builder import SegmentBuilder
+from .segment_filter import SegmentFilter, RecurringTextDetector, normalize_text
+from .page_dedup import PageDeduplicator
+from .page_tiling import PageTiler
+from .page_manifest import PageManifest
+from .deadline import Deadline, DeadlineExceeded
+from .prompts import translation_messages, batch_messages, correction_messages
+from .glossary import Glossary
+from .region_erase import RegionEraser
+
+DetectorFactory.seed = 0  # 确保结果可重复
+
+
+def detect_pdf_language(pdf_path):
+    """从PDF中提取文本并识别占比最多的语言"""
+    try:
+        import fitz  # PyMuPDF
+        from collections import defaultdict
+
+        # 支持的语言及其Unicode范围 (与non_scanned_pdf_processor.py保持一致)
+        LANGUAGE_RANGES = {
+            'zh': [('\u4e00', '\u9fff')],  # 中文
+            'ja': [('\u3040', '\u30ff'), ('\u31f0', '\u31ff')],  # 日文
+            'ko': [('\uac00', '\ud7a3')],  # 韩文
+            'ru': [('\u0400', '\u04ff')],  # 俄文
+            'en': [],  # 英文(无特定范围)
+            'es': [],  # 西班牙文
+            'fr': [],  # 法文
+            'de': []  # 德文
+        }
+
+        # 从PDF中提取样本文本 (使用fitz而非pdfplumber)
+        doc = fitz.open(pdf_path)
+        text = ""
+        for page in doc:
+            text += page.get_text()
+            if len(text) > 500:  # 500字符足够检测语言
+                break
+        text = text[:500]
+
+        if not text:
+            return None  # 不设置默认语言
+
+        # 统计各语言字符数
+        lang_counts = defaultdict(int)
+        total_chars = 0
+
+        for char in text:
+            total_chars += 1
+            char_matched = False
+
+            # 检查特定Unicode范围的文字
+            for lang, ranges in LANGUAGE_RANGES.items():
+                if not ranges:  # 拉丁语系
+                    continue
+
+                for (start, end) in ranges:
+                    if start <= char <= end:
+                        lang_counts[lang] += 1
+                        char_matched = True
+                        break
+                if char_matched:
+                    break
+
+            # 未匹配特定范围的字符归类为拉丁语系
+            if not char_matched and char.isalpha():
+                try:
+                    lang = detect(char)
+                    if lang in LANGUAGE_RANGES:
+                        lang_counts[lang] += 1
+                except:
+                    pass
+
+        # 如果没有检测到任何特定语言字符，使用langdetect检测全文
+        if not lang_counts and len(text) > 10:
+            try:
+                lang = detect(text[:1000])
+                if lang in LANGUAGE_RANGES:
+                    return lang
+            except:
+                pass
+
+            return None
+
+        # 返回占比最高的语言
+        if lang_counts:
+            return max(lang_counts.items(), key=lambda x: x[1])[0]
+
+        return None
+
+    except Exception as e:
+        print(f"语言检测失败: {e}")
+        return None
+
+class ImageTranslator:
+    LANGUAGE_MAP = {
+        "en": ("English", "latin"),
+        "zh": ("简体中文", "cjk"),
+        "ko": ("한국어", "korean"),
+        "ru": ("Русский", "cyrillic"),
+        "ja": ("日本語", "japanese"),
+        "es": ("Español", "latin"),
+        "fr": ("Français", "latin"),
+        "de": ("Deutsch", "latin")
+    }
+
+    def __init__(self, config):
+        self.config = config
+        self.api_key = config['api']['deepseek_key']
+        trans_cfg = config.get('translation', {})
+        # 配置中指定了语言时不再交互询问
+        self.source_lang = trans_cfg.get('source_lang') or self.detect_source_language()
+        self.target_langs = list(trans_cfg.get('target_langs') or []) or self.select_target_languages()
+        self.target_lang = self.target_langs[0]  # 单语言接口使用的默认目标语言
+        self.configure_concurrency()
+        self.api_url = config['api']['deepseek_url']
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+        self.font_cache = {}
+        self.setup_fonts()
+        self.segment_builder = SegmentBuilder(config)
+        self.segment_filter = SegmentFilter(config)
+        self.eraser = RegionEraser(config)
+        self.recurring_detector = RecurringTextDetector(config)
+        self.translation_memo = {}  # (目标语言, 重复文本) -> 译文
+        self.prefetched = {}  # (目标语言, 文本) -> 自动调优试运行时得到的译文
+        self._segment_cache = {}  # JSON文件 -> 段落列表
+        self._page_keys = {}  # JSON文件 -> (页面感知哈希, 分块签名)
+        self.deduplicator = PageDeduplicator(config)
+        self.manifest = PageManifest(config)
+        self.max_retries = config['api'].get('max_retries', 3)  # 从配置获取或默认3次
+        self.retry_delay = config['api'].get('retry_delay', 5)  # 从配置获取或默认5秒
+        self.deadline = Deadline(config)
+        self.glossary = Glossary.get(config)
+        self._deadline_skipped = set()  # OCR阶段因截止时间跳过的JSON文件
+
+    def configure_concurrency(self):
+        """读取并发设置(自动调优改写配置后重新读取)"""
+        trans_cfg = self.config.get('translation', {})
+        self.max_parallel_langs = max(1, trans_cfg.get('max_parallel_langs', 3))
+        self.page_workers = max(1, self.config['processing'].get('thread_count', 4))  # 每页并发的翻译请求数
+        # 所有语言、所有页面共享的并发请求上限，0为不限制
+        max_inflight = trans_cfg.get('max_inflight_requests', 0)
+        self._inflight = threading.BoundedSemaphore(max_inflight) if max_inflight > 0 else None
+
+    def detect_source_language(self):
+        """自动检测源PDF语言，处理未识别情况"""
+        pdf_path = self.config['input']['pdf_path']
+
+        # 提取样本文本
+        try:
+            import fitz
+            doc = fitz.open(pdf_path)
+            text = ""
+            for page in doc:
+                text += page.get_text()
+                if len(text) > 500:
+                    break
+            text_sample = text[:500]
+        except Exception as e:
+            print(f"提取PDF文本失败: {e}")
+            text_sample = ""
+
+        # 检测语言
+        try:
+            from langdetect import detect, LangDetectException
+            DetectorFactory.seed = 0
+            lang_code = detect(text_sample) if text_sample else None
+        except LangDetectException:
+            lang_code = None
+
+        if lang_code is None:
+            print("\n无法自动确定文档语言，请手动选择:")
+        else:
+            lang_name = self.LANGUAGE_MAP.get(lang_code, ('未知', ''))[0]
+            print(f"\n检测到输入PDF可能语言: {lang_name}")
+            confirm = input("是否使用此语言作为源语言? (Y/n): ").strip().lower()
+            if confirm != 'n':
+                return lang_code
+
+        # 手动选择语言
+        print("\n请选择源语言:")
+        for i, (code, (name, _)) in enumerate(self.LANGUAGE_MAP.items(), 1):
+            print(f"{i}. {name} ({code})")
+
+        while True:
+            try:
+                choice = input("请输入数字选择语言: ").strip()
+                if choice:
+                    lang_map = {str(i): code for i, (code, _) in enumerate(self.LANGUAGE_MAP.items(), 1)}
+                    return lang_map[choice]
+            except:
+                print("无效输入，请重新选择")
+
+    def _translate_with_deepseek(self, text: str, src_lang: str, target_lang: str) -> str:
+        """使用DeepSeek API翻译文本"""
+        try:
+            if src_lang == target_lang:
+                return text
+
+            target_language_name = self.LANGUAGE_MAP.get(target_lang, ("未知语言", ""))[0]
+            source_language_name = self.LANGUAGE_MAP.get(src_lang, ("未知语言", ""))[0]
+
+            headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            }
+
+            prompt = (
+                f"你是一名专业的翻译官，能够将{source_language_name}准确翻译成{target_language_name}。\n"
+                f"严格只输出翻译后的内容，不要添加任何解释、注解或额外信息。\n"
+                f"保持专业术语准确，保留换行和格式。\n"
+                f"请将以下{source_language_name}内容翻译成{target_language_name}：\n{text}"
+            )
+
+            payload = {
+                "model": "deepseek-chat",
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": "你是一名专业的翻译官，能够准确翻译各种语言内容。严格只输出翻译后的内容，不要添加任何解释、注解或额外信息。"
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                "temperature": 0.3,
+                "max_tokens": 2000
+            }
+
+            response = requests.post(self.api_url, headers=headers, json=payload)
+            response.raise_for_status()
+
+            return response.json()["choices"][0]["message"]["content"]
+
+        except Exception as e:
+            print(f"翻译失败: {str(e)}")
+            return f"[TRANSLATION ERROR] {text}"
+
+    def select_target_language(self):
+        """交互式选择目标语言"""
+        print("\n请选择目标语言:")
+        for i, (code, (name, _)) in enumerate(self.LANGUAGE_MAP.items(), 1):
+            print(f"{i}. {name} ({code})")
+
+        while True:
+            try:
+                choice = input("请输入数字选择语言 (默认1-英语): ").strip()
+                if not choice:
+                    return "en"
+
+                lang_map = {str(i): code for i, (code, _) in enumerate(self.LANGUAGE_MAP.items(), 1)}
+                target_lang = lang_map.get(choice, "en")
+                print(f"\n已选择: {self.LANGUAGE_MAP.get(target_lang, ('英语', ''))[0]}")
+                return target_lang
+            except Exception as e:
+                print(f"无效输入: {e}")
+
+    def select_target_languages(self):
+        """交互式选择一个或多个目标语言(多个数字用逗号分隔)"""
+        print("\n请选择目标语言 (可输入多个数字，用逗号分隔):")
+        for i, (code, (name, _)) in enumerate(self.LANGUAGE_MAP.items(), 1):
+            print(f"{i}. {name} ({code})")
+
+        lang_map = {str(i): code for i, (code, _) in enumerate(self.LANGUAGE_MAP.items(), 1)}
+        while True:
+            choice = input("请输入数字选择语言 (默认1-英语): ").strip()
+            if not choice:
+                return ["en"]
+
+            choices = [item.strip() for item in re.split(r'[,，\s]+', choice) if item.strip()]
+            if choices and all(item in lang_map for item in choices):
+                target_langs = list(dict.fromkeys(lang_map[item] for item in choices))
+                names = ", ".join(self.LANGUAGE_MAP[code][0] for code in target_langs)
+                print(f"\n已选择: {names}")
+                return target_langs
+            print("无效输入，请重新选择")
+
+    def setup_fonts(self):
+        """初始化多语言字体支持"""
+        self.font_dirs = [
+            "/usr/share/fonts",
+            "/usr/local/share/fonts",
+            os.path.expanduser("~/.local/share/fonts"),
+            os.path.expanduser("~/.fonts"),
+            "/mnt/c/Windows/Fonts"
+        ]
+
+    def find_font(self, font_name):
+        """在系统中查找字体文件"""
+        for font_dir in self.font_dirs:
+            if not os.path.exists(font_dir):
+                continue
+
+            for root, _, files in os.walk(font_dir):
+                for filename in files:
+                    if filename.lower() == font_name.lower():
+                        return os.path.join(root, filename)
+
+        try:
+            result = subprocess.run(["fc-match", "-f", "%{file}", font_name],
+                                    capture_output=True,
+                                    text=True,
+                                    check=True)
+            if result.returncode == 0 and os.path.exists(result.stdout.strip()):
+                return result.stdout.strip()
+        except:
+            pass
+
+        return None
+
+    def get_best_font(self, text, is_bold=False):
+        """根据文本内容选择最合适的字体"""
+        script = self.detect_script(text)
+
+        if script == "cjk":
+            font_name = "NotoSansCJK-Regular.ttc" if not is_bold else "NotoSansCJK-Bold.ttc"
+        elif script == "korean":
+            font_name = "NanumGothic.ttf" if not is_bold else "NanumGothicBold.ttf"
+        elif script == "japanese":
+            font_name = "NotoSansJP-Regular.otf" if not is_bold else "NotoSansJP-Bold.otf"
+        elif script == "cyrillic":
+            font_name = "NotoSans-Regular.ttf" if not is_bold else "NotoSans-Bold.ttf"
+        else:
+            font_name = "Arial.ttf" if not is_bold else "Arial Bold.ttf"
+
+        font_key = f"{font_name}_{is_bold}"
+        if font_key in self.font_cache:
+            metrics.record_cache("font_path", True)
+            return self.font_cache[font_key]
+        metrics.record_cache("font_path", False)
+
+        font_path = self.find_font(font_name)
+        if font_path:
+            self.font_cache[font_key] = font_path
+            return font_path
+
+        fallback = self.find_font("Arial.ttf") or self.find_font("DejaVuSans.ttf")
+        if fallback:
+            self.font_cache[font_key] = fallback
+            return fallback
+
+        raise ValueError(f"找不到合适的字体: {font_name}")
+
+    def detect_script(self, text):
+        """检测文本的主要文字系统"""
+        if not text:
+            return "latin"
+
+        for char in text:
+            if '\u4e00' <= char <= '\u9fff':
+                return "cjk"
+            elif '\uac00' <= char <= '\ud7a3':
+                return "korean"
+            elif '\u3040' <= char <= '\u30ff':
+                return "japanese"
+            elif '\u0400' <= char <= '\u04ff':
+                return "cyrillic"
+
+        return "latin"
+
+    def language_names(self, target_lang=None):
+        """(源语言名称, 目标语言名称)，用于提示词"""
+        target_lang = target_lang or self.target_lang
+        target_language_name = self.LANGUAGE_MAP.get(target_lang, ("英语", ""))[0]
+        source_language_name = self.LANGUAGE_MAP.get(self.source_lang, ("自动检测", ""))[0]
+        return source_language_name, target_language_name
+
+    def build_messages(self, text, target_lang=None, terms=None):
+        """单段翻译的提示词消息(翻译与预估共用)，未传入terms时按术语表匹配"""
+        target_lang = target_lang or self.target_lang
+        if terms is None:
+            terms = self.glossary.find(text, target_lang)
+        return translation_messages(text, *self.language_names(target_lang), terms)
+
+    def translate_text(self, text, target_lang=None, pressured=False):
+        """使用 DeepSeek Chat API 进行翻译，pressured为截止时间模式下进度落后(减少重试)"""
+        target_lang = target_lang or self.target_lang
+        if self.source_lang == target_lang:
+            return text  # 相同语言不翻译
+
+        # 只注入原文中实际出现的术语
+        terms = self.glossary.find(text, target_lang)
+        payload = {
+            "model": "deepseek-chat",
+            "messages": self.build_messages(text, target_lang, terms),
+            "temperature": 0.1,
+        }
+
+        translated_text = self._request(payload, pressured)
+        if translated_text is None:
+            return text
+        missing = self.glossary.verify(translated_text, terms)
+        if missing and self.glossary.retry_missing and not pressured:
+            # 译文未使用术语表译法时追加一次修正请求，修正后仍缺失更多时保留原译文
+            corrected = self._request(dict(payload, messages=correction_messages(
+                payload["messages"], translated_text, missing)), pressured)
+            if corrected is not None and len(self.glossary.verify(corrected, terms)) < len(missing):
+                metrics.inc("glossary_corrections_total")
+                return corrected
+        return translated_text
+
+    def translate_batch(self, texts, target_lang=None, pressured=False):
+        """一次请求翻译多个段落(截止时间模式下进度落后时使用)，结果条数不符时返回None"""
+        target_lang = target_lang or self.target_lang
+        if self.source_lang == target_lang:
+            return list(texts)
+
+        terms = list(dict.fromkeys(term for text in texts for term in self.glossary.find(text, target_lang)))
+        payload = {
+            "model": "deepseek-chat",
+            "messages": batch_messages(texts, *self.language_names(target_lang), terms[:self.glossary.max_terms]),
+            "temperature": 0.1,
+        }
+
+        translated_text = self._request(payload, pressured)
+        if translated_text is None:
+            return None
+        parts = re.split(r'\[\[(\d+)\]\]', translated_text)
+        results = {int(number): part.strip() for number, part in zip(parts[1::2], parts[2::2])}
+        if sorted(results) != list(range(1, len(texts) + 1)):
+            print(f"批量翻译结果段数不符({len(results)}/{len(texts)})，改为逐段翻译")
+            return None
+        # 批量模式处于时间压力下，只校验记录，不追加修正请求
+        for i, text in enumerate(texts, 1):
+            self.glossary.verify(results[i], self.glossary.find(text, target_lang))
+        return [results[i] for i in range(1, len(texts) + 1)]
+
+    def _request(self, payload, pressured=False):
+        """发送翻译请求并重试，返回译文，失败时返回None
+
+        截止时间模式下超时与重试等待不超过剩余时间，进度落后时减少重试次数，时间用尽时抛出DeadlineExceeded。
+        """
+        max_retries = self.deadline.retries(self.max_retries, pressured)
+        for attempt in range(max_retries):
+            if self.deadline.expired():
+                raise DeadlineExceeded()
+            request_start = time.perf_counter()
+            try:
+                with self._inflight or nullcontext(), profiler.timed("http"):
+                    response = requests.post(
+                        self.api_url,
+                        headers=self.headers,
+                        json=payload,
+                        timeout=max(1, self.deadline.cap(self.config['api'].get('timeout', 30)))
+                    )
+                metrics.record_api_call("deepseek", time.perf_counter() - request_start,
+                                        status=str(response.status_code))
+                response.raise_for_status()
+                data = response.json()
+                metrics.record_usage("deepseek", data.get("usage"))
+                translated_text = data["choices"][0]["message"]["content"]
+                return translated_text.strip()
+
+            except requests.exceptions.RequestException as e:
+                if getattr(e, "response", None) is None:
+                    # 超时或连接错误没有响应对象，单独记录延迟
+                    metrics.record_api_call("deepseek", time.perf_counter() - request_start, status="error")
+                print(f"翻译尝试 {attempt + 1}/{max_retries} 失败: {str(e)}")
+                if attempt < max_retries - 1:
+                    metrics.record_retry("deepseek")
+                    wait_time = self.deadline.cap(self.retry_delay * (attempt + 1))
+                    print(f"等待 {wait_time:.0f}秒后重试...")
+                    time.sleep(wait_time)
+                else:
+                    print("达到最大重试次数，保留原文")
+                    return None
+            except Exception as e:
+                print(f"翻译过程中发生意外错误: {str(e)}")
+                return None
+
+    def load_json_file(self, json_file):
+        """安全加载JSON文件"""
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return [data] if isinstance(data, dict) else data if isinstance(data, list) else []
+        except Exception as e:
+            print(f"加载JSON文件失败: {e}")
+            return []
+
+    def build_segments(self, data):
+        """过滤无需翻译的行并合并为段落，数据中没有识别文本时返回None"""
+        if not ("rec_texts" in data and "rec_boxes" in data and len(data["rec_texts"]) == len(data["rec_boxes"])):
+            return None
+
+        texts, boxes, scores = data["rec_texts"], data["rec_boxes"], data.get("rec_scores")
+        keep, skipped = self.segment_filter.filter_lines(texts, boxes, scores)
+        for reason in skipped.values():
+            metrics.inc("lines_skipped_total", reason=reason)
+
+        segments = self.segment_builder.build(
+            [texts[i] for i in keep],
+            [boxes[i] for i in keep],
+            [scores[i] for i in keep] if scores is not None else None
+        )
+        metrics.inc("ocr_lines_total", len(texts))
+        metrics.inc("segments_total", len(segments))
+        return segments
+
+    def load_segments(self, json_file):
+        """加载JSON文件并构建段落(结果按文件缓存)"""
+        if json_file not in self._segment_cache:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._segment_cache[json_file] = self.build_segments(data)
+            if data.get("deadline_skipped"):
+                self._deadline_skipped.add(json_file)
+            if data.get("page_hash") and data.get("page_signature"):
+                self._page_keys[json_file] = (int(data["page_hash"], 16), data["page_signature"])
+        return self._segment_cache[json_file]
+
+    def get_page_key(self, json_file):
+        """获取OCR阶段记录的 (页面感知哈希, 分块签名)，没有时返回None"""
+        if json_file not in self._page_keys:
+            try:
+                with open(json_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception:
+                data = {}
+            self._page_keys[json_file] = (int(data["page_hash"], 16), data["page_signature"]) \
+                if data.get("page_hash") and data.get("page_signature") else None
+        return self._page_keys[json_file]
+
+    def scan_recurring_text(self, json_files):
+        """翻译前扫描全文档，找出在多页相同位置重复出现的文本"""
+        page_segments = {}
+        for json_file in json_files:
+            try:
+                segments = self.load_segments(json_file)
+            except Exception as e:
+                print(f"加载JSON文件失败: {e}")
+                continue
+            if segments:
+                page_segments[json_file] = segments
+
+        count = self.recurring_detector.scan(page_segments)
+        if count:
+            print(f"检测到 {count} 处重复出现的页眉/页脚文本，将只翻译一次")
+
+    def prefetch_translation(self, text, target_lang):
+        """提前翻译一段文本(自动调优试运行测量请求延迟)，译文在正式翻译该段落时复用"""
+        translated = self.translate_text(text, target_lang)
+        if translated != text:
+            self.prefetched[(target_lang, normalize_text(text))] = translated
+        return translated
+
+    def translate_segment(self, segment, target_lang=None, pressured=False):
+        """翻译单个段落，重复出现的文本复用已有译文"""
+        target_lang = target_lang or self.target_lang
+        key = (target_lang, normalize_text(segment["text"]))
+        prefetched = self.prefetched.pop(key, None) if self.prefetched else None
+        if not self.recurring_detector.is_recurring(segment["text"], segment["coords"]):
+            if prefetched is not None:
+                return prefetched
+            return self.translate_text(segment["text"], target_lang, pressured)
+
+        if prefetched is not None:
+            self.translation_memo.setdefault(key, prefetched)
+        if key in self.translation_memo:
+            metrics.record_cache("recurring_text", True)
+            return self.translation_memo[key]
+        metrics.record_cache("recurring_text", False)
+        translated = self.translate_text(segment["text"], target_lang, pressured)
+        self.translation_memo[key] = translated
+        return translated
+
+    def translate_segments(self, segments, target_lang=None, pressured=False):
+        """翻译一页的全部段落(最多page_workers个请求并发)；进度落后时将未命中缓存的段落合并为一次请求"""
+        target_lang = target_lang or self.target_lang
+        if not (pressured and self.deadline.batch_under_pressure and len(segments) > 1):
+            if self.page_workers <= 1 or len(segments) <= 1:
+                return [self.translate_segment(segment, target_lang, pressured) for segment in segments]
+            with ThreadPoolExecutor(max_workers=min(self.page_workers, len(segments))) as executor:
+                return list(executor.map(lambda segment: self.translate_segment(segment, target_lang, pressured),
+                                         segments))
+
+        results = [None] * len(segments)
+        pending = []
+        for index, segment in enumerate(segments):
+            key = (target_lang, normalize_text(segment["text"]))
+            if self.recurring_detector.is_recurring(segment["text"], segment["coords"]) and key in self.translation_memo:
+                metrics.record_cache("recurring_text", True)
+                results[index] = self.translation_memo[key]
+            else:
+                pending.append(index)
+
+        translated = self.translate_batch([segments[i]["text"] for i in pending], target_lang, pressured) \
+            if len(pending) > 1 else None
+        if translated is None:
+            for index in pending:
+                results[index] = self.translate_segment(segments[index], target_lang, pressured)
+            return results
+
+        metrics.inc("translate_batches_total", reason="deadline")
+        for index, text in zip(pending, translated):
+            segment = segments[index]
+            if self.recurring_detector.is_recurring(segment["text"], segment["coords"]):
+                self.translation_memo[(target_lang, normalize_text(segment["text"]))] = text
+            results[index] = text
+        return results
+
+    def process_blocks(self, json_file, target_lang=None, pressured=False):
+        """处理JSON文件中的区块 - 修改为读取所有文本框的坐标和文本信息"""
+        try:
+            # 段落在各目标语言间共享，由batch_process_images在全部语言完成后释放
+            segments = self.load_segments(json_file)
+        except Exception as e:
+            print(f"加载JSON文件失败: {e}")
+            return self.get_default_blocks()
+
+        boxes = []
+
+        # 检查并处理文本框信息：先将逐行结果合并为段落，每段只翻译一次
+        if segments is not None:
+            for segment, translated in zip(segments, self.translate_segments(segments, target_lang, pressured)):
+                text_lines = [line.strip() for line in translated.split('\n') if line.strip()]
+
+                boxes.append({
+                    "coords": segment["coords"],
+                    "erase_boxes": segment["line_boxes"],
+                    "text": text_lines,
+                    "is_bold": False,
+                    "left_margin": 30
+                })
+
+            # 所有文本都无需翻译时保持原图不变
+            return boxes
+
+        # 如果没有找到文本框信息，尝试使用dt_polys作为备选
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if "dt_polys" in data and len(data["dt_polys"]) > 0:
+            for poly in data["dt_polys"]:
+                if len(poly) >= 4:
+                    # 计算文本框的边界坐标
+                    x_coords = [p[0] for p in poly]
+                    y_coords = [p[1] for p in poly]
+                    box_coords = [min(x_coords), min(y_coords), max(x_coords), max(y_coords)]
+
+                    # 添加一个默认文本（因为没有识别到的文本内容）
+                    boxes.append({
+                        "coords": box_coords,
+                        "text": ["[待翻译文本]"],
+                        "is_bold": False,
+                        "left_margin": 30
+                    })
+
+        return boxes if boxes else self.get_default_blocks()
+
+    def get_default_blocks(self):
+        """获取默认处理块配置"""
+        return [{
+            "coords": [100, 100, 500, 200],
+            "text": ["默认标题"],
+            "is_bold": True,
+            "left_margin": 50
+        }]
+
+    @profiled("wrap_text")
+    def wrap_text(self, text, font, max_width):
+        """将文本按单词分割为多行"""
+        if self.detect_script(text) in ["cjk", "korean", "japanese"]:
+            # CJK文本按字符换行
+            lines = []
+            current_line = []
+            current_width = 0
+            for char in text:
+                char_width = font.getbbox(char)[2] - font.getbbox(char)[0]
+                if current_line and current_width + char_width > max_width:
+                    lines.append(''.join(current_line))
+                    current_line = [char]
+                    current_width = char_width
+                else:
+                    current_line.append(char)
+                    current_width += char_width
+            if current_line:
+                lines.append(''.join(current_line))
+            return lines
+        else:
+            # 非CJK文本按单词换行
+            words = text.split(' ')
+            lines = []
+            current_line = []
+            current_width = 0
+            space_width = font.getbbox(' ')[2]
+            for word in words:
+                word_width = font.getbbox(word)[2] - font.getbbox(word)[0]
+                if current_line and current_width + word_width > max_width:
+                    lines.append(' '.join(current_line))
+                    current_line = [word]
+                    current_width = word_width
+                else:
+                    current_line.append(word)
+                    current_width += word_width + space_width
+            if current_line:
+                lines.append(' '.join(current_line))
+            return lines
+
+    @profiled("font_fit")
+    def get_optimal_font(self, draw, text_lines, font_path, box_width, box_height):
+        """计算最佳字体大小"""
+        max_font_size = 150
+        min_font_size = 8
+        full_text = '\n'.join(text_lines)
+        paragraphs = full_text.split('\n')
+
+        for font_size in range(max_font_size, min_font_size - 1, -1):
+            try:
+                font = ImageFont.truetype(font_path, font_size)
+                total_height = 0
+                is_fit = True
+                for para in paragraphs:
+                    wrapped_lines = self.wrap_text(para, font, box_width * 0.95)
+                    for line in wrapped_lines:
+                        line_width = font.getbbox(line)[2] - font.getbbox(line)[0]
+                        line_height = font.getbbox(line)[3] - font.getbbox(line)[1]
+                        total_height += line_height
+                        if line_width > box_width * 0.95:
+                            is_fit = False
+                            break
+                    total_height += 5
+                    if not is_fit or total_height > box_height * 0.95:
+                        is_fit = False
+                        break
+                if is_fit:
+                    return font_size
+            except:
+                continue
+        return min_font_size
+
+    def add_text(self, draw, coords, text_lines, is_bold=False, left_margin=30, right_margin=0, background='white'):
+        """在指定区域添加文本（严格左对齐），background为擦除后的背景色(文字描边使用)"""
+        try:
+            full_text = '\n'.join(text_lines)
+            font_path = self.get_best_font(full_text, is_bold)
+            if not font_path:
+                print("警告: 找不到合适的字体")
+                return
+
+            box_width = coords[2] - coords[0] - left_margin - right_margin
+            box_height = coords[3] - coords[1]
+            font_size = self.get_optimal_font(draw, text_lines, font_path, box_width, box_height)
+            font = ImageFont.truetype(font_path, font_size)
+
+            paragraphs = full_text.split('\n')
+            wrapped_lines_all = []
+            for para in paragraphs:
+                wrapped_lines = self.wrap_text(para, font, box_width)
+                wrapped_lines_all.extend(wrapped_lines)
+
+            # 计算起始位置（严格左对齐）
+            x_pos = coords[0] + left_margin  # 固定左边距
+            y_pos = coords[1]  # 从文本框顶部开始
+
+            for line in wrapped_lines_all:
+                # 绘制文本阴影（可选）
+                for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+                    draw.text((x_pos + dx, y_pos + dy), line, font=font, fill=background)
+
+                # 绘制文本（严格左对齐）
+                draw.text((x_pos, y_pos), line, font=font, fill='black')
+
+                # 移动到下一行（使用字体实际高度）
+                y_pos += font.getbbox(line)[3] - font.getbbox(line)[1] + 2  # 2像素行间距
+        except Exception as e:
+            print(f"文本添加错误: {e}")
+
+    def process_single_image(self, json_file, image_directory, output_directory, target_lang=None, pressured=False):
+        """处理单张图片（带完善错误处理）"""
+        target_lang = target_lang or self.target_lang
+        try:
+            # 从JSON文件名推断图片文件名
+            json_basename = os.path.basename(json_file)
+            image_filename = json_basename.replace('_res.json',
+                                                   '.jpg') if '_res.json' in json_basename else json_basename.replace(
+                '.json', '.jpg')
+
+            page_match = re.search(r'page_(\d+)', json_basename)
+            page_num = int(page_match.group(1)) if page_match else None
+            image_path = self.manifest.get(page_num, "image") if page_num is not None else None
+            if image_path is None and page_num is not None and \
+                    (self.manifest.get(page_num, "tiles") or PageTiler.is_tiled(image_directory, page_num)):
+                # 超大页面没有整页图片，逐个图块渲染译文
+                return self._process_tiled_page(json_file, image_directory, output_directory, target_lang, page_num,
+                                                pressured)
+
+            # 未登记在页面产物索引中时按约定路径查找，最后才遍历目录
+            if image_path is None and os.path.exists(os.path.join(image_directory, image_filename)):
+                image_path = os.path.join(image_directory, image_filename)
+            if image_path is None:
+                for root, _, files in os.walk(image_directory):
+                    if image_filename in files:
+                        image_path = os.path.join(root, image_filename)
+                        break
+
+            if not image_path:
+                print(f"警告: 找不到图片文件 {image_filename}")
+                return False
+
+            # 准备输出路径
+            lang_suffix = f"_{target_lang}" if target_lang != "en" else ""
+            output_filename = f"translated{lang_suffix}_{os.path.basename(image_filename)}"
+            output_path = os.path.join(output_directory, output_filename)
+
+            print(f"\n处理文件: {json_file}")
+            print(f"使用图片: {image_path}")
+            print(f"输出到: {output_path}")
+
+            if self._deadline_reached(json_file):
+                return self.mark_untranslated(image_path, output_path, page_num, target_lang)
+
+            # 重复页面直接复用已翻译的渲染结果
+            lang_key = f"{self.source_lang}_{target_lang}"
+            page_key = self.get_page_key(json_file) if self.deduplicator.enabled else None
+            if page_key is not None:
+                cached_render = self.deduplicator.find_render(*page_key, lang_key)
+                metrics.record_cache("page_render", cached_render is not None)
+                if cached_render:
+                    print(f"重复页面，复用翻译结果: {cached_render}")
+                    os.makedirs(output_directory, exist_ok=True)
+                    shutil.copyfile(cached_render, output_path)
+                    self._register_output(page_num, target_lang, output_path)
+                    return True
+
+            # 处理图片
+            try:
+                with metrics.timer("translate", page=page_num):
+                    boxes = self.process_blocks(json_file, target_lang, pressured)
+            except DeadlineExceeded:
+                return self.mark_untranslated(image_path, output_path, page_num, target_lang)
+
+            if not boxes:
+                # 空白页或没有需要翻译的文本，原图直接进入合并阶段
+                os.makedirs(output_directory, exist_ok=True)
+                shutil.copyfile(image_path, output_path)
+                self._register_output(page_num, target_lang, output_path)
+                return True
+
+            with metrics.timer("render", page=page_num):
+                img = Image.open(image_path).convert('RGB')
+                self.draw_boxes(img, boxes)
+
+                os.makedirs(output_directory, exist_ok=True)
+                with profiler.timed("jpeg_encode"):
+                    img.save(output_path, quality=100)
+            if page_key is not None:
+                self.deduplicator.register_render(*page_key, lang_key, output_path)
+            self._register_output(page_num, target_lang, output_path)
+            return True
+        except Exception as e:
+            print(f"处理文件 {json_file} 失败: {e}")
+            return False
+
+    def _deadline_reached(self, json_file):
+        """截止时间已到，或OCR阶段已因截止时间跳过该页"""
+        if self.deadline.expired():
+            return True
+        try:
+            self.load_segments(json_file)
+        except Exception:
+            return False
+        return json_file in self._deadline_skipped
+
+    def mark_untranslated(self, source, output_path, page_num, target_lang):
+        """输出带未翻译标记的原图，分块页面复制全部图块并在左上角图块上标记"""
+        metrics.inc("pages_untranslated_total", reason="deadline")
+        print(f"截止时间已到，第{page_num}页保留原文并标记为未翻译")
+        if os.path.isdir(source):
+            manifest = PageTiler.load_manifest(source)
+            Path(output_path).mkdir(parents=True, exist_ok=True)
+            for tile in manifest["tiles"]:
+                shutil.copyfile(Path(source) / tile["name"], Path(output_path) / tile["name"])
+            PageTiler.write_manifest(output_path, manifest)
+            first = min(manifest["tiles"], key=lambda tile: (tile["box"][1], tile["box"][0]))
+            self._draw_mark(Path(output_path) / first["name"], Path(output_path) / first["name"])
+        else:
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            self._draw_mark(source, output_path)
+        self._register_output(page_num, target_lang, output_path)
+        return True
+
+    def _draw_mark(self, image_path, output_path):
+        with Image.open(image_path) as src:
+            img = src.convert('RGB')
+        draw = ImageDraw.Draw(img)
+        text = self.deadline.mark_text
+        font_size = max(16, img.width // 60)
+        try:
+            font = ImageFont.truetype(self.get_best_font(text), font_size)
+        except Exception:
+            font = ImageFont.load_default()
+        x0, y0, x1, y1 = draw.textbbox((0, 0), text, font=font)
+        pad = font_size // 2
+        draw.rectangle([0, 0, x1 - x0 + pad * 2, y1 - y0 + pad * 2], fill=(255, 243, 205), outline=(200, 30, 30))
+        draw.text((pad - x0, pad - y0), text, font=font, fill=(200, 30, 30))
+        img.save(output_path, quality=100)
+
+    def _register_output(self, page_num, target_lang, output_path):
+        if page_num is not None:
+            self.manifest.register(page_num, f"translated:{target_lang}", output_path)
+
+    @profiled("draw")
+    def draw_boxes(self, img, boxes, offset=(0, 0)):
+        """擦除原文并绘制译文，offset为画布左上角在整页中的像素坐标(分块渲染时使用)
+
+        段落的原始行框先一次性擦除(按周围像素估计的背景色填充)，译文再在合并后的外接框内重新排版。
+        """
+        dx, dy = offset
+
+        def shift(c):
+            return [c[0] - dx, c[1] - dy, c[2] - dx, c[3] - dy]
+
+        erase_groups = [box.get("erase_boxes", [box["coords"]]) for box in boxes]
+        colors = self.eraser.erase(img, [shift(c) for group in erase_groups for c in group])
+
+        draw = ImageDraw.Draw(img)
+        start = 0
+        for box, group in zip(boxes, erase_groups):
+            # 译文描边使用该段落各行背景色的均值
+            background = tuple(int(v) for v in colors[start:start + len(group)].mean(axis=0)) if group else 'white'
+            start += len(group)
+            if box.get("text"):
+                self.add_text(
+                    draw=draw,
+                    coords=shift(box["coords"]),
+                    text_lines=box["text"],
+                    is_bold=box.get("is_bold", False),
+                    left_margin=box.get("left_margin", 30),
+                    background=background
+                )
+
+    def _process_tiled_page(self, json_file, image_directory, output_directory, target_lang, page_num, pressured=False):
+        """分块页面：每次只加载一个图块，绘制与其相交的译文框(跨图块的框在各图块中按偏移重复绘制)"""
+        tile_dir = PageTiler.tile_dir(image_directory, page_num)
+        lang_suffix = f"_{target_lang}" if target_lang != "en" else ""
+        output_tile_dir = Path(output_directory) / f"translated{lang_suffix}_page_{page_num}_tiles"
+        print(f"\n处理文件: {json_file}")
+        print(f"使用分块图片: {tile_dir}")
+        print(f"输出到: {output_tile_dir}")
+
+        if self._deadline_reached(json_file):
+            return self.mark_untranslated(tile_dir, output_tile_dir, page_num, target_lang)
+        try:
+            with metrics.timer("translate", page=page_num):
+                boxes = self.process_blocks(json_file, target_lang, pressured)
+        except DeadlineExceeded:
+            return self.mark_untranslated(tile_dir, output_tile_dir, page_num, target_lang)
+
+        manifest = PageTiler.load_manifest(tile_dir)
+        output_tile_dir.mkdir(parents=True, exist_ok=True)
+        with metrics.timer("render", page=page_num):
+            for tile in manifest["tiles"]:
+                x0, y0, x1, y1 = tile["box"]
+                hits = [box for box in boxes
+                        if box["coords"][0] < x1 and box["coords"][2] > x0
+                        and box["coords"][1] < y1 and box["coords"][3] > y0]
+                if not hits:
+                    shutil.copyfile(tile_dir / tile["name"], output_tile_dir / tile["name"])
+                    continue
+                with Image.open(tile_dir / tile["name"]) as tile_img:
+                    img = tile_img.convert('RGB')
+                self.draw_boxes(img, hits, offset=(x0, y0))
+                with profiler.timed("jpeg_encode"):
+                    img.save(output_tile_dir / tile["name"], quality=100)
+
+        PageTiler.write_manifest(output_tile_dir, manifest)
+        self._register_output(page_num, target_lang, output_tile_dir)
+        return True
+
+    def batch_process_images(self, json_directory, image_directory, output_directory, target_langs=None):
+        """批量处理目录中的所有JSON文件（按数字顺序），多个目标语言时并行输出
+
+        OCR结果只加载并分段一次，各目标语言共享同一份段落，翻译与渲染按语言并行。
+        返回 {目标语言: 输出目录}，多个目标语言时每种语言写入输出目录下的同名子目录。
+        """
+        target_langs = list(target_langs or self.target_langs)
+        output_dirs = self.output_directories(output_directory, target_langs)
+
+        # 获取所有JSON文件
+        # 优先使用页面产物索引中本次运行的OCR结果(已按页码排序)
+        self.manifest.load()
+        json_files = [path for _, path in self.manifest.items("ocr")]
+        if not json_files:
+            for root, _, files in os.walk(json_directory):
+                for file in files:
+                    if file.lower().endswith('.json'):
+                        json_files.append(os.path.join(root, file))
+
+            # 按数字顺序排序（关键修改点）
+            json_files.sort(key=lambda x: int(re.search(r'page_(\d+)', x).group(1)))
+
+        if not json_files:
+            print(f"在目录 {json_directory} 中没有找到JSON文件")
+            return {}
+
+        # 同时预先加载全部页面的段落，各语言的翻译直接使用缓存
+        self.scan_recurring_text(json_files)
+
+        try:
+            if len(target_langs) == 1:
+                self._process_language(json_files, image_directory, output_dirs[target_langs[0]], target_langs[0])
+            else:
+                workers = min(self.max_parallel_langs, len(target_langs))
+                print(f"并行翻译 {len(target_langs)} 种目标语言: {', '.join(target_langs)} ({workers} 个线程)")
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = [
+                        executor.submit(self._process_language, json_files, image_directory,
+                                        output_dirs[lang], lang, f"translate_{lang}")
+                        for lang in target_langs
+                    ]
+                    for future in futures:
+                        future.result()
+        finally:
+            self._segment_cache.clear()
+            self.deduplicator.save()
+
+        return output_dirs
+
+    def output_directories(self, output_directory, target_langs=None):
+        """各目标语言的输出目录：单一语言直接使用输出目录，多个语言使用同名子目录"""
+        target_langs = list(target_langs or self.target_langs)
+        if len(target_langs) == 1:
+            output_dirs = {target_langs[0]: output_directory}
+        else:
+            output_dirs = {lang: os.path.join(output_directory, lang) for lang in target_langs}
+        for directory in output_dirs.values():
+            os.makedirs(directory, exist_ok=True)
+        return output_dirs
+
+    def _process_language(self, json_files, image_directory, output_directory, target_lang, queue="translate"):
+        """将所有页面翻译为一种目标语言"""
+        processed_count = 0
+        failed_count = 0
+        started = time.time()
+
+        for index, json_file in enumerate(tqdm(json_files, desc=f"处理进度({target_lang})")):
+            metrics.set_queue_depth(queue, len(json_files) - index)
+            # 截止时间模式下按已完成页面的速度判断是否落后，落后时减少重试并批量翻译
+            pressured = self.deadline.behind(started, index, len(json_files))
+            try:
+                if self.process_single_image(json_file, image_directory, output_directory, target_lang, pressured):
+                    processed_count += 1
+                else:
+                    failed_count += 1
+                    time.sleep(self.deadline.cap(10))
+            except Exception as e:
+                print(f"处理文件 {json_file} 时发生严重错误: {e}")
+                failed_count += 1
+
+        metrics.set_queue_depth(queue, 0)
+        metrics.inc("pages_total", processed_count, stage="translate", result="ok")
+        metrics.inc("pages_total", failed_count, stage="translate", result="failed")
+
+        print(f"\n[{target_lang}] 处理完成! 成功处理 {processed_count} 个文件, 失败 {failed_count} 个")
+        return processed_count, failed_count
+
+    def translate_images(self):
+        """翻译图片内容，返回 {目标语言: 翻译后图片目录}"""
+        print("\n" + "=" * 50)
+        print("步骤3: 翻译图片内容")
+        print("=" * 50)
+
+        json_directory = self.config['output']['json_dir']
+        image_directory = self.config['output']['image_dir']
+        output_directory = self.config['output']['translated_image_dir']
+
+        return self.batch_process_images(json_directory, image_directory, output_directory)
\ No newline at end of file
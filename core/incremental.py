@@ -0,0 +1,116 @@
+import hashlib
+import re
+from collections import defaultdict
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+from utils.metrics import metrics
+
+
+def page_fingerprint(page, mode="auto", raster_dpi=36):
+    """计算页面指纹：有文本层时使用文本哈希，否则使用低分辨率栅格哈希"""
+    if mode in ("auto", "text"):
+        text = re.sub(r'\s+', ' ', page.get_text("text")).strip()
+        if text or mode == "text":
+            digest = hashlib.sha1()
+            digest.update(f"{page.rect.width:.1f}x{page.rect.height:.1f}".encode())
+            digest.update(text.encode("utf-8"))
+            return "t:" + digest.hexdigest()
+
+    pix = page.get_pixmap(dpi=raster_dpi, colorspace=fitz.csGRAY, alpha=False)
+    return "r:" + hashlib.sha1(pix.samples).hexdigest()
+
+
+def document_fingerprints(pdf_path, mode="auto", raster_dpi=36):
+    """计算文档每一页的指纹"""
+    with fitz.open(pdf_path) as doc:
+        return [page_fingerprint(page, mode, raster_dpi) for page in doc]
+
+
+class IncrementalTranslator:
+    """修订版文档的增量翻译：只翻译变化的页面，未变化页面从上一版译文复制"""
+
+    def __init__(self, config):
+        inc_cfg = config.get('incremental', {})
+        self.enabled = inc_cfg.get('enabled', False)
+        self.previous_pdf = inc_cfg.get('previous_pdf', '')
+        self.previous_output = inc_cfg.get('previous_output', '')
+        self.mode = inc_cfg.get('fingerprint', 'auto')  # auto / text / raster
+        self.raster_dpi = inc_cfg.get('raster_dpi', 36)
+
+    def is_available(self):
+        """上一版源文件与译文均存在且页数一致时才可增量翻译"""
+        if not (self.enabled and self.previous_pdf and self.previous_output):
+            return False
+        if not (Path(self.previous_pdf).exists() and Path(self.previous_output).exists()):
+            print("增量翻译: 找不到上一版源文件或译文，执行完整翻译")
+            return False
+        with fitz.open(self.previous_pdf) as prev, fitz.open(self.previous_output) as prev_out:
+            if prev.page_count != prev_out.page_count:
+                print("增量翻译: 上一版源文件与译文页数不一致，执行完整翻译")
+                return False
+        return True
+
+    def plan(self, pdf_path):
+        """比对页面指纹，返回 {"reuse": {新页索引: 旧页索引}, "changed": [新页索引]}"""
+        old_prints = document_fingerprints(self.previous_pdf, self.mode, self.raster_dpi)
+        new_prints = document_fingerprints(pdf_path, self.mode, self.raster_dpi)
+
+        # 同一指纹可能出现多次，按出现顺序依次匹配
+        available = defaultdict(list)
+        for index, fingerprint in enumerate(old_prints):
+            available[fingerprint].append(index)
+
+        reuse, changed = {}, []
+        for index, fingerprint in enumerate(new_prints):
+            if available.get(fingerprint):
+                reuse[index] = available[fingerprint].pop(0)
+            else:
+                changed.append(index)
+
+        print(f"增量翻译: 共{len(new_prints)}页, 需重新翻译{len(changed)}页, 复用{len(reuse)}页")
+        return {"reuse": reuse, "changed": changed, "page_count": len(new_prints), "pdf_path": str(pdf_path)}
+
+    @staticmethod
+    def extract_pages(pdf_path, pages, output_path):
+        """将指定页面提取为新的PDF"""
+        with fitz.open(pdf_path) as doc, fitz.open() as subset:
+            for index in pages:
+                subset.insert_pdf(doc, from_page=index, to_page=index)
+            subset.save(str(output_path))
+        return str(output_path)
+
+    def assemble(self, plan, changed_output, output_path, changed_pages=None):
+        """按新文档页序合并：未变化页取自上一版译文，变化页取自本次译文
+
+        changed_pages为本次译文中各页对应的页码(从1开始)，按页码而不是按位置对应；
+        未指定时认为译文包含全部变化页面。没有译文的变化页面(如OCR或翻译失败)使用源文件原页并给出警告。
+        """
+        if changed_pages is None:
+            changed_pages = [index + 1 for index in plan["changed"]] if changed_output else []
+        changed_position = {page - 1: pos for pos, page in enumerate(changed_pages) if page is not None}
+        missing = [index for index in plan["changed"] if index not in changed_position]
+        if missing:
+            print(f"警告: 第{', '.join(str(index + 1) for index in missing)}页没有译文，使用源文件原页")
+            metrics.inc("pages_untranslated_total", len(missing), reason="failed")
+
+        with fitz.open(self.previous_output) as prev_out, fitz.open() as merged:
+            changed_doc = fitz.open(changed_output) if changed_output else None
+            source_doc = fitz.open(plan["pdf_path"]) if missing else None
+            try:
+                for index in range(plan["page_count"]):
+                    if index in plan["reuse"]:
+                        old_index = plan["reuse"][index]
+                        merged.insert_pdf(prev_out, from_page=old_index, to_page=old_index)
+                    elif index in changed_position:
+                        pos = changed_position[index]
+                        merged.insert_pdf(changed_doc, from_page=pos, to_page=pos)
+                    else:
+                        merged.insert_pdf(source_doc, from_page=index, to_page=index)
+            finally:
+                for doc in (changed_doc, source_doc):
+                    if doc is not None:
+                        doc.close()
+            merged.save(str(output_path), garbage=3, deflate=True)
+        return str(output_path)
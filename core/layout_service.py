@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LayoutInferenceService:
+    """进程内共享的版面检测服务：单一ONNX会话、多页批量推理、按页面指纹缓存结果"""
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, config):
+        """获取本进程的服务实例(首次调用时加载模型)"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(config)
+            return cls._instance
+
+    def __init__(self, config):
+        from pdf2zh.doclayout import OnnxModel
+
+        ns_cfg = config.get('non_scanned', {})
+        self.batch_size = max(1, ns_cfg.get('layout_batch_size', 4))
+        self.cache_size = ns_cfg.get('layout_cache_size', 512)  # 内存缓存的页面数
+        self.cache_dir = Path(ns_cfg['layout_cache_dir']) if ns_cfg.get('layout_cache_dir') else None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._batch_supported = True
+
+        model_path = ns_cfg.get('model_path')
+        if model_path and os.path.exists(model_path):
+            self.model = OnnxModel(model_path)
+        else:
+            self.model = OnnxModel.load_available()
+            model_path = getattr(self.model, "model_path", None)
+        self._configure_session(ns_cfg, model_path)
+
+    def _configure_session(self, ns_cfg, model_path):
+        """按配置的线程数重建ONNX Runtime会话"""
+        intra = ns_cfg.get('layout_intra_threads', 0)
+        inter = ns_cfg.get('layout_inter_threads', 0)
+        if not (intra or inter):
+            return
+        if not model_path:
+            logger.warning("Layout session threads need non_scanned.model_path; using default session")
+            return
+
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra
+        options.inter_op_num_threads = inter
+        self.model.model = onnxruntime.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        logger.info(f"Layout session threads: intra={intra}, inter={inter}")
+
+    # ---------- pdf2zh模型接口 ----------
+
+    def predict(self, image, imgsz=1024, **kwargs):
+        """与OnnxModel.predict兼容的接口，优先返回缓存结果"""
+        key = self.fingerprint(image, imgsz)
+        cached = self._lookup(key)
+        if cached is not None:
+            return [self._to_result(cached)]
+        preds = self._infer_batch([image], imgsz)[0]
+        self._store(key, preds)
+        return [self._to_result(preds)]
+
+    # ---------- 批量预取 ----------
+
+    def prefetch(self, pdf_path):
+        """按pdf2zh的渲染方式逐页栅格化，凑满一批即推理并写入缓存
+
+        每页位图约1.4MB，只保留未满批次的页面；页数超过内存缓存容量且未配置磁盘缓存时跳过预取，
+        否则前面的结果会在翻译用到之前被LRU淘汰。
+        """
+        import fitz
+
+        with fitz.open(pdf_path) as doc:
+            if doc.page_count > self.cache_size and not self.cache_dir:
+                logger.info(f"Layout prefetch skipped: {doc.page_count} pages exceed "
+                            f"layout_cache_size={self.cache_size}")
+                return 0
+
+            inferred = 0
+            batches = {}  # 相同输入尺寸的页面才能组成一个批次
+            for page in doc:
+                pix = page.get_pixmap()
+                image = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width, 3)[:, :, ::-1]
+                imgsz = int(pix.height / 32) * 32
+                key = self.fingerprint(image, imgsz)
+                if self._lookup(key) is not None:
+                    continue
+                batch = batches.setdefault((image.shape, imgsz), [])
+                batch.append((key, image))
+                if len(batch) >= self.batch_size:
+                    inferred += self._prefetch_batch(batches.pop((image.shape, imgsz)), imgsz)
+            for (_, imgsz), batch in batches.items():
+                inferred += self._prefetch_batch(batch, imgsz)
+        logger.info(f"Layout prefetch: {inferred} pages inferred")
+        return inferred
+
+    def _prefetch_batch(self, batch, imgsz):
+        preds = self._infer_batch([image for _, image in batch], imgsz)
+        for (key, _), pred in zip(batch, preds):
+            self._store(key, pred)
+        return len(batch)
+
+    def _infer_batch(self, images, imgsz):
+        """对同尺寸图片执行一次批量推理，模型不支持批量时逐张推理"""
+        if len(images) > 1 and self._batch_supported:
+            try:
+                return self._run(images, imgsz)
+            except Exception as e:
+                # 导出的模型批量维度固定为1时退化为逐张推理
+                logger.info(f"Layout model does not support batching, falling back: {str(e)}")
+                self._batch_supported = False
+
+        results = []
+        for image in images:
+            results.extend(self._run([image], imgsz))
+        return results
+
+    def _run(self, images, imgsz):
+        """与OnnxModel.predict相同的前后处理，返回每张图片缩放回原尺寸的检测框"""
+        model = self.model
+        tensors = []
+        for image in images:
+            pix = model.resize_and_pad_image(image, new_shape=imgsz)
+            tensors.append(np.transpose(pix, (2, 0, 1)).astype(np.float32) / 255.0)
+        batch = np.stack(tensors)
+        new_h, new_w = batch.shape[2:]
+        outputs = model.model.run(None, {"images": batch})[0]
+
+        results = []
+        for image, preds in zip(images, outputs):
+            preds = preds[preds[..., 4] > 0.25]
+            preds[..., :4] = model.scale_boxes((new_h, new_w), preds[..., :4], image.shape[:2])
+            results.append(preds)
+        return results
+
+    # ---------- 缓存 ----------
+
+    @staticmethod
+    def fingerprint(image, imgsz):
+        digest = hashlib.sha1(np.ascontiguousarray(image).data)
+        digest.update(f"{image.shape}:{imgsz}".encode())
+        return digest.hexdigest()
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                hit = self._cache[key]
+            else:
+                hit = None
+        if hit is None and self.cache_dir:
+            path = self.cache_dir / f"{key}.npy"
+            if path.exists():
+                hit = np.load(path)
+                self._remember(key, hit)
+        metrics.record_cache("layout", hit is not None)
+        return hit
+
+    def _store(self, key, preds):
+        self._remember(key, preds)
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            np.save(self.cache_dir / f"{key}.npy", preds)
+
+    def _remember(self, key, preds):
+        with self._lock:
+            self._cache[key] = preds
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _to_result(self, preds):
+        from pdf2zh.doclayout import YoloResult
+        return YoloResult(boxes=np.array(preds, copy=True), names=self.model._names)
@@ -1,249 +1,419 @@
-import os
-import logging
-import requests
-from pathlib import Path
-from typing import Optional, List, Dict
-import fitz  # PyMuPDF
-from pdf2zh.doclayout import ModelInstance, OnnxModel
-from langdetect import detect, LangDetectException
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-# 支持的语言选项
-SUPPORTED_LANGUAGES = {
-    "1": {"code": "zh", "name": "简体中文", "font": "SourceHanSerifCN-Regular.ttf"},
-    "2": {"code": "en", "name": "English", "font": "Arial.ttf"},
-    "3": {"code": "ja", "name": "日本語", "font": "MS-Mincho.ttf"},
-    "4": {"code": "ko", "name": "한국어", "font": "NanumGothic.ttf"},
-    "5": {"code": "ru", "name": "Русский", "font": "TimesNewRoman.ttf"},
-    "6": {"code": "es", "name": "Español", "font": "Arial.ttf"},
-    "7": {"code": "fr", "name": "Français", "font": "Arial.ttf"},
-    "8": {"code": "de", "name": "Deutsch", "font": "Arial.ttf"}
-}
-
-# 语言代码到名称的映射
-CODE_TO_NAME = {
-    "zh": "简体中文",
-    "en": "English",
-    "ja": "日本語",
-    "ko": "한국어",
-    "ru": "Русский",
-    "es": "Español",
-    "fr": "Français",
-    "de": "Deutsch"
-}
-
-
-class DocumentLayoutModel:
-    """简化版文档布局模型"""
-
-    def predict(self, image, imgsz=1024):
-        class DummyResult:
-            def __init__(self):
-                self.boxes = [DummyBox()]
-                self.names = ["text", "formula"]
-
-        class DummyBox:
-            def __init__(self):
-                self.xyxy = [0, 0, image.shape[1], image.shape[0]]
-                self.conf = 0.9
-                self.cls = 0
-
-        return [DummyResult()]
-
-
-class NonScannedPDFProcessor:
-    def __init__(self, config):
-        self.config = config
-        self._init_model()
-        self.input_pdf = self.config['input']['pdf_path']
-        self.output_dir = self.config['output']['pdf_dir']
-        self.api_key = self.config['api']['deepseek_key']
-        self.api_url = self.config['api']['deepseek_url']
-
-    def _init_model(self):
-        """初始化文档布局模型"""
-        try:
-            ModelInstance.value = OnnxModel.load_available()
-            logger.info("Document layout model loaded successfully")
-        except Exception as e:
-            logger.warning(f"Failed to load ONNX model: {str(e)}")
-            ModelInstance.value = DocumentLayoutModel()
-
-    def _get_font_path(self, lang_code: str) -> str:
-        """获取适合目标语言的字体"""
-        font_dir = self.config['non_scanned']['font_dir']
-        for lang in SUPPORTED_LANGUAGES.values():
-            if lang["code"] == lang_code:
-                font_path = Path(font_dir) / lang["font"]
-                if font_path.exists():
-                    return str(font_path)
-        return str(Path(font_dir) / "Arial.ttf")
-
-    def detect_language(self, text_sample: str) -> str:
-        """检测文本的语言"""
-        try:
-            return detect(text_sample)
-        except LangDetectException as e:
-            logger.warning(f"Language detection failed: {str(e)}")
-            return "en"  # 默认英语
-
-    def extract_sample_text(self, pdf_path: str) -> str:
-        """从PDF中提取样本文本用于语言检测"""
-        try:
-            doc = fitz.open(pdf_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-                if len(text) > 500:  # 500字符足够检测语言
-                    break
-            return text[:500]
-        except Exception as e:
-            logger.error(f"Failed to extract sample text: {str(e)}")
-            return ""
-
-    def _translate_with_deepseek(self, text: str, src_lang: str, target_lang: str) -> str:
-        """使用DeepSeek API翻译文本"""
-        try:
-            if src_lang == target_lang:
-                return text
-
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            prompt = (
-                f"Translate the following text from {src_lang} to {target_lang}.\n"
-                f"Preserve all special formatting and symbols.\n"
-                f"Only return the translated text.\n"
-                f"Text: {text}"
-            )
-
-            payload = {
-                "model": "deepseek-chat",
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.3,
-                "max_tokens": 2000
-            }
-
-            response = requests.post(self.api_url, headers=headers, json=payload)
-            response.raise_for_status()
-
-            return response.json()["choices"][0]["message"]["content"]
-
-        except Exception as e:
-            logger.error(f"Translation failed: {str(e)}")
-            return f"[TRANSLATION ERROR] {text}"
-
-    def select_source_language(self, detected_lang: str) -> Dict:
-        """让用户选择源语言"""
-        print(f"\n检测到输入PDF可能语言：{CODE_TO_NAME.get(detected_lang, detected_lang)}")
-        choice = input("是否使用此语言作为源语言？（Y/n）：").strip().lower()
-
-        if choice == 'y' or choice == '':
-            # 查找对应的语言选项
-            for num, lang in SUPPORTED_LANGUAGES.items():
-                if lang["code"] == detected_lang:
-                    print(f"\n已选择: {lang['name']}")
-                    return lang
-            # 如果不在支持的语言中，默认使用英语
-            print(f"\n检测到的语言不在支持列表中，默认使用英语")
-            return SUPPORTED_LANGUAGES["2"]
-
-        print("\n请选择源语言:")
-        for num, lang in SUPPORTED_LANGUAGES.items():
-            print(f"{num}. {lang['name']} ({lang['code']})")
-
-        while True:
-            choice = input("请输入数字选择语言：").strip()
-            if choice in SUPPORTED_LANGUAGES:
-                selected = SUPPORTED_LANGUAGES[choice]
-                print(f"\n已选择: {selected['name']}")
-                return selected
-            print("无效输入，请重新选择")
-
-    def select_target_language(self) -> Dict:
-        """让用户选择目标语言"""
-        print("\n请选择目标语言:")
-        for num, lang in SUPPORTED_LANGUAGES.items():
-            print(f"{num}. {lang['name']} ({lang['code']})")
-
-        while True:
-            choice = input("请输入数字选择语言（默认1-英语）：").strip()
-            if choice == "":
-                choice = "1"  # 默认英语
-            if choice in SUPPORTED_LANGUAGES:
-                selected = SUPPORTED_LANGUAGES[choice]
-                print(f"\n已选择: {selected['name']}")
-                return selected
-            print("无效输入，请重新选择")
-
-    def run(self, target_lang_code: str = None) -> str:
-        """翻译PDF文件"""
-        try:
-            # 提取样本文本并检测语言
-            sample_text = self.extract_sample_text(self.input_pdf)
-            detected_lang = self.detect_language(sample_text)
-
-            # 让用户选择源语言
-            source_lang = self.select_source_language(detected_lang)
-            src_lang_code = source_lang["code"]
-
-            # 让用户选择目标语言或使用传入的参数
-            if target_lang_code is None:
-                target_lang = self.select_target_language()
-            else:
-                # 从支持的语言中查找
-                target_lang = next(
-                    (lang for lang in SUPPORTED_LANGUAGES.values()
-                     if lang["code"] == target_lang_code),
-                    None
-                )
-                if target_lang is None:
-                    raise ValueError(f"不支持的目标语言代码: {target_lang_code}")
-
-            lang_code = target_lang["code"]
-            font_path = self._get_font_path(lang_code)
-
-            # 确保输出目录存在
-            Path(self.output_dir).mkdir(parents=True, exist_ok=True)
-
-            logger.info(f"源语言: {src_lang_code}, 目标语言: {lang_code}")
-
-            # 设置翻译参数
-            params = {
-                "files": [self.input_pdf],
-                "output": self.output_dir,
-                "lang_in": src_lang_code,
-                "lang_out": lang_code,
-                "service": "deepseek",
-                "thread": self.config['non_scanned']['thread_count'],
-                "model": ModelInstance.value,
-                "envs": {"DEEPSEEK_API_KEY": self.api_key},
-                "skip_subset_fonts": True
-            }
-
-            # 执行翻译
-            logger.info(f"开始翻译到 {target_lang['name']}...")
-            from pdf2zh.high_level import translate
-            result = translate(**params)
-
-            if result:
-                output_path = Path(self.output_dir) / f"{Path(self.input_pdf).stem}_{lang_code}.pdf"
-                logger.info(f"翻译完成: {output_path}")
-                return str(output_path)
-
-            logger.error("翻译失败 - 无输出文件生成")
-            return None
-
-        except Exception as e:
-            logger.error(f"翻译失败: {str(e)}", exc_info=True)
-            return None
\ No newline at end of file
+import os
+import re
+import shutil
+import tempfile
+import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, List, Dict, Union
+import fitz  # PyMuPDF
+from pdf2zh.doclayout import ModelInstance
+from langdetect import detect, LangDetectException
+from utils.metrics import metrics
+from .pdf_sharding import ShardedTranslator
+from .incremental import IncrementalTranslator
+from .layout_service import LayoutInferenceService
+from .font_subset import FontSubsetter
+from .deadline import Deadline
+from .estimator import JobEstimator
+from .glossary import Glossary
+from .prompts import pdf2zh_prompt
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 支持的语言选项
+SUPPORTED_LANGUAGES = {
+    "1": {"code": "zh", "name": "简体中文", "font": "SourceHanSerifCN-Regular.ttf"},
+    "2": {"code": "en", "name": "English", "font": "Arial.ttf"},
+    "3": {"code": "ja", "name": "日本語", "font": "MS-Mincho.ttf"},
+    "4": {"code": "ko", "name": "한국어", "font": "NanumGothic.ttf"},
+    "5": {"code": "ru", "name": "Русский", "font": "TimesNewRoman.ttf"},
+    "6": {"code": "es", "name": "Español", "font": "Arial.ttf"},
+    "7": {"code": "fr", "name": "Français", "font": "Arial.ttf"},
+    "8": {"code": "de", "name": "Deutsch", "font": "Arial.ttf"}
+}
+
+# 语言代码到名称的映射
+CODE_TO_NAME = {
+    "zh": "简体中文",
+    "en": "English",
+    "ja": "日本語",
+    "ko": "한국어",
+    "ru": "Русский",
+    "es": "Español",
+    "fr": "Français",
+    "de": "Deutsch"
+}
+
+
+class DocumentLayoutModel:
+    """简化版文档布局模型"""
+
+    def predict(self, image, imgsz=1024):
+        class DummyResult:
+            def __init__(self):
+                self.boxes = [DummyBox()]
+                self.names = ["text", "formula"]
+
+        class DummyBox:
+            def __init__(self):
+                self.xyxy = [0, 0, image.shape[1], image.shape[0]]
+                self.conf = 0.9
+                self.cls = 0
+
+        return [DummyResult()]
+
+
+class NonScannedPDFProcessor:
+    def __init__(self, config):
+        self.config = config
+        self._init_model()
+        self.input_pdf = self.config['input']['pdf_path']
+        self.output_dir = self.config['output']['pdf_dir']
+        self.api_key = self.config['api']['deepseek_key']
+        self.api_url = self.config['api']['deepseek_url']
+
+    def _init_model(self):
+        """初始化文档布局模型"""
+        try:
+            # 进程内共享一个ONNX会话，支持批量推理与按页缓存
+            ModelInstance.value = LayoutInferenceService.get(self.config)
+            logger.info("Document layout model loaded successfully")
+        except Exception as e:
+            logger.warning(f"Failed to load ONNX model: {str(e)}")
+            ModelInstance.value = DocumentLayoutModel()
+
+    def _get_font_path(self, lang_code: str) -> str:
+        """获取适合目标语言的字体"""
+        font_dir = self.config['non_scanned']['font_dir']
+        for lang in SUPPORTED_LANGUAGES.values():
+            if lang["code"] == lang_code:
+                font_path = Path(font_dir) / lang["font"]
+                if font_path.exists():
+                    return str(font_path)
+        return str(Path(font_dir) / "Arial.ttf")
+
+    def detect_language(self, text_sample: str) -> str:
+        """检测文本的语言"""
+        try:
+            return detect(text_sample)
+        except LangDetectException as e:
+            logger.warning(f"Language detection failed: {str(e)}")
+            return "en"  # 默认英语
+
+    def extract_sample_text(self, pdf_path: str) -> str:
+        """从PDF中提取样本文本用于语言检测"""
+        try:
+            doc = fitz.open(pdf_path)
+            text = ""
+            for page in doc:
+                text += page.get_text()
+                if len(text) > 500:  # 500字符足够检测语言
+                    break
+            return text[:500]
+        except Exception as e:
+            logger.error(f"Failed to extract sample text: {str(e)}")
+            return ""
+
+    def _translate_with_deepseek(self, text: str, src_lang: str, target_lang: str) -> str:
+        """使用DeepSeek API翻译文本"""
+        try:
+            if src_lang == target_lang:
+                return text
+
+            headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            }
+
+            prompt = (
+                f"Translate the following text from {src_lang} to {target_lang}.\n"
+                f"Preserve all special formatting and symbols.\n"
+                f"Only return the translated text.\n"
+                f"Text: {text}"
+            )
+
+            payload = {
+                "model": "deepseek-chat",
+                "messages": [
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.3,
+                "max_tokens": 2000
+            }
+
+            response = requests.post(self.api_url, headers=headers, json=payload)
+            response.raise_for_status()
+
+            return response.json()["choices"][0]["message"]["content"]
+
+        except Exception as e:
+            logger.error(f"Translation failed: {str(e)}")
+            return f"[TRANSLATION ERROR] {text}"
+
+    def select_source_language(self, detected_lang: str) -> Dict:
+        """让用户选择源语言"""
+        print(f"\n检测到输入PDF可能语言：{CODE_TO_NAME.get(detected_lang, detected_lang)}")
+        choice = input("是否使用此语言作为源语言？（Y/n）：").strip().lower()
+
+        if choice == 'y' or choice == '':
+            # 查找对应的语言选项
+            for num, lang in SUPPORTED_LANGUAGES.items():
+                if lang["code"] == detected_lang:
+                    print(f"\n已选择: {lang['name']}")
+                    return lang
+            # 如果不在支持的语言中，默认使用英语
+            print(f"\n检测到的语言不在支持列表中，默认使用英语")
+            return SUPPORTED_LANGUAGES["2"]
+
+        print("\n请选择源语言:")
+        for num, lang in SUPPORTED_LANGUAGES.items():
+            print(f"{num}. {lang['name']} ({lang['code']})")
+
+        while True:
+            choice = input("请输入数字选择语言：").strip()
+            if choice in SUPPORTED_LANGUAGES:
+                selected = SUPPORTED_LANGUAGES[choice]
+                print(f"\n已选择: {selected['name']}")
+                return selected
+            print("无效输入，请重新选择")
+
+    def select_target_language(self) -> Dict:
+        """让用户选择目标语言"""
+        print("\n请选择目标语言:")
+        for num, lang in SUPPORTED_LANGUAGES.items():
+            print(f"{num}. {lang['name']} ({lang['code']})")
+
+        while True:
+            choice = input("请输入数字选择语言（默认1-英语）：").strip()
+            if choice == "":
+                choice = "1"  # 默认英语
+            if choice in SUPPORTED_LANGUAGES:
+                selected = SUPPORTED_LANGUAGES[choice]
+                print(f"\n已选择: {selected['name']}")
+                return selected
+            print("无效输入，请重新选择")
+
+    def select_target_languages(self) -> List[Dict]:
+        """让用户选择一个或多个目标语言(多个数字用逗号分隔)"""
+        print("\n请选择目标语言 (可输入多个数字，用逗号分隔):")
+        for num, lang in SUPPORTED_LANGUAGES.items():
+            print(f"{num}. {lang['name']} ({lang['code']})")
+
+        while True:
+            choice = input("请输入数字选择语言（默认1-英语）：").strip()
+            if choice == "":
+                choice = "1"  # 默认英语
+            choices = [item for item in re.split(r'[,，\s]+', choice) if item]
+            if choices and all(item in SUPPORTED_LANGUAGES for item in choices):
+                selected = [SUPPORTED_LANGUAGES[item] for item in dict.fromkeys(choices)]
+                print(f"\n已选择: {', '.join(lang['name'] for lang in selected)}")
+                return selected
+            print("无效输入，请重新选择")
+
+    def _resolve_target_languages(self, target_lang_codes) -> List[Dict]:
+        """将语言代码(单个或列表)解析为支持的语言选项，未指定时交互选择"""
+        if not target_lang_codes:
+            return self.select_target_languages()
+        if isinstance(target_lang_codes, str):
+            target_lang_codes = [target_lang_codes]
+
+        target_langs = []
+        for code in dict.fromkeys(target_lang_codes):
+            # 从支持的语言中查找
+            target_lang = next(
+                (lang for lang in SUPPORTED_LANGUAGES.values() if lang["code"] == code),
+                None
+            )
+            if target_lang is None:
+                raise ValueError(f"不支持的目标语言代码: {code}")
+            target_langs.append(target_lang)
+        return target_langs
+
+    def _resolve_languages(self, target_lang_code=None):
+        """确定源语言代码与目标语言选项列表(配置或参数未指定时交互选择)"""
+        trans_cfg = self.config.get('translation', {})
+        src_lang_code = trans_cfg.get('source_lang')
+        if not src_lang_code:
+            # 提取样本文本并检测语言
+            sample_text = self.extract_sample_text(self.input_pdf)
+            detected_lang = self.detect_language(sample_text)
+
+            # 让用户选择源语言
+            source_lang = self.select_source_language(detected_lang)
+            src_lang_code = source_lang["code"]
+
+        # 让用户选择目标语言或使用传入的参数/配置
+        target_langs = self._resolve_target_languages(target_lang_code or trans_cfg.get('target_langs'))
+        return src_lang_code, target_langs
+
+    def estimate(self, target_lang_code: Union[str, List[str], None] = None) -> Optional[Dict]:
+        """预估模式：抽样页面运行版面检测与文本提取，输出预计token用量与耗时，不调用翻译API"""
+        try:
+            src_lang_code, target_langs = self._resolve_languages(target_lang_code)
+            layout_model = ModelInstance.value if isinstance(ModelInstance.value, LayoutInferenceService) else None
+            return JobEstimator(self.config).estimate_non_scanned(
+                src_lang_code, [lang["code"] for lang in target_langs], layout_model
+            )
+        except Exception as e:
+            logger.error(f"预估失败: {str(e)}", exc_info=True)
+            return None
+
+    def run(self, target_lang_code: Union[str, List[str], None] = None) -> Union[str, List[str], None]:
+        """翻译PDF文件，指定多个目标语言时并行生成每种语言的译文并返回路径列表"""
+        try:
+            trans_cfg = self.config.get('translation', {})
+            src_lang_code, target_langs = self._resolve_languages(target_lang_code)
+            # 截止时间在语言选择完成后开始计时
+            Deadline.begin(self.config)
+
+            # 确保输出目录存在
+            Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+
+            if len(target_langs) == 1:
+                result = self._run_language(src_lang_code, target_langs[0])
+                # pdf2zh跳过了逐文件子集化，由缓存的子集化阶段统一处理
+                self._subset_fonts([result])
+                return result
+
+            # 版面检测只执行一次，各语言的翻译线程直接命中缓存
+            self._prefetch_layout(self.input_pdf)
+            workers = min(max(1, trans_cfg.get('max_parallel_langs', 3)), len(target_langs))
+            logger.info(f"并行翻译 {len(target_langs)} 种目标语言, {workers} 个线程")
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(
+                    lambda lang: self._run_language(src_lang_code, lang, fan_out=True), target_langs
+                ))
+
+            outputs = [result for result in results if result]
+            if len(outputs) < len(target_langs):
+                logger.error(f"{len(target_langs) - len(outputs)} 种目标语言翻译失败")
+            self._subset_fonts(outputs)
+            return outputs or None
+
+        except Exception as e:
+            logger.error(f"翻译失败: {str(e)}", exc_info=True)
+            return None
+
+    def _subset_fonts(self, outputs: List[str]):
+        if Deadline(self.config).expired():
+            logger.warning("截止时间已到，跳过字体子集化")
+            return
+        FontSubsetter(self.config).subset_documents(outputs)
+
+    def _run_language(self, src_lang_code: str, target_lang: Dict, fan_out: bool = False) -> Optional[str]:
+        """将文档翻译为一种目标语言，返回译文路径"""
+        try:
+            lang_code = target_lang["code"]
+            font_path = self._get_font_path(lang_code)
+
+            logger.info(f"源语言: {src_lang_code}, 目标语言: {lang_code}")
+
+            # 多语言并行时各语言使用独立的输出目录，避免pdf2zh的输出文件互相覆盖
+            work_output = Path(self.output_dir) / lang_code if fan_out else Path(self.output_dir)
+            work_output.mkdir(parents=True, exist_ok=True)
+
+            # 设置翻译参数
+            params = {
+                "files": [self.input_pdf],
+                "output": str(work_output),
+                "lang_in": src_lang_code,
+                "lang_out": lang_code,
+                "service": "deepseek",
+                "thread": self.config['non_scanned']['thread_count'],
+                "model": ModelInstance.value,
+                "envs": {"DEEPSEEK_API_KEY": self.api_key},
+                "skip_subset_fonts": True
+            }
+
+            # 执行翻译
+            logger.info(f"开始翻译到 {target_lang['name']}...")
+            output_path = Path(self.output_dir) / f"{Path(self.input_pdf).stem}_{lang_code}.pdf"
+
+            incremental = IncrementalTranslator(self.config)
+            if not fan_out and incremental.is_available():
+                # 修订版文档只重新翻译变化的页面
+                return self._run_incremental(incremental, params, output_path)
+            if fan_out and incremental.enabled:
+                logger.warning("增量翻译只支持单一目标语言，执行完整翻译")
+
+            result = self._translate_document(self.input_pdf, params, output_path, prefetch=not fan_out)
+
+            if result:
+                if Path(result) != output_path:
+                    # pdf2zh的单语输出名为 {stem}-mono.pdf，统一移动到返回的输出路径
+                    shutil.move(result, output_path)
+                logger.info(f"翻译完成: {output_path}")
+                return str(output_path)
+
+            logger.error(f"翻译失败 - 无输出文件生成 ({lang_code})")
+            return None
+
+        except Exception as e:
+            logger.error(f"翻译失败 ({target_lang['code']}): {str(e)}", exc_info=True)
+            return None
+
+    def _prefetch_layout(self, pdf_path: str):
+        """翻译前批量推理全部页面的版面，pdf2zh逐页调用时直接命中缓存"""
+        if isinstance(ModelInstance.value, LayoutInferenceService) and \
+                self.config['non_scanned'].get('layout_prefetch', True):
+            with metrics.timer("layout"):
+                ModelInstance.value.prefetch(pdf_path)
+
+    def _translate_document(self, pdf_path: str, params: Dict, output_path: Path,
+                            prefetch: bool = True) -> Optional[str]:
+        """翻译单个PDF文件，返回译文文件路径"""
+        sharder = ShardedTranslator(self.config)
+        if sharder.should_shard(pdf_path) or Deadline(self.config).active:
+            # 按页码范围分片，多进程并行翻译；截止时间模式下总是分片，超时的分片可以终止并保留原文
+            with metrics.timer("translate"):
+                return sharder.translate(pdf_path, params, output_path)
+
+        if prefetch:
+            self._prefetch_layout(pdf_path)
+
+        # pdf2zh的提示词按文档设置，只注入本文档中出现的术语
+        glossary = Glossary.get(self.config)
+        terms = glossary.find_in_pdf(pdf_path, params["lang_out"]) if glossary.enabled else []
+        if terms:
+            params = dict(params, prompt=pdf2zh_prompt(terms))
+
+        from pdf2zh.high_level import translate
+        with metrics.timer("translate"):
+            result = translate(**dict(params, files=[pdf_path]))
+        # pdf2zh返回 [(单语译文, 双语对照)]
+        output = result[0][0] if result else None
+        glossary.verify_pdf(output, terms)
+        return output
+
+    def _run_incremental(self, incremental: IncrementalTranslator, params: Dict, output_path: Path) -> Optional[str]:
+        """增量翻译：提取变化页面翻译后，与上一版译文中未变化的页面合并"""
+        plan = incremental.plan(self.input_pdf)
+        metrics.inc("pages_skipped_total", len(plan["reuse"]), reason="unchanged")
+
+        work_dir = tempfile.mkdtemp(prefix="pdf_incremental_")
+        try:
+            changed_output = None
+            if plan["changed"]:
+                subset_path = Path(work_dir) / f"{Path(self.input_pdf).stem}_changed.pdf"
+                incremental.extract_pages(self.input_pdf, plan["changed"], subset_path)
+                changed_output = self._translate_document(
+                    str(subset_path),
+                    dict(params, output=work_dir),
+                    Path(work_dir) / f"{subset_path.stem}_{params['lang_out']}.pdf"
+                )
+                if not changed_output:
+                    logger.error("翻译失败 - 变化页面无输出文件生成")
+                    return None
+
+            incremental.assemble(plan, changed_output, output_path)
+            logger.info(f"增量翻译完成: {output_path}")
+            return str(output_path)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
\ No newline at end of file
@@ -0,0 +1,332 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+from utils.image_utils import to_builtin
+from utils.profiling import profiled
+
+EMPTY_RESULT = {"rec_texts": [], "rec_scores": [], "rec_boxes": [], "rec_polys": [], "dt_polys": []}
+
+
+def _empty_result():
+    return {key: [] for key in EMPTY_RESULT}
+
+
+def offset_ocr_result(result, dx, dy):
+    """将裁剪区域内的识别坐标平移回整页坐标"""
+    if not dx and not dy:
+        return result
+    result["rec_boxes"] = [[b[0] + dx, b[1] + dy, b[2] + dx, b[3] + dy] for b in result.get("rec_boxes", [])]
+    for key in ("rec_polys", "dt_polys"):
+        result[key] = [[[p[0] + dx, p[1] + dy] for p in poly] for poly in result.get(key, [])]
+    return result
+
+
+class BaseOCREngine(ABC):
+    """OCR引擎接口：输入图片路径或RGB数组，输出与PaddleOCR JSON一致的字典"""
+
+    name = "base"
+
+    @abstractmethod
+    def predict(self, image):
+        """子类必须实现的单页识别"""
+        pass
+
+
+class PaddleOCREngine(BaseOCREngine):
+    """基于paddleocr.PaddleOCR的引擎"""
+
+    name = "paddle"
+
+    def __init__(self, config):
+        from paddleocr import PaddleOCR
+
+        self.save_visualization = config.get('ocr', {}).get('save_visualization', False)
+        self.last_results = []
+        options = {}
+        cpu_threads = config.get('ocr', {}).get('cpu_threads', 0)  # 0表示使用PaddleOCR默认值
+        if cpu_threads:
+            options["cpu_threads"] = cpu_threads
+        self.pipeline = PaddleOCR(
+            use_doc_orientation_classify=False,
+            use_doc_unwarping=False,
+            use_textline_orientation=False,
+            **options
+        )
+
+    @profiled("ocr_predict")
+    def predict(self, image):
+        if isinstance(image, np.ndarray):
+            image = image[:, :, ::-1].copy()  # PaddleOCR的数组输入为BGR顺序
+        else:
+            image = str(image)
+        self.last_results = list(self.pipeline.predict(input=image))
+        if not self.last_results:
+            return _empty_result()
+        return self._to_dict(self.last_results[0])
+
+    def save_last_visualization(self, save_path):
+        """保存最近一次识别的可视化图片"""
+        for res in self.last_results:
+            res.save_to_img(save_path=str(save_path))
+
+    @staticmethod
+    def _to_dict(res):
+        data = res.json if hasattr(res, "json") else dict(res)
+        data = data.get("res", data)
+        return to_builtin({key: data.get(key, []) for key in EMPTY_RESULT})
+
+
+class OnnxOCREngine(BaseOCREngine):
+    """基于ONNX Runtime的PP-OCR检测+识别引擎(纯CPU)"""
+
+    name = "onnx"
+
+    def __init__(self, config):
+        import onnxruntime as ort
+
+        onnx_cfg = config.get('ocr', {}).get('onnx', {})
+        self.det_limit_side_len = onnx_cfg.get('det_limit_side_len', 960)
+        self.det_thresh = onnx_cfg.get('det_thresh', 0.3)
+        self.det_box_thresh = onnx_cfg.get('det_box_thresh', 0.6)
+        self.det_unclip_ratio = onnx_cfg.get('det_unclip_ratio', 1.5)
+        self.rec_image_height = onnx_cfg.get('rec_image_height', 48)
+        self.rec_batch_size = onnx_cfg.get('rec_batch_size', 8)
+        self.rec_score_thresh = onnx_cfg.get('rec_score_thresh', 0.0)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = onnx_cfg.get('intra_op_threads', 0)  # 0表示由ORT自动决定
+        options.inter_op_num_threads = onnx_cfg.get('inter_op_threads', 1)
+        options.execution_mode = (ort.ExecutionMode.ORT_PARALLEL
+                                  if onnx_cfg.get('inter_op_threads', 1) > 1
+                                  else ort.ExecutionMode.ORT_SEQUENTIAL)
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        use_int8 = onnx_cfg.get('use_int8', False)
+        det_path = self._model_path(onnx_cfg, 'det_model', use_int8)
+        rec_path = self._model_path(onnx_cfg, 'rec_model', use_int8)
+        providers = ["CPUExecutionProvider"]
+        self.det_session = ort.InferenceSession(det_path, sess_options=options, providers=providers)
+        self.rec_session = ort.InferenceSession(rec_path, sess_options=options, providers=providers)
+        self.det_input = self.det_session.get_inputs()[0].name
+        self.rec_input = self.rec_session.get_inputs()[0].name
+
+        # CTC字典：0为blank，末尾追加空格
+        with open(onnx_cfg['char_dict'], 'r', encoding='utf-8') as f:
+            chars = [line.rstrip('\r\n') for line in f]
+        self.characters = ["blank"] + chars + [" "]
+
+    @staticmethod
+    def _model_path(onnx_cfg, key, use_int8):
+        """返回模型路径，启用int8时优先使用量化模型，缺失时动态量化并缓存"""
+        model_path = onnx_cfg[key]
+        if not use_int8:
+            return model_path
+
+        int8_path = onnx_cfg.get(f"{key}_int8") or str(Path(model_path).with_suffix(".int8.onnx"))
+        if not Path(int8_path).exists():
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            print(f"生成int8量化模型: {int8_path}")
+            quantize_dynamic(model_path, int8_path, weight_type=QuantType.QUInt8)
+        return int8_path
+
+    @profiled("ocr_predict")
+    def predict(self, image):
+        import cv2
+
+        if isinstance(image, np.ndarray):
+            bgr = np.ascontiguousarray(image[:, :, ::-1])
+        else:
+            bgr = cv2.imread(str(image), cv2.IMREAD_COLOR)
+            if bgr is None:
+                raise ValueError(f"无法读取图片: {image}")
+
+        polys = self._detect(bgr)
+        if not polys:
+            return _empty_result()
+
+        crops = [self._crop(bgr, poly) for poly in polys]
+        recognized = self._recognize(crops)
+
+        result = _empty_result()
+        for poly, (text, score) in zip(polys, recognized):
+            if not text or score < self.rec_score_thresh:
+                continue
+            xs = [p[0] for p in poly]
+            ys = [p[1] for p in poly]
+            result["rec_texts"].append(text)
+            result["rec_scores"].append(float(score))
+            result["rec_polys"].append([[int(x), int(y)] for x, y in poly])
+            result["rec_boxes"].append([int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys))])
+        result["dt_polys"] = [[[int(x), int(y)] for x, y in poly] for poly in polys]
+        return result
+
+    # ---------- 检测 ----------
+
+    def _detect(self, bgr):
+        import cv2
+
+        height, width = bgr.shape[:2]
+        ratio = min(1.0, self.det_limit_side_len / max(height, width))
+        resize_h = max(32, int(round(height * ratio / 32)) * 32)
+        resize_w = max(32, int(round(width * ratio / 32)) * 32)
+        resized = cv2.resize(bgr, (resize_w, resize_h))
+
+        # 与PaddleOCR一致：在BGR顺序上使用ImageNet均值方差归一化
+        mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+        std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+        tensor = (resized.astype(np.float32) / 255.0 - mean) / std
+        tensor = tensor.transpose(2, 0, 1)[np.newaxis, :]
+
+        prob = self.det_session.run(None, {self.det_input: tensor})[0][0, 0]
+        bitmap = (prob > self.det_thresh).astype(np.uint8)
+        contours, _ = cv2.findContours(bitmap, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+        scale_x, scale_y = width / resize_w, height / resize_h
+        polys = []
+        for contour in contours[:1000]:
+            rect = cv2.minAreaRect(contour)
+            if min(rect[1]) < 3:
+                continue
+            if self._box_score(prob, contour) < self.det_box_thresh:
+                continue
+            (cx, cy), (w, h), angle = rect
+            # 按DB算法的unclip距离向外扩展
+            area, perimeter = w * h, 2 * (w + h)
+            distance = area * self.det_unclip_ratio / max(perimeter, 1e-6)
+            box = cv2.boxPoints(((cx, cy), (w + 2 * distance, h + 2 * distance), angle))
+            if min(w, h) + 2 * distance < 5:
+                continue
+            box[:, 0] = np.clip(box[:, 0] * scale_x, 0, width - 1)
+            box[:, 1] = np.clip(box[:, 1] * scale_y, 0, height - 1)
+            polys.append(self._order_points(box))
+
+        # 按从上到下、从左到右排序
+        polys.sort(key=lambda p: (round(p[0][1] / 10), p[0][0]))
+        return polys
+
+    @staticmethod
+    def _box_score(prob, contour):
+        import cv2
+
+        x, y, w, h = cv2.boundingRect(contour)
+        mask = np.zeros((h, w), dtype=np.uint8)
+        cv2.fillPoly(mask, [contour.reshape(-1, 2) - [x, y]], 1)
+        region = prob[y:y + h, x:x + w]
+        return float(cv2.mean(region, mask)[0]) if mask.any() else 0.0
+
+    @staticmethod
+    def _order_points(box):
+        """按左上、右上、右下、左下顺序排列四个顶点"""
+        pts = sorted(box.tolist(), key=lambda p: p[0])
+        left = sorted(pts[:2], key=lambda p: p[1])
+        right = sorted(pts[2:], key=lambda p: p[1])
+        return [left[0], right[0], right[1], left[1]]
+
+    # ---------- 识别 ----------
+
+    def _crop(self, bgr, poly):
+        import cv2
+
+        pts = np.array(poly, dtype=np.float32)
+        crop_w = int(max(np.linalg.norm(pts[0] - pts[1]), np.linalg.norm(pts[2] - pts[3])))
+        crop_h = int(max(np.linalg.norm(pts[0] - pts[3]), np.linalg.norm(pts[1] - pts[2])))
+        crop_w, crop_h = max(crop_w, 1), max(crop_h, 1)
+        target = np.array([[0, 0], [crop_w, 0], [crop_w, crop_h], [0, crop_h]], dtype=np.float32)
+        matrix = cv2.getPerspectiveTransform(pts, target)
+        crop = cv2.warpPerspective(bgr, matrix, (crop_w, crop_h), borderMode=cv2.BORDER_REPLICATE)
+        if crop_h / crop_w >= 1.5:
+            crop = np.rot90(crop)
+        return crop
+
+    def _recognize(self, crops):
+        import cv2
+
+        results = [("", 0.0)] * len(crops)
+        # 按宽高比排序以减少批内填充
+        order = sorted(range(len(crops)), key=lambda i: crops[i].shape[1] / crops[i].shape[0])
+        height = self.rec_image_height
+        for start in range(0, len(order), self.rec_batch_size):
+            batch_ids = order[start:start + self.rec_batch_size]
+            max_ratio = max(crops[i].shape[1] / crops[i].shape[0] for i in batch_ids)
+            batch_w = max(int(math.ceil(height * max_ratio)), 8)
+            batch = np.zeros((len(batch_ids), 3, height, batch_w), dtype=np.float32)
+            for row, i in enumerate(batch_ids):
+                crop = crops[i]
+                w = min(batch_w, max(1, int(math.ceil(height * crop.shape[1] / crop.shape[0]))))
+                resized = cv2.resize(np.ascontiguousarray(crop), (w, height)).astype(np.float32)
+                batch[row, :, :, :w] = ((resized / 255.0 - 0.5) / 0.5).transpose(2, 0, 1)
+
+            probs = self.rec_session.run(None, {self.rec_input: batch})[0]
+            for row, i in enumerate(batch_ids):
+                results[i] = self._ctc_decode(probs[row])
+        return results
+
+    def _ctc_decode(self, prob):
+        """CTC贪心解码：去除重复与blank"""
+        indices = prob.argmax(axis=1)
+        scores = prob.max(axis=1)
+        chars, char_scores = [], []
+        previous = -1
+        for index, score in zip(indices, scores):
+            if index != previous and index != 0 and index < len(self.characters):
+                chars.append(self.characters[index])
+                char_scores.append(score)
+            previous = index
+        if not chars:
+            return "", 0.0
+        return "".join(chars), float(np.mean(char_scores))
+
+
+OCR_ENGINES = {
+    "paddle": PaddleOCREngine,
+    "onnx": OnnxOCREngine
+}
+
+
+def create_ocr_engine(config, engine_name=None):
+    """按配置创建OCR引擎"""
+    engine_name = engine_name or config.get('ocr', {}).get('engine', 'paddle')
+    if engine_name not in OCR_ENGINES:
+        raise ValueError(f"不支持的OCR引擎: {engine_name}")
+    return OCR_ENGINES[engine_name](config)
+
+
+def benchmark_engines(config, image_paths, engine_names=("paddle", "onnx"), warmup=1):
+    """在同一组图片上对比各OCR引擎的启动耗时、单页耗时与识别结果一致性"""
+    report = {}
+    reference_texts = None
+    for engine_name in engine_names:
+        start = time.perf_counter()
+        engine = create_ocr_engine(config, engine_name)
+        init_seconds = time.perf_counter() - start
+
+        for image_path in image_paths[:warmup]:
+            engine.predict(image_path)
+
+        durations, page_texts = [], []
+        for image_path in image_paths:
+            start = time.perf_counter()
+            result = engine.predict(image_path)
+            durations.append(time.perf_counter() - start)
+            page_texts.append(set(result["rec_texts"]))
+
+        entry = {
+            "init_seconds": round(init_seconds, 3),
+            "pages": len(durations),
+            "mean_page_seconds": round(sum(durations) / max(len(durations), 1), 3),
+            "max_page_seconds": round(max(durations, default=0.0), 3),
+            "lines": sum(len(texts) for texts in page_texts)
+        }
+        if reference_texts is None:
+            reference_texts = page_texts
+        else:
+            # 以第一个引擎为基准计算文本行一致率
+            matched = sum(len(a & b) for a, b in zip(reference_texts, page_texts))
+            total = sum(len(a | b) for a, b in zip(reference_texts, page_texts))
+            entry["text_agreement"] = round(matched / total, 3) if total else 1.0
+        report[engine_name] = entry
+    return report
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import shutil
+import threading
+from pathlib import Path
+
+from utils.image_hash import changed_blocks, hamming_distance
+from utils.metrics import metrics
+
+
+def _file_key(signature):
+    """缓存文件名：分块签名的SHA-1"""
+    return hashlib.sha1(signature.encode('ascii')).hexdigest()
+
+
+class PageDeduplicator:
+    """复用重复页面的OCR结果与翻译渲染结果(文档内及跨任务)
+
+    感知哈希只用于快速找出候选页面；内容略有不同的页面(如只改了几行的表单)哈希距离也可能很小，
+    因此还要比较分块灰度签名：重复扫描带来的轻微噪声与偏移可以容忍，有块差异明显时按新页面处理。
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, config):
+        dedup_cfg = config.get('page_dedup', {})
+        self.enabled = dedup_cfg.get('enabled', True)
+        self.max_distance = dedup_cfg.get('max_distance', 4)  # 候选页面的最大汉明距离(64位哈希)
+        self.block_tolerance = dedup_cfg.get('block_tolerance', 24)  # 分块灰度差在此范围内视为扫描噪声
+        self.max_changed_blocks = dedup_cfg.get('max_changed_blocks', 0)  # 允许超出容差的块数
+        self.cache_dir = Path(dedup_cfg['cache_dir']) if dedup_cfg.get('cache_dir') else None
+        self._lock = threading.Lock()
+        self.ocr_entries = []  # 本文档: [(哈希, 分块签名, JSON路径)]
+        self.render_entries = {}  # 本文档: 语言键 -> [(哈希, 分块签名, 图片路径)]
+        self.index = {"ocr": [], "render": {}}  # 跨任务持久化索引
+        self._dirty = False
+        if self.enabled and self.cache_dir:
+            self._load_index()
+
+    # ---------- 查询 ----------
+
+    def _match(self, entries, value, signature):
+        """哈希距离在范围内的候选中，返回分块签名差异最小且在允许范围内的条目路径"""
+        if not signature:
+            return None
+        best, best_changed = None, None
+        for entry_hash, entry_signature, path in entries:
+            if not entry_signature or hamming_distance(entry_hash, value) > self.max_distance:
+                continue
+            changed = changed_blocks(entry_signature, signature, self.block_tolerance)
+            if changed is None or changed > self.max_changed_blocks:
+                metrics.inc("page_dedup_rejected_total")  # 哈希相近但内容不同
+                continue
+            if best_changed is None or changed < best_changed:
+                best, best_changed = path, changed
+                if changed == 0:
+                    break
+        return best
+
+    def find_ocr(self, value, signature):
+        """查找可复用的OCR结果JSON路径"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            path = self._match(self.ocr_entries, value, signature)
+            if path is None:
+                path = self._match(self._persistent("ocr"), value, signature)
+        return path if path and Path(path).exists() else None
+
+    def find_render(self, value, signature, lang_key):
+        """查找可复用的翻译渲染图片路径"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            path = self._match(self.render_entries.get(lang_key, []), value, signature)
+            if path is None:
+                path = self._match(self._persistent("render", lang_key), value, signature)
+        return path if path and Path(path).exists() else None
+
+    # ---------- 登记 ----------
+
+    def register_ocr(self, value, signature, json_path):
+        if not (self.enabled and signature):
+            return
+        with self._lock:
+            self.ocr_entries.append((value, signature, str(json_path)))
+            if self.cache_dir:
+                target = self.cache_dir / "ocr" / f"{_file_key(signature)}.json"
+                self._store(json_path, target, self.index["ocr"], value, signature)
+
+    def register_render(self, value, signature, lang_key, image_path):
+        if not (self.enabled and signature):
+            return
+        with self._lock:
+            self.render_entries.setdefault(lang_key, []).append((value, signature, str(image_path)))
+            if self.cache_dir:
+                target = self.cache_dir / "render" / lang_key / f"{_file_key(signature)}{Path(image_path).suffix}"
+                self._store(image_path, target, self.index["render"].setdefault(lang_key, []), value, signature)
+
+    # ---------- 持久化 ----------
+
+    def _persistent(self, kind, lang_key=None):
+        entries = self.index[kind] if lang_key is None else self.index[kind].get(lang_key, [])
+        # 旧版索引条目没有分块签名，永远不会被复用
+        return [(int(entry["hash"], 16), entry.get("signature"), str(self.cache_dir / entry["path"]))
+                for entry in entries]
+
+    def _store(self, source, target, entries, value, signature):
+        """将结果复制到缓存目录并登记到索引"""
+        if any(entry.get("signature") == signature for entry in entries):
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, target)
+        entries.append({"hash": f"{value:016x}", "signature": signature,
+                        "path": str(target.relative_to(self.cache_dir))})
+        self._dirty = True
+
+    def _load_index(self):
+        index_path = self.cache_dir / self.INDEX_FILE
+        if not index_path.exists():
+            return
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+            self.index.setdefault("ocr", [])
+            self.index.setdefault("render", {})
+        except Exception as e:
+            print(f"加载页面去重索引失败: {e}")
+
+    def save(self):
+        """写回持久化索引(与其他任务写入的条目合并)"""
+        if not (self.enabled and self.cache_dir and self._dirty):
+            return
+        with self._lock:
+            current = self.index
+            self._load_index()
+            merged = self.index
+            for entry in current["ocr"]:
+                if entry not in merged["ocr"]:
+                    merged["ocr"].append(entry)
+            for lang_key, entries in current["render"].items():
+                target = merged["render"].setdefault(lang_key, [])
+                target.extend(entry for entry in entries if entry not in target)
+
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            index_path = self.cache_dir / self.INDEX_FILE
+            tmp_path = index_path.with_suffix(".json.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(merged, f, ensure_ascii=False)
+            tmp_path.replace(index_path)
+            self.index = merged
+            self._dirty = False
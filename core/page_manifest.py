@@ -0,0 +1,74 @@
+import json
+import threading
+from pathlib import Path
+
+
+class PageManifest:
+    """页面产物索引：按 (页码, 阶段) 记录各阶段产物的路径，后续阶段按页码直接查找，不再扫描目录
+
+    阶段名: image(整页图片) / tiles(分块图片目录) / ocr(识别结果JSON) / translated:<语言>(译文图片)。
+    磁盘上为追加写入的JSON Lines文件，多个进程(含分布式工作进程)可同时登记；
+    每次完整运行开始时重置，之前运行残留的文件不会被误用。
+    """
+
+    FILE_NAME = "page_manifest.jsonl"
+
+    def __init__(self, config):
+        output = config['output']
+        self.path = Path(output.get('manifest_path') or Path(output['image_dir']) / self.FILE_NAME)
+        self._lock = threading.Lock()
+        self._entries = {}  # (页码, 阶段) -> 路径
+        self.load()
+
+    def load(self):
+        """从磁盘重新加载(其他进程登记的产物)"""
+        entries = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # 写入中断的不完整行
+                    if record.get("reset"):
+                        entries.clear()
+                    else:
+                        entries[(record["page"], record["stage"])] = record["path"]
+        with self._lock:
+            self._entries = entries
+        return self
+
+    def reset(self):
+        """开始新的运行：清空索引"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({"reset": True}) + "\n")
+            self._entries.clear()
+
+    def register(self, page, stage, path):
+        record = {"page": int(page), "stage": stage, "path": str(path)}
+        with self._lock:
+            self._entries[(record["page"], stage)] = record["path"]
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # 单行追加写入，多个进程并发登记时不会互相覆盖
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def get(self, page, stage):
+        """产物路径，未登记时返回None"""
+        return self._entries.get((int(page), stage))
+
+    def items(self, stage):
+        """某阶段的全部产物 [(页码, 路径)]，按页码排序"""
+        with self._lock:
+            return sorted((page, path) for (page, name), path in self._entries.items() if name == stage)
+
+    def items_in(self, directory, stage_prefix="translated:"):
+        """位于指定目录下的某类产物 [(页码, 路径)]，按页码排序"""
+        directory = Path(directory).resolve()
+        with self._lock:
+            return sorted(
+                (page, path) for (page, name), path in self._entries.items()
+                if name.startswith(stage_prefix) and Path(path).resolve().parent == directory
+            )
@@ -0,0 +1,49 @@
+import numpy as np
+
+
+class PagePrepass:
+    """OCR前的快速NumPy预检：识别近乎空白的页面并计算墨迹外接框"""
+
+    def __init__(self, config):
+        prepass_cfg = config.get('page_prepass', {})
+        self.enabled = prepass_cfg.get('enabled', True)
+        self.contrast = prepass_cfg.get('ink_contrast', 60)  # 比背景暗多少灰度视为墨迹
+        self.blank_ink_ratio = prepass_cfg.get('blank_ink_ratio', 0.0005)  # 墨迹占比低于此值视为空白页
+        self.noise_ratio = prepass_cfg.get('noise_ratio', 0.002)  # 行/列墨迹占比低于此值视为噪点
+        self.margin = prepass_cfg.get('crop_margin', 20)  # 裁剪外扩边距(像素)
+        self.min_crop_gain = prepass_cfg.get('min_crop_gain', 0.1)  # 节省面积低于此比例时不裁剪
+        self.step = prepass_cfg.get('sample_step', 4)  # 降采样步长
+
+    def analyze(self, image):
+        """返回 {"blank": 是否空白, "bbox": 内容区域[x0, y0, x1, y1]或None}"""
+        height, width = image.shape[:2]
+        full_box = [0, 0, width, height]
+        if not self.enabled:
+            return {"blank": False, "bbox": full_box}
+
+        step = max(int(self.step), 1)
+        sample = image[::step, ::step]
+        if sample.ndim == 3:
+            gray = sample[:, :, 0] * 0.299 + sample[:, :, 1] * 0.587 + sample[:, :, 2] * 0.114
+        else:
+            gray = sample.astype(np.float32)
+
+        # 以亮度90分位数作为纸张背景，适应偏色或灰底扫描件
+        background = np.percentile(gray, 90)
+        ink = gray < background - self.contrast
+        if ink.mean() < self.blank_ink_ratio:
+            return {"blank": True, "bbox": None}
+
+        rows = np.flatnonzero(ink.sum(axis=1) > max(1, ink.shape[1] * self.noise_ratio))
+        cols = np.flatnonzero(ink.sum(axis=0) > max(1, ink.shape[0] * self.noise_ratio))
+        if rows.size == 0 or cols.size == 0:
+            return {"blank": True, "bbox": None}
+
+        x0 = max(0, cols[0] * step - self.margin)
+        y0 = max(0, rows[0] * step - self.margin)
+        x1 = min(width, (cols[-1] + 1) * step + self.margin)
+        y1 = min(height, (rows[-1] + 1) * step + self.margin)
+
+        if (x1 - x0) * (y1 - y0) > width * height * (1 - self.min_crop_gain):
+            return {"blank": False, "bbox": full_box}
+        return {"blank": False, "bbox": [int(x0), int(y0), int(x1), int(y1)]}
@@ -0,0 +1,226 @@
+import json
+import re
+from pathlib import Path
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from utils.image_utils import render_page
+from .ocr_engine import offset_ocr_result
+from .segment_builder import GridIndex
+
+
+def tile_grid(width, height, tile_size, overlap=0):
+    """按固定步长将页面划分为图块，返回 [(x0, y0, x1, y1)]，overlap为相邻图块的重叠像素"""
+    step = max(1, tile_size - overlap)
+    xs = list(range(0, max(1, width - overlap), step))
+    ys = list(range(0, max(1, height - overlap), step))
+    return [(x, y, min(width, x + tile_size), min(height, y + tile_size)) for y in ys for x in xs]
+
+
+def _overlap(a0, a1, b0, b1):
+    return max(0, min(a1, b1) - max(a0, b0))
+
+
+def _merge_text(left, right, overlap_chars):
+    """拼接在图块接缝处被截断的同一行文本，去掉重叠区域内重复识别的字符"""
+    limit = min(len(left), len(right))
+    candidates = range(min(limit, overlap_chars + 3), max(0, overlap_chars - 3), -1)
+    for k in candidates:
+        if k > 0 and left[-k:] == right[:k]:
+            return left + right[k:]
+    # 识别结果不完全一致时按几何位置估算重叠字符数
+    separator = " " if left and right and left[-1].isascii() and right[0].isascii() else ""
+    return left + separator + right[min(overlap_chars, len(right)):].lstrip()
+
+
+class PageTiler:
+    """超大幅面页面(图纸、海报)的分块处理：按图块栅格化、OCR与渲染，峰值内存取决于图块大小"""
+
+    MANIFEST = "tiles.json"
+
+    def __init__(self, config):
+        tile_cfg = config.get('tiling', {})
+        self.enabled = tile_cfg.get('enabled', True)
+        self.max_megapixels = tile_cfg.get('max_megapixels', 40)  # 超过此像素数的页面分块处理
+        self.tile_size = tile_cfg.get('tile_size', 2048)  # 图块边长(像素)
+        self.overlap = tile_cfg.get('overlap', 256)  # OCR图块重叠像素，应大于最大行高
+        self.containment = tile_cfg.get('containment', 0.7)  # 重复框判定的包含比例
+        self.edge_margin = tile_cfg.get('edge_margin', 4)  # 距图块内部边缘多近视为被截断(像素)
+        self.dpi = config['processing']['dpi']
+
+    # ---------- 页面尺寸 ----------
+
+    def page_size(self, page):
+        """页面按处理DPI栅格化后的像素尺寸"""
+        scale = self.dpi / 72
+        return round(page.rect.width * scale), round(page.rect.height * scale)
+
+    def should_tile(self, page):
+        if not self.enabled:
+            return False
+        width, height = self.page_size(page)
+        return width * height > self.max_megapixels * 1_000_000
+
+    def _clip(self, page, box):
+        """像素坐标 -> 页面坐标裁剪区域"""
+        scale = 72 / self.dpi
+        x0, y0, x1, y1 = box
+        origin = page.rect.tl
+        return fitz.Rect(x0 * scale, y0 * scale, x1 * scale, y1 * scale) + (origin.x, origin.y, origin.x, origin.y)
+
+    # ---------- 栅格化 ----------
+
+    @staticmethod
+    def tile_dir(directory, page_num):
+        return Path(directory) / f"page_{page_num}_tiles"
+
+    @classmethod
+    def is_tiled(cls, directory, page_num):
+        return cls.is_tiled_dir(cls.tile_dir(directory, page_num))
+
+    @classmethod
+    def is_tiled_dir(cls, tile_dir):
+        return (Path(tile_dir) / cls.MANIFEST).exists()
+
+    @staticmethod
+    def tiled_pages(directory):
+        """目录中所有分块页面的页码"""
+        pages = []
+        for path in Path(directory).glob("page_*_tiles"):
+            match = re.match(r'page_(\d+)_tiles$', path.name)
+            if match and (path / PageTiler.MANIFEST).exists():
+                pages.append(int(match.group(1)))
+        return sorted(pages)
+
+    def rasterize(self, page, page_num, output_folder):
+        """将页面按不重叠的图块栅格化，保存图块与清单，返回图块目录"""
+        width, height = self.page_size(page)
+        tile_dir = self.tile_dir(output_folder, page_num)
+        tile_dir.mkdir(parents=True, exist_ok=True)
+
+        tiles = []
+        for index, box in enumerate(tile_grid(width, height, self.tile_size)):
+            name = f"tile_{index:04d}.jpg"
+            Image.fromarray(render_page(page, self.dpi, clip=self._clip(page, box))).save(tile_dir / name, 'JPEG')
+            tiles.append({"name": name, "box": list(box)})
+
+        self.write_manifest(tile_dir, {"width": width, "height": height, "dpi": self.dpi, "tiles": tiles})
+        return tile_dir
+
+    @classmethod
+    def load_manifest(cls, tile_dir):
+        with open(Path(tile_dir) / cls.MANIFEST, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @classmethod
+    def write_manifest(cls, tile_dir, manifest):
+        with open(Path(tile_dir) / cls.MANIFEST, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+    # ---------- OCR ----------
+
+    def ocr_page(self, engine, page):
+        """按重叠图块逐块OCR，合并接缝处被截断或重复识别的文本行"""
+        width, height = self.page_size(page)
+        lines = []
+        for box in tile_grid(width, height, self.tile_size, self.overlap):
+            image = render_page(page, self.dpi, clip=self._clip(page, box))
+            result = offset_ocr_result(engine.predict(image), box[0], box[1])
+            scores = result.get("rec_scores") or [1.0] * len(result.get("rec_texts", []))
+            for text, score, rec_box in zip(result.get("rec_texts", []), scores, result.get("rec_boxes", [])):
+                lines.append({"text": text, "score": score, "box": [float(v) for v in rec_box],
+                              "tile": box, "cut": self._cut_edges(rec_box, box, width, height)})
+
+        lines = self._merge_seams(self._drop_duplicates(lines))
+        lines.sort(key=lambda line: (line["box"][1], line["box"][0]))
+
+        polys = [[[b[0], b[1]], [b[2], b[1]], [b[2], b[3]], [b[0], b[3]]] for b in (line["box"] for line in lines)]
+        return {
+            "rec_texts": [line["text"] for line in lines],
+            "rec_scores": [line["score"] for line in lines],
+            "rec_boxes": [[round(v) for v in line["box"]] for line in lines],
+            "rec_polys": polys,
+            "dt_polys": polys,
+            "tiled": {"tile_size": self.tile_size, "overlap": self.overlap},
+        }
+
+    def _cut_edges(self, box, tile, width, height):
+        """文本框贴近的图块内部边缘(页面边缘除外)，说明该行可能被图块截断"""
+        cut = set()
+        if tile[0] > 0 and box[0] - tile[0] <= self.edge_margin:
+            cut.add("left")
+        if tile[2] < width and tile[2] - box[2] <= self.edge_margin:
+            cut.add("right")
+        if tile[1] > 0 and box[1] - tile[1] <= self.edge_margin:
+            cut.add("top")
+        if tile[3] < height and tile[3] - box[3] <= self.edge_margin:
+            cut.add("bottom")
+        return cut
+
+    @staticmethod
+    def _area(box):
+        return max(0, box[2] - box[0]) * max(0, box[3] - box[1])
+
+    def _drop_duplicates(self, lines):
+        """重叠区域内被相邻图块重复识别的行只保留一份：优先保留未被截断、面积更大的框
+
+        已保留的行放入网格索引(网格边长取行高中位数的两倍，至少64像素)，每行只与网格中相邻的行比较。
+        图块没有重叠时不存在重复识别。
+        """
+        if self.overlap <= 0 or not lines:
+            return lines
+        lines = sorted(lines, key=lambda line: (len(line["cut"]), -self._area(line["box"])))
+        heights = sorted(line["box"][3] - line["box"][1] for line in lines)
+        kept = []
+        index = GridIndex(max(64.0, 2 * heights[len(heights) // 2]))
+        for line in lines:
+            box = line["box"]
+            duplicate = False
+            for i in index.query(box):
+                other = kept[i]
+                if other["tile"] == line["tile"]:
+                    continue
+                ob = other["box"]
+                inter = _overlap(box[0], box[2], ob[0], ob[2]) * _overlap(box[1], box[3], ob[1], ob[3])
+                smaller = min(self._area(box), self._area(ob)) or 1
+                if inter / smaller >= self.containment:
+                    duplicate = True
+                    break
+            if not duplicate:
+                index.insert(len(kept), box)
+                kept.append(line)
+        return kept
+
+    def _merge_seams(self, lines):
+        """拼接跨越竖直接缝的长文本行(同一行的左右两段分别被两个图块截断)"""
+        merged = True
+        while merged:
+            merged = False
+            for i, left in enumerate(lines):
+                if "right" not in left["cut"]:
+                    continue
+                for j, right in enumerate(lines):
+                    if i == j or "left" not in right["cut"] or right["tile"] == left["tile"]:
+                        continue
+                    lb, rb = left["box"], right["box"]
+                    height = min(lb[3] - lb[1], rb[3] - rb[1]) or 1
+                    if rb[0] >= lb[2] or lb[0] >= rb[0]:
+                        continue
+                    if _overlap(lb[1], lb[3], rb[1], rb[3]) / height < 0.5:
+                        continue
+                    char_width = (lb[2] - lb[0]) / max(len(left["text"]), 1)
+                    overlap_chars = round((lb[2] - rb[0]) / char_width) if char_width else 0
+                    lines[i] = {
+                        "text": _merge_text(left["text"], right["text"], overlap_chars),
+                        "score": min(left["score"], right["score"]),
+                        "box": [lb[0], min(lb[1], rb[1]), rb[2], max(lb[3], rb[3])],
+                        "tile": right["tile"],
+                        "cut": (left["cut"] - {"right"}) | (right["cut"] - {"left"}),
+                    }
+                    del lines[j]
+                    merged = True
+                    break
+                if merged:
+                    break
+        return lines
@@ -0,0 +1,148 @@
+import logging
+import math
+import multiprocessing
+import shutil
+import tempfile
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+from utils.metrics import metrics
+from utils.resources import available_cpus
+from .deadline import Deadline, mark_pdf_pages
+from .glossary import Glossary
+from .prompts import pdf2zh_prompt
+
+logger = logging.getLogger(__name__)
+
+# 工作进程内的版面模型，每个进程只加载一次
+_worker_model = None
+
+
+def _init_worker(config):
+    """进程池初始化函数：在工作进程中加载版面模型"""
+    global _worker_model
+    from .layout_service import LayoutInferenceService
+    try:
+        _worker_model = LayoutInferenceService.get(config)
+    except Exception as e:
+        logger.warning(f"Worker failed to load ONNX model: {str(e)}")
+        from .non_scanned_pdf_processor import DocumentLayoutModel
+        _worker_model = DocumentLayoutModel()
+
+
+def _translate_shard(shard_path, output_dir, params):
+    """在工作进程中翻译单个分片，返回单语输出文件路径"""
+    from pdf2zh.high_level import translate
+
+    if hasattr(_worker_model, "prefetch"):
+        _worker_model.prefetch(shard_path)
+    shard_params = dict(params, files=[shard_path], output=output_dir, model=_worker_model)
+    result = translate(**shard_params)
+    if not result:
+        raise RuntimeError(f"分片翻译无输出: {shard_path}")
+    return result[0][0]
+
+
+class ShardedTranslator:
+    """将非扫描件PDF按页码范围分片，在进程池中并行翻译后按页序合并"""
+
+    def __init__(self, config):
+        shard_cfg = config.get('sharding', {})
+        self.enabled = shard_cfg.get('enabled', False)
+        self.pages_per_shard = max(1, shard_cfg.get('pages_per_shard', 8))
+        self.min_pages = shard_cfg.get('min_pages', 16)  # 页数少于此值时不分片
+        self.workers = shard_cfg.get('workers', 0) or available_cpus()
+        self.config = config
+        self.work_dir = shard_cfg.get('work_dir') or None
+
+    def should_shard(self, pdf_path):
+        if not self.enabled:
+            return False
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count >= self.min_pages
+
+    def split(self, pdf_path, work_dir):
+        """按页码范围拆分PDF，返回 [(起始页, 结束页, 分片路径)]"""
+        shards = []
+        with fitz.open(pdf_path) as doc:
+            shard_count = math.ceil(doc.page_count / self.pages_per_shard)
+            for index in range(shard_count):
+                start = index * self.pages_per_shard
+                end = min(doc.page_count, start + self.pages_per_shard) - 1
+                shard_path = Path(work_dir) / f"shard_{index:04d}.pdf"
+                with fitz.open() as shard:
+                    shard.insert_pdf(doc, from_page=start, to_page=end)
+                    shard.save(str(shard_path))
+                shards.append((start, end, str(shard_path)))
+        return shards
+
+    def merge(self, shard_outputs, output_path):
+        """按页序合并各分片的翻译结果"""
+        with fitz.open() as merged:
+            for shard_output in shard_outputs:
+                with fitz.open(shard_output) as part:
+                    merged.insert_pdf(part)
+            merged.save(str(output_path), garbage=3, deflate=True)
+        return str(output_path)
+
+    @staticmethod
+    def _mark_untranslated(shard_path, deadline):
+        """原文分片加上未翻译标记，返回标记后的文件路径"""
+        marked_path = f"{shard_path}.untranslated.pdf"
+        with fitz.open(shard_path) as doc:
+            count = mark_pdf_pages(doc, deadline.mark_text)
+            doc.save(marked_path)
+        metrics.inc("pages_untranslated_total", count, reason="deadline")
+        return marked_path
+
+    def translate(self, pdf_path, params, output_path):
+        """分片并行翻译整个文档
+
+        截止时间模式下等待每个分片不超过剩余时间，超时的分片使用带未翻译标记的原文页面，
+        其余工作进程随进程池一同终止。
+        """
+        deadline = Deadline(self.config)
+        work_dir = tempfile.mkdtemp(prefix="pdf2zh_shards_", dir=self.work_dir)
+        try:
+            shards = self.split(pdf_path, work_dir)
+            if deadline.expired():
+                logger.warning("截止时间已到，输出带未翻译标记的原文")
+                return self.merge([self._mark_untranslated(path, deadline) for _, _, path in shards], output_path)
+
+            workers = min(self.workers, len(shards))
+            logger.info(f"分片翻译: {len(shards)} 个分片, {workers} 个进程")
+
+            # 版面模型不可跨进程传递，由工作进程自行加载
+            worker_params = {k: v for k, v in params.items() if k not in ("files", "output", "model")}
+            output_dir = str(Path(work_dir) / "out")
+            Path(output_dir).mkdir(exist_ok=True)
+
+            # 使用spawn避免在已加载ONNX Runtime的进程中fork
+            # 术语表在主进程中匹配，每个分片的提示词只包含该分片中出现的术语
+            glossary = Glossary.get(self.config)
+            shard_terms = [glossary.find_in_pdf(shard_path, params["lang_out"]) if glossary.enabled else []
+                           for _, _, shard_path in shards]
+
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(workers, initializer=_init_worker, initargs=(self.config,)) as pool:
+                pending = [
+                    pool.apply_async(_translate_shard, (
+                        shard_path, output_dir, dict(worker_params, prompt=pdf2zh_prompt(terms)) if terms else worker_params
+                    ))
+                    for (_, _, shard_path), terms in zip(shards, shard_terms)
+                ]
+                shard_outputs = []
+                for (start, end, shard_path), job, terms in zip(shards, pending, shard_terms):
+                    try:
+                        shard_outputs.append(job.get(timeout=deadline.remaining() if deadline.active else None))
+                    except multiprocessing.TimeoutError:
+                        logger.warning(f"截止时间已到，第{start + 1}-{end + 1}页保留原文")
+                        shard_outputs.append(self._mark_untranslated(shard_path, deadline))
+                        continue
+                    glossary.verify_pdf(shard_outputs[-1], terms)
+                    logger.info(f"分片完成: 第{start + 1}-{end + 1}页")
+
+            return self.merge(shard_outputs, output_path)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
@@ -1,28 +1,88 @@
-import os
-from pathlib import Path
-from pdf2image import convert_from_path
-
-
-class PDFToImageConverter:
-    def __init__(self, config):
-        self.config = config
-
-    def convert(self):
-        """将PDF转换为图片"""
-        print("\n" + "=" * 50)
-        print("步骤1: 将PDF转换为图片")
-        print("=" * 50)
-
-        pdf_path = self.config['input']['pdf_path']
-        output_folder = self.config['output']['image_dir']
-
-        Path(output_folder).mkdir(parents=True, exist_ok=True)
-
-        images = convert_from_path(pdf_path, dpi=self.config['processing']['dpi'])
-
-        for i, image in enumerate(images):
-            image_path = f"{output_folder}/page_{i + 1}.jpg"
-            image.save(image_path, 'JPEG')
-            print(f"保存: {image_path}")
-
-        return len(images)
\ No newline at end of file
+import os
+import time
+from pathlib import Path
+from pdf2image import convert_from_path
+from utils.metrics import metrics
+from utils.profiling import profiler
+from .page_tiling import PageTiler
+from .page_manifest import PageManifest
+
+
+class PDFToImageConverter:
+    def __init__(self, config):
+        self.config = config
+
+    def convert(self, pages=None):
+        """将PDF转换为图片，pages为需要转换的页索引(从0开始)，None表示全部"""
+        print("\n" + "=" * 50)
+        print("步骤1: 将PDF转换为图片")
+        print("=" * 50)
+
+        pdf_path = self.config['input']['pdf_path']
+        output_folder = self.config['output']['image_dir']
+
+        Path(output_folder).mkdir(parents=True, exist_ok=True)
+
+        dpi = self.config['processing']['dpi']
+        self.manifest = PageManifest(self.config)
+
+        # 超大幅面页面按图块栅格化，不生成整页图片
+        tiler = PageTiler(self.config)
+        tiled = self._rasterize_tiled(tiler, pdf_path, output_folder, pages) if tiler.enabled else set()
+        if tiled:
+            all_pages = pages if pages is not None else range(self._page_count(pdf_path))
+            pages = [index for index in all_pages if index not in tiled]
+
+        if pages is not None:
+            # 只转换指定页面(增量翻译或跳过分块页面)，文件名保持原页码
+            for index in pages:
+                with metrics.timer("rasterize", page=index + 1):
+                    image = convert_from_path(pdf_path, dpi=dpi, first_page=index + 1, last_page=index + 1)[0]
+                    image_path = f"{output_folder}/page_{index + 1}.jpg"
+                    with profiler.timed("jpeg_encode"):
+                        image.save(image_path, 'JPEG')
+                self.manifest.register(index + 1, "image", image_path)
+                print(f"保存: {image_path}")
+            return len(pages) + len(tiled)
+
+        start_time = time.perf_counter()
+        # 多个pdftoppm进程分段栅格化
+        images = convert_from_path(pdf_path, dpi=dpi,
+                                   thread_count=max(1, self.config['processing'].get('rasterize_threads', 1)))
+        # pdf2image一次性栅格化全部页面，按页均摊耗时
+        per_page = (time.perf_counter() - start_time) / max(len(images), 1)
+
+        for i, image in enumerate(images):
+            save_start = time.perf_counter()
+            image_path = f"{output_folder}/page_{i + 1}.jpg"
+            with profiler.timed("jpeg_encode"):
+                image.save(image_path, 'JPEG')
+            self.manifest.register(i + 1, "image", image_path)
+            metrics.record_stage("rasterize", per_page + time.perf_counter() - save_start, page=i + 1)
+            print(f"保存: {image_path}")
+
+        return len(images)
+
+    @staticmethod
+    def _page_count(pdf_path):
+        import fitz
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
+
+    def _rasterize_tiled(self, tiler, pdf_path, output_folder, pages=None):
+        """栅格化需要分块处理的超大页面，返回这些页面的索引"""
+        import fitz
+
+        tiled = set()
+        with fitz.open(pdf_path) as doc:
+            for index in (pages if pages is not None else range(doc.page_count)):
+                page = doc[index]
+                if not tiler.should_tile(page):
+                    continue
+                with metrics.timer("rasterize", page=index + 1):
+                    tile_dir = tiler.rasterize(page, index + 1, output_folder)
+                self.manifest.register(index + 1, "tiles", tile_dir)
+                metrics.inc("pages_tiled_total")
+                print(f"保存分块页面: {tile_dir}")
+                tiled.add(index)
+        return tiled
\ No newline at end of file
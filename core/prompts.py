@@ -0,0 +1,83 @@
+from string import Template
+
+# 扫描件流程的系统提示词
+SYSTEM_PROMPT = Template(
+    "你是一名专业的翻译官，能够将${source}准确翻译成${target}。"
+    "严格只输出翻译后的内容，不要添加任何解释、注解或额外信息。"
+    "保持专业术语准确，保留换行和格式。"
+)
+
+# 非扫描件流程：与pdf2zh内置的默认提示词一致(变量 lang_in/lang_out/text 由pdf2zh替换)
+PDF2ZH_PROMPT = Template(
+    "You are a professional, authentic machine translation engine. "
+    "Only Output the translated text, do not include any other text.\n\n"
+    "Translate the following markdown source text to ${lang_out}. "
+    "Keep the formula notation {v*} unchanged. Output translation directly without any additional text.\n\n"
+    "Source Text: ${text}\n\nTranslated Text:"
+)
+
+
+def glossary_block(terms):
+    """术语表提示：只包含当前文本中出现的术语"""
+    if not terms:
+        return ""
+    lines = "\n".join(f"{source} => {target}" for source, target in terms)
+    return f"术语表(原文出现以下术语时必须使用对应译法)：\n{lines}\n\n"
+
+
+def translation_messages(text, source_name, target_name, terms=None):
+    """单段翻译请求的消息列表，terms为需要注入的术语 [(原文, 译文)]"""
+    # 系统提示词保持不变，术语放在用户消息中，便于API复用提示词前缀缓存
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT.substitute(source=source_name, target=target_name)},
+        {"role": "user", "content": f"{glossary_block(terms)}请将以下{source_name}内容翻译成{target_name}：\n{text}"},
+    ]
+
+
+def batch_messages(texts, source_name, target_name, terms=None):
+    """多段合并为一次请求的消息列表，每段以 [[编号]] 开头"""
+    numbered = "\n".join(f"[[{i}]]\n{text}" for i, text in enumerate(texts, 1))
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT.substitute(source=source_name, target=target_name)},
+        {"role": "user", "content": f"{glossary_block(terms)}以下共{len(texts)}段{source_name}内容，每段以 [[编号]] 开头。"
+                                    f"请逐段翻译成{target_name}，保留每段的编号标记，不要合并或拆分段落：\n{numbered}"},
+    ]
+
+
+def correction_messages(messages, translated, missing):
+    """译文未使用术语表译法时的追加请求"""
+    lines = "\n".join(f"{source} => {target}" for source, target in missing)
+    return messages + [
+        {"role": "assistant", "content": translated},
+        {"role": "user", "content": f"译文没有使用以下术语的指定译法：\n{lines}\n请修正后重新输出完整译文，只输出译文。"},
+    ]
+
+
+def pdf2zh_prompt(terms=None):
+    """pdf2zh使用的提示词模板，terms不为空时在原文前加入术语表"""
+    if not terms:
+        return PDF2ZH_PROMPT
+    lines = "\n".join(f"{source} => {target}" for source, target in terms)
+    # 术语中的$需要转义，避免被当作模板变量
+    block = f"Glossary (always use these translations for the terms):\n{lines}\n\n".replace("$", "$$")
+    return Template(PDF2ZH_PROMPT.template.replace("Source Text: ", f"{block}Source Text: "))
+
+
+def pdf2zh_messages(text, lang_in, lang_out, template=PDF2ZH_PROMPT):
+    """pdf2zh按模板生成的消息列表"""
+    return [{"role": "user", "content": template.safe_substitute(lang_in=lang_in, lang_out=lang_out, text=text)}]
+
+
+def _is_cjk(char):
+    return '\u3040' <= char <= '\u30ff' or '\u4e00' <= char <= '\u9fff' or '\uac00' <= char <= '\ud7a3'
+
+
+def estimate_tokens(text):
+    """按DeepSeek公布的经验值估算token数：CJK字符约0.6个token，其余字符约0.3个token"""
+    cjk = sum(1 for char in text if _is_cjk(char))
+    return int(cjk * 0.6 + (len(text) - cjk) * 0.3 + 0.999)
+
+
+def estimate_message_tokens(messages):
+    """消息列表的输入token数(每条消息另计约4个格式token)"""
+    return sum(estimate_tokens(message["content"]) + 4 for message in messages)
@@ -0,0 +1,99 @@
+import numpy as np
+from PIL import Image
+
+from utils.profiling import profiled
+
+# 亮度权重(ITU-R BT.601)
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def _ranges(starts, stops):
+    """把多个整数区间 [start, stop) 展开为扁平数组，返回 (所属区间编号, 取值)"""
+    lengths = np.maximum(stops - starts, 0)
+    owners = np.repeat(np.arange(len(starts)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return owners, np.repeat(starts, lengths) + offsets
+
+
+class RegionEraser:
+    """译文绘制前的擦除阶段：用NumPy一次估计整页全部文本框的背景色，再统一填充
+
+    每个框的背景色取框外一圈像素中纸张像素(非墨迹)的均值，取样在按 sample_step 最近邻缩小的图片上进行，
+    全部框的取样圈像素一次取出并按框汇总；取样圈全是墨迹(如深色底纹)时使用整圈像素的均值。
+    """
+
+    def __init__(self, config):
+        erase_cfg = config.get('erase', {})
+        self.mode = erase_cfg.get('mode', 'auto')  # auto(按周围像素估计背景色) / white(统一填充白色)
+        self.top_inset = erase_cfg.get('top_inset', 0.15)  # 上边界内缩比例，避免擦掉上一行的下伸笔画
+        self.contrast = erase_cfg.get('ink_contrast', 60)  # 比纸张背景暗多少灰度视为墨迹
+        self.step = max(1, erase_cfg.get('sample_step', 4))  # 取样时的缩小倍数，取样点距框不超过1.5个步长
+
+    def rects(self, boxes, size):
+        """擦除区域(整数像素坐标，已裁剪到图片范围内)，形状为(n, 4)"""
+        coords = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        coords[:, 1] += (coords[:, 3] - coords[:, 1]) * self.top_inset
+        rects = np.rint(coords).astype(np.int64)
+        width, height = size
+        rects[:, [0, 2]] = np.clip(rects[:, [0, 2]], 0, width)
+        rects[:, [1, 3]] = np.clip(rects[:, [1, 3]], 0, height)
+        return rects
+
+    @profiled("erase")
+    def erase(self, img, boxes):
+        """在img(RGB的PIL图片)上擦除boxes [[x0, y0, x1, y1], ...]，返回每个框的背景色(n, 3)
+
+        先估计全部框的背景色再依次填充，后面的框覆盖前面的框；填充在绘制任何译文之前完成。
+        """
+        colors = np.full((len(boxes), 3), 255, dtype=np.uint8)
+        if not len(boxes):
+            return colors
+        rects = self.rects(boxes, img.size)
+        valid = np.flatnonzero((rects[:, 2] > rects[:, 0]) & (rects[:, 3] > rects[:, 1]))
+        if not valid.size:
+            return colors
+
+        if self.mode != "white":
+            colors[valid] = self.estimate(img, rects[valid])
+        # 颜色已全部确定，每个矩形只需一次C层面的纯色填充
+        for (x0, y0, x1, y1), color in zip(rects[valid].tolist(), colors[valid].tolist()):
+            img.paste(tuple(color), (x0, y0, x1, y1))
+        return colors
+
+    def estimate(self, img, rects):
+        """按每个框外一圈的像素估计背景色，返回(n, 3)"""
+        step = self.step
+        width, height = img.width // step, img.height // step
+        # 最近邻缩小：每个采样单元取其中心像素，不与相邻墨迹混合
+        small = np.asarray(img.resize((width, height), Image.NEAREST, box=(0, 0, width * step, height * step))
+                           if step > 1 else img)
+
+        # 缩小后的取样圈：框外紧邻的一圈采样单元(含四角)
+        x0 = rects[:, 0] // step - 1
+        y0 = rects[:, 1] // step - 1
+        x1 = -(-rects[:, 2] // step)
+        y1 = -(-rects[:, 3] // step)
+        top_owner, top_x = _ranges(x0, x1 + 1)
+        side_owner, side_y = _ranges(y0 + 1, y1)
+        owners = np.concatenate([top_owner, top_owner, side_owner, side_owner])
+        xs = np.concatenate([top_x, top_x, x0[side_owner], x1[side_owner]])
+        ys = np.concatenate([y0[top_owner], y1[top_owner], side_y, side_y])
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        owners, pixels = owners[inside], small[ys[inside], xs[inside]].astype(np.float64)
+
+        colors = np.full((len(rects), 3), 255.0)
+        if not len(pixels):
+            return colors.astype(np.uint8)
+        # 以取样像素亮度的90分位数作为纸张背景，适应偏色或灰底扫描件
+        gray = pixels @ _LUMA
+        paper = (gray >= np.percentile(gray, 90) - self.contrast).astype(np.float64)
+
+        count = len(rects)
+        paper_count = np.bincount(owners, weights=paper, minlength=count)
+        all_count = np.bincount(owners, minlength=count)
+        for channel in range(3):
+            paper_sum = np.bincount(owners, weights=pixels[:, channel] * paper, minlength=count)
+            all_sum = np.bincount(owners, weights=pixels[:, channel], minlength=count)
+            colors[:, channel] = np.where(paper_count > 0, paper_sum / np.maximum(paper_count, 1),
+                                          np.where(all_count > 0, all_sum / np.maximum(all_count, 1), 255.0))
+        return np.clip(np.rint(colors), 0, 255).astype(np.uint8)
@@ -1,41 +1,135 @@
-from .base_processor import BasePDFProcessor
-from .pdf_to_image import PDFToImageConverter
-from .image_ocr import ImageOCRProcessor
-from .image_translator import ImageTranslator
-from .image_to_pdf import ImageToPDFConverter
-from utils.file_utils import FileUtils
-
-
-class ScannedPDFProcessor(BasePDFProcessor):
-    def run(self):
-        """处理扫描件PDF的完整流程"""
-        try:
-            print("\n" + "=" * 50)
-            print("开始处理扫描件PDF (OCR流程)")
-            print("=" * 50)
-
-            # 1. PDF转图片
-            print("步骤1: PDF转图片...")
-            PDFToImageConverter(self.config).convert()
-
-            # 2. 运行OCR
-            print("\n步骤2: 运行OCR...")
-            ImageOCRProcessor(self.config).process()
-
-            # 3. 翻译图片内容
-            print("\n步骤3: 翻译内容...")
-            ImageTranslator(self.config).translate_images()
-
-            # 4. 合并为PDF
-            print("\n步骤4: 生成最终PDF...")
-            final_pdf = ImageToPDFConverter(self.config).convert()
-
-            # 5. 清理临时文件
-            if not self.config['processing']['keep_temp_files']:
-                print("\n清理临时文件...")
-                FileUtils.cleanup_temp_files(self.config)
-
-            return final_pdf
-        except Exception as e:
-            print(f"\n扫描件处理失败: {e}")
-            return None
\ No newline at end of file
+import os
+from pathlib import Path
+from .base_processor import BasePDFProcessor
+from .pdf_to_image import PDFToImageConverter
+from .image_ocr import ImageOCRProcessor
+from .image_translator import ImageTranslator
+from .image_to_pdf import ImageToPDFConverter
+from .incremental import IncrementalTranslator
+from .distributed import DistributedCoordinator
+from .page_manifest import PageManifest
+from .deadline import Deadline
+from .autotune import AutoTuner
+from .estimator import JobEstimator
+from utils.file_utils import FileUtils
+from utils.profiling import profiler
+
+
+class ScannedPDFProcessor(BasePDFProcessor):
+    def run(self):
+        """处理扫描件PDF的完整流程"""
+        try:
+            print("\n" + "=" * 50)
+            print("开始处理扫描件PDF (OCR流程)")
+            print("=" * 50)
+
+            if self.config.get('distributed', {}).get('enabled', False):
+                # 分布式模式：页面任务经共享队列分发给多个工作进程/主机
+                if Deadline.requested(self.config):
+                    print("分布式模式不支持截止时间，按完整流程执行")
+                return DistributedCoordinator(self.config).run()
+
+            # 目标语言在处理开始前确定，多个目标语言共用一次栅格化与OCR
+            translator = ImageTranslator(self.config)
+            multi_lang = len(translator.target_langs) > 1
+
+            # 增量模式：只处理与上一版相比发生变化的页面
+            incremental = IncrementalTranslator(self.config)
+            if multi_lang and incremental.enabled:
+                print("增量翻译只支持单一目标语言，执行完整翻译")
+                plan = None
+            else:
+                plan = incremental.plan(self.config['input']['pdf_path']) if incremental.is_available() else None
+
+            if plan is None or plan["changed"]:
+                # 新的运行从空的页面产物索引开始，目录中残留的旧文件不会被使用
+                PageManifest(self.config).reset()
+
+                # 自动调优：试运行前几页，按实测吞吐与CPU/内存限制设置后续各阶段的并发数
+                AutoTuner(self.config).tune(translator, plan["changed"] if plan else None)
+
+                # 截止时间从语言选择与调优试运行之后开始计时；预算不足时整份文档改用较低DPI(各阶段坐标保持一致)
+                translator.deadline = Deadline.begin(self.config)
+                self._apply_deadline_dpi(len(plan["changed"]) if plan else None)
+
+                # 1. PDF转图片
+                print("步骤1: PDF转图片...")
+                with profiler.timed("step.rasterize"):
+                    PDFToImageConverter(self.config).convert(pages=plan["changed"] if plan else None)
+
+                # 2. 运行OCR
+                print("\n步骤2: 运行OCR...")
+                with profiler.timed("step.ocr"):
+                    ImageOCRProcessor(self.config).process()
+
+                # 3. 翻译图片内容(多个目标语言并行)
+                print("\n步骤3: 翻译内容...")
+                with profiler.timed("step.translate"):
+                    output_dirs = translator.translate_images()
+
+                # 4. 合并为PDF，每个目标语言一个文件
+                print("\n步骤4: 生成最终PDF...")
+                converter = ImageToPDFConverter(self.config)
+                with profiler.timed("step.assemble"):
+                    if multi_lang:
+                        final_pdf = [converter.convert(input_dir, lang) for lang, input_dir in output_dirs.items()]
+                        final_pdf = [path for path in final_pdf if path] or None
+                    else:
+                        final_pdf = converter.convert()
+            else:
+                final_pdf = None
+
+            if plan is not None and (final_pdf or not plan["changed"]):
+                final_pdf = self._assemble_incremental(incremental, plan, final_pdf)
+
+            # 5. 清理临时文件
+            if not self.config['processing']['keep_temp_files']:
+                print("\n清理临时文件...")
+                FileUtils.cleanup_temp_files(self.config)
+
+            return final_pdf
+        except Exception as e:
+            print(f"\n扫描件处理失败: {e}")
+            return None
+        finally:
+            AutoTuner.restore(self.config)
+
+    def estimate(self):
+        """预估模式：抽样页面运行栅格化与OCR，输出预计token用量与耗时，不调用翻译API"""
+        print("\n" + "=" * 50)
+        print("扫描件PDF任务预估 (OCR流程)")
+        print("=" * 50)
+        return JobEstimator(self.config).estimate_scanned(ImageTranslator(self.config))
+
+    def _apply_deadline_dpi(self, page_count=None):
+        deadline = Deadline(self.config)
+        if not deadline.active:
+            return
+        if page_count is None:
+            import fitz
+            with fitz.open(self.config['input']['pdf_path']) as doc:
+                page_count = doc.page_count
+        dpi = self.config['processing']['dpi']
+        if deadline.apply_dpi(self.config, page_count) != dpi:
+            print(f"时间预算紧张，栅格化DPI由 {dpi} 降为 {self.config['processing']['dpi']}")
+
+    def _assemble_incremental(self, incremental, plan, changed_pdf):
+        """将本次翻译的变化页面与上一版译文合并为完整PDF"""
+        pdf_name = Path(self.config['input']['pdf_path']).stem
+        output_pdf = os.path.join(self.config['output']['pdf_dir'], f"{pdf_name}_translated.pdf")
+        if changed_pdf:
+            # 变化页面的PDF与最终输出同名，先移到临时路径
+            changed_tmp = f"{changed_pdf}.changed.pdf"
+            os.replace(changed_pdf, changed_tmp)
+            # OCR或翻译失败的页面没有译文图片，按图片的页码对应变化页面
+            changed_pages = [page for page, _ in ImageToPDFConverter(self.config).collect_images()]
+        else:
+            changed_tmp, changed_pages = None, []
+
+        try:
+            incremental.assemble(plan, changed_tmp, output_pdf, changed_pages)
+        finally:
+            if changed_tmp:
+                os.remove(changed_tmp)
+        print(f"增量翻译完成: {output_pdf}")
+        return output_pdf
\ No newline at end of file
@@ -0,0 +1,233 @@
+from collections import defaultdict
+
+
+def _is_cjk(char):
+    """判断字符是否属于CJK(中日韩)文字"""
+    return ('\u4e00' <= char <= '\u9fff' or '\u3040' <= char <= '\u30ff'
+            or '\uac00' <= char <= '\ud7a3')
+
+
+def join_lines(lines):
+    """将同一段落的多行文本拼接为一段，处理CJK与连字符断词"""
+    result = ""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if not result:
+            result = line
+        elif result.endswith('-') and line[:1].islower():
+            # 英文行尾连字符断词
+            result = result[:-1] + line
+        elif _is_cjk(result[-1]) or _is_cjk(line[0]):
+            result += line
+        else:
+            result += " " + line
+    return result
+
+
+def union_box(boxes):
+    """计算多个矩形框的外接框"""
+    return [
+        min(b[0] for b in boxes),
+        min(b[1] for b in boxes),
+        max(b[2] for b in boxes),
+        max(b[3] for b in boxes)
+    ]
+
+
+class GridIndex:
+    """基于均匀网格的矩形空间索引"""
+
+    def __init__(self, cell_size):
+        self.cell_size = max(float(cell_size), 1.0)
+        self.cells = defaultdict(list)
+
+    def _cell_range(self, box):
+        size = self.cell_size
+        return (int(box[0] // size), int(box[1] // size),
+                int(box[2] // size), int(box[3] // size))
+
+    def insert(self, item_id, box):
+        x0, y0, x1, y1 = self._cell_range(box)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells[(cx, cy)].append(item_id)
+
+    def query(self, box):
+        """返回与给定区域所在网格相交的候选项"""
+        x0, y0, x1, y1 = self._cell_range(box)
+        found = set()
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                found.update(self.cells.get((cx, cy), ()))
+        return found
+
+
+class SegmentBuilder:
+    """将OCR返回的逐行文本框按版面几何关系合并为段落"""
+
+    def __init__(self, config):
+        seg_cfg = config.get('segmentation', {})
+        self.enabled = seg_cfg.get('enabled', True)
+        self.line_gap_ratio = seg_cfg.get('line_gap_ratio', 0.8)  # 行间距/行高上限
+        self.height_tolerance = seg_cfg.get('height_tolerance', 0.35)  # 行高相对差异上限
+        self.min_overlap = seg_cfg.get('min_horizontal_overlap', 0.3)  # 水平重叠比例下限
+        self.max_lines = seg_cfg.get('max_lines', 30)  # 单个段落最多合并行数
+        self.table_gap_ratio = seg_cfg.get('table_gap_ratio', 1.5)  # 同行间距/行高低于此值视为表格
+
+    def build(self, texts, boxes, scores=None):
+        """将行级识别结果合并为按阅读顺序排列的段落"""
+        lines = []
+        for i, (text, box) in enumerate(zip(texts, boxes)):
+            if not text.strip() or len(box) != 4:
+                continue
+            x0, y0, x1, y1 = [float(v) for v in box]
+            lines.append({
+                "index": i,
+                "text": text.strip(),
+                "box": [x0, y0, x1, y1],
+                "height": max(y1 - y0, 1.0),
+                "score": float(scores[i]) if scores is not None and i < len(scores) else 1.0
+            })
+
+        if not lines:
+            return []
+
+        if self.enabled and len(lines) > 1:
+            groups = self._group_lines(lines)
+        else:
+            groups = [[line] for line in lines]
+
+        segments = [self._make_segment(group) for group in groups]
+        return self._reading_order(segments)
+
+    def _group_lines(self, lines):
+        """以行为节点，向下寻找同栏的续行并串联成段落"""
+        heights = sorted(line["height"] for line in lines)
+        median_height = heights[len(heights) // 2]
+        index = GridIndex(median_height * 2)
+        for i, line in enumerate(lines):
+            index.insert(i, line["box"])
+
+        table_like = [self._has_row_sibling(i, lines, index) for i in range(len(lines))]
+
+        next_of = {}
+        has_prev = set()
+        order = sorted(range(len(lines)), key=lambda i: (lines[i]["box"][1], lines[i]["box"][0]))
+        for i in order:
+            if table_like[i]:
+                continue
+            line = lines[i]
+            x0, y0, x1, y1 = line["box"]
+            search = [x0, y1, x1, y1 + line["height"] * (1 + self.line_gap_ratio)]
+            best, best_gap = None, None
+            for j in index.query(search):
+                if j == i or j in has_prev or table_like[j]:
+                    continue
+                gap = self._continuation_gap(line, lines[j])
+                if gap is not None and (best_gap is None or gap < best_gap):
+                    best, best_gap = j, gap
+            if best is not None:
+                next_of[i] = best
+                has_prev.add(best)
+
+        groups = []
+        for i in order:
+            if i in has_prev:
+                continue
+            chain = [lines[i]]
+            current = i
+            while current in next_of:
+                current = next_of[current]
+                chain.append(lines[current])
+            # 超出行数上限的长链拆分为多个段落
+            for start in range(0, len(chain), self.max_lines):
+                groups.append(chain[start:start + self.max_lines])
+        return groups
+
+    def _continuation_gap(self, upper, lower):
+        """判断lower是否为upper的下一行，是则返回行间距"""
+        ux0, uy0, ux1, uy1 = upper["box"]
+        lx0, ly0, lx1, ly1 = lower["box"]
+        max_height = max(upper["height"], lower["height"])
+
+        if ly0 < uy0 + upper["height"] * 0.5:
+            return None
+        gap = ly0 - uy1
+        if gap > max_height * self.line_gap_ratio:
+            return None
+        if abs(upper["height"] - lower["height"]) > max_height * self.height_tolerance:
+            return None
+
+        overlap = min(ux1, lx1) - max(ux0, lx0)
+        min_width = max(min(ux1 - ux0, lx1 - lx0), 1.0)
+        if overlap / min_width < self.min_overlap:
+            return None
+
+        # 上一行明显短于下一行，说明上一行是段尾或标题
+        if ux1 < lx1 - (lx1 - lx0) * 0.15:
+            return None
+        return max(gap, 0.0)
+
+    def _has_row_sibling(self, i, lines, index):
+        """同一行内紧邻的其他文本框意味着表格结构，不做合并"""
+        line = lines[i]
+        x0, y0, x1, y1 = line["box"]
+        reach = line["height"] * self.table_gap_ratio
+        for j in index.query([x0 - reach, y0, x1 + reach, y1]):
+            if j == i:
+                continue
+            ox0, oy0, ox1, oy1 = lines[j]["box"]
+            vertical_overlap = min(y1, oy1) - max(y0, oy0)
+            if vertical_overlap < line["height"] * 0.5:
+                continue
+            horizontal_gap = max(ox0 - x1, x0 - ox1)
+            if horizontal_gap < reach:
+                return True
+        return False
+
+    def _make_segment(self, group):
+        line_boxes = [line["box"] for line in group]
+        return {
+            "coords": union_box(line_boxes),
+            "text": join_lines([line["text"] for line in group]),
+            "lines": [line["index"] for line in group],
+            "line_boxes": line_boxes,
+            "score": min(line["score"] for line in group)
+        }
+
+    def _reading_order(self, segments):
+        """使用递归XY切分确定段落的阅读顺序"""
+        if len(segments) <= 1:
+            return segments
+
+        x_gap, x_groups = self._largest_gap_split(segments, axis=0)
+        y_gap, y_groups = self._largest_gap_split(segments, axis=1)
+        if x_groups and (not y_groups or x_gap * 2 >= y_gap):
+            # 优先按栏切分(左栏在前)，栏间空白通常窄于段间空白的两倍
+            groups = x_groups
+        elif y_groups:
+            groups = y_groups
+        else:
+            return sorted(segments, key=lambda s: (s["coords"][1], s["coords"][0]))
+
+        ordered = []
+        for group in groups:
+            ordered.extend(self._reading_order(group))
+        return ordered
+
+    @staticmethod
+    def _largest_gap_split(segments, axis):
+        """沿指定轴(0=x, 1=y)在最大的投影空白处一分为二"""
+        items = sorted(segments, key=lambda s: s["coords"][axis])
+        best_gap, best_index = 0.0, None
+        current_end = items[0]["coords"][axis + 2]
+        for i, seg in enumerate(items[1:], 1):
+            gap = seg["coords"][axis] - current_end
+            if gap > best_gap:
+                best_gap, best_index = gap, i
+            current_end = max(current_end, seg["coords"][axis + 2])
+        if best_index is None:
+            return 0.0, None
+        return best_gap, [items[:best_index], items[best_index:]]
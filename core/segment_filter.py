@@ -0,0 +1,138 @@
+import math
+import re
+from collections import defaultdict
+
+# 不需要翻译、原样保留的文本规则
+PAGE_NUMBER_PATTERN = re.compile(
+    r'^(?:[-–—]\s*)?(?:page|p\.?|pg\.?|第|页)?\s*\d{1,4}\s*(?:(?:/|of|共)\s*\d{1,4})?\s*(?:页)?(?:\s*[-–—])?$',
+    re.IGNORECASE
+)
+# 罗马数字编号：只含 i/v/x 的(前言页码、章节号)可单独成行，含 l/c/d/m 的须带列表标记 "." 或 ")"，
+# 以免 "mix"、"CV" 等单词被当作编号；按小写匹配，原文须全部大写或全部小写
+ROMAN_NUMERAL_PATTERN = re.compile(
+    r'^(?:(?=[xvi])x{0,3}(?:ix|iv|v?i{0,3})[.)]?'
+    r'|(?=[mdclxvi])m{0,3}(?:cm|cd|d?c{0,3})(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})[.)])$'
+)
+NUMERIC_PATTERN = re.compile(r'^[\d\s.,:;%‰+\-−–—/\\()\[\]#*×x=<>≤≥±$€¥£¢°]+$')
+URL_PATTERN = re.compile(r'^(?:https?://|www\.)\S+$|^[\w.+-]+@[\w-]+(?:\.[\w-]+)+$', re.IGNORECASE)
+WORD_PATTERN = re.compile(r'[^\W\d_]{4,}|[\u4e00-\u9fff\u3040-\u30ff\uac00-\ud7a3]{2,}')
+# 出现即表明是运算的符号
+OPERATORS = set('=×÷^∑∏∫√∂∆∇∞≈≠±≤≥∈∉⊂⊃∪∩')
+# + - / * < > 也常作标点("Yes/No"、"Mr. Li - CEO")，两侧须为数字或单字母变量才视为运算
+_OPERAND = r'(?:\d|(?<![A-Za-zα-ωΑ-Ω])[A-Za-zα-ωΑ-Ω](?![A-Za-zα-ωΑ-Ω]))'
+OPERATION_PATTERN = re.compile(_OPERAND + r'[)\]]*\s*[+\-−*/<>]\s*[(\[]*' + _OPERAND)
+
+
+def normalize_text(text):
+    """归一化文本用于比较(去除首尾空白并合并连续空白)"""
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class SegmentFilter:
+    """翻译前过滤：识别页码、纯数字、网址、公式和低置信度噪声等无需翻译的文本"""
+
+    def __init__(self, config):
+        filter_cfg = config.get('text_filter', {})
+        self.enabled = filter_cfg.get('enabled', True)
+        self.min_score = filter_cfg.get('min_score', 0.5)  # OCR置信度下限
+        self.min_letter_ratio = filter_cfg.get('min_letter_ratio', 0.3)  # 公式判定的字母占比下限
+        self.extra_patterns = [re.compile(p) for p in filter_cfg.get('skip_patterns', [])]
+
+    def classify(self, text, score=1.0):
+        """返回跳过原因，需要翻译时返回None"""
+        if not self.enabled:
+            return None
+
+        text = normalize_text(text)
+        if not text:
+            return "empty"
+        if score is not None and score < self.min_score:
+            return "low_confidence"
+        if PAGE_NUMBER_PATTERN.match(text) or self._is_roman_numeral(text):
+            return "page_number"
+        if NUMERIC_PATTERN.match(text):
+            return "numeric"
+        if URL_PATTERN.match(text):
+            return "url"
+        for pattern in self.extra_patterns:
+            if pattern.search(text):
+                return "custom"
+
+        letters = sum(1 for char in text if char.isalpha())
+        if letters == 0:
+            return "no_letters"
+        has_operator = any(char in OPERATORS for char in text) or OPERATION_PATTERN.search(text)
+        if has_operator and (letters / len(text.replace(' ', '')) < self.min_letter_ratio
+                             or not WORD_PATTERN.search(text)):
+            # 含运算且字母占比过低或没有完整单词的表达式视为公式
+            return "formula"
+        return None
+
+    @staticmethod
+    def _is_roman_numeral(text):
+        return (text.islower() or text.isupper()) and ROMAN_NUMERAL_PATTERN.match(text.lower()) is not None
+
+    def filter_lines(self, texts, boxes, scores=None):
+        """拆分为需要翻译的行与原样保留的行，返回(保留索引列表, {索引: 原因})"""
+        keep, skipped = [], {}
+        for i, text in enumerate(texts):
+            score = float(scores[i]) if scores is not None and i < len(scores) else 1.0
+            reason = self.classify(text, score)
+            if reason is None:
+                keep.append(i)
+            else:
+                skipped[i] = reason
+        return keep, skipped
+
+
+class RecurringTextDetector:
+    """检测在多页相同位置重复出现的文本(页眉页脚等)，使其只翻译一次"""
+
+    def __init__(self, config):
+        filter_cfg = config.get('text_filter', {})
+        self.enabled = filter_cfg.get('recurring_enabled', True)
+        self.min_pages = filter_cfg.get('recurring_min_pages', 3)  # 至少出现的页数
+        self.min_ratio = filter_cfg.get('recurring_min_ratio', 0.3)  # 至少出现的页数占比
+        self.tolerance = filter_cfg.get('position_tolerance', 30)  # 位置容差(像素)
+        self.recurring = defaultdict(list)  # 文本 -> 重复出现的位置中心
+
+    def scan(self, page_segments):
+        """扫描全文档的段落，page_segments为 {页码: 段落列表}"""
+        self.recurring.clear()
+        if not self.enabled or len(page_segments) < 2:
+            return 0
+
+        # 文本 -> 位置聚类 [中心x, 中心y, 出现页集合]
+        clusters = defaultdict(list)
+        for page, segments in page_segments.items():
+            for seg in segments:
+                key = normalize_text(seg["text"])
+                cx, cy = self._center(seg["coords"])
+                for cluster in clusters[key]:
+                    if abs(cluster[0] - cx) <= self.tolerance and abs(cluster[1] - cy) <= self.tolerance:
+                        cluster[2].add(page)
+                        break
+                else:
+                    clusters[key].append([cx, cy, {page}])
+
+        threshold = max(self.min_pages, math.ceil(self.min_ratio * len(page_segments)))
+        count = 0
+        for key, key_clusters in clusters.items():
+            for cx, cy, pages in key_clusters:
+                if len(pages) >= threshold:
+                    self.recurring[key].append((cx, cy))
+                    count += 1
+        return count
+
+    def is_recurring(self, text, coords):
+        """判断段落是否为已检测到的重复文本"""
+        positions = self.recurring.get(normalize_text(text))
+        if not positions:
+            return False
+        cx, cy = self._center(coords)
+        return any(abs(px - cx) <= self.tolerance and abs(py - cy) <= self.tolerance
+                   for px, py in positions)
+
+    @staticmethod
+    def _center(coords):
+        return (coords[0] + coords[2]) / 2, (coords[1] + coords[3]) / 2
@@ -0,0 +1,84 @@
+import re
+import unicodedata
+
+import fitz  # PyMuPDF
+
+# 一个“词”：可带前后标点的字母序列，或数字/日期/百分比等
+WORD_PATTERN = re.compile(r"^[\W_]*[^\W\d_]+(?:['’\-][^\W\d_]+)*[\W_]*$")
+NUMBER_PATTERN = re.compile(r"^[\W_]*[\d.,:/%+\-]+[\W_]*$")
+
+
+def _is_cjk(char):
+    return '\u3040' <= char <= '\u30ff' or '\u4e00' <= char <= '\u9fff' or '\uac00' <= char <= '\ud7a3'
+
+
+def _is_valid_char(char):
+    """可信字符：排除替换符、控制字符与私有区字符(字体编码损坏的典型表现)"""
+    if char == '\ufffd' or '\ue000' <= char <= '\uf8ff':
+        return False
+    return char.isspace() or unicodedata.category(char)[0] in "LNPSZ"
+
+
+class TextLayerExtractor:
+    """复用扫描件中已有的(通常不可见的)OCR文本层：质量可信时直接生成与OCR结果相同结构的数据"""
+
+    def __init__(self, config):
+        layer_cfg = config.get('text_layer', {})
+        self.enabled = layer_cfg.get('enabled', False)
+        self.min_chars = layer_cfg.get('min_chars', 20)  # 文本层至少包含的字符数
+        self.min_valid_ratio = layer_cfg.get('min_valid_ratio', 0.95)  # 可信字符占比下限
+        self.min_word_ratio = layer_cfg.get('min_word_ratio', 0.7)  # 合理词语占比下限
+        self.score = layer_cfg.get('score', 0.95)  # 写入rec_scores的置信度
+        self.dpi = config['processing']['dpi']
+
+    def assess(self, texts):
+        """评估文本层质量，返回统计信息及是否可用"""
+        chars = "".join(texts)
+        compact = [c for c in chars if not c.isspace()]
+        valid_ratio = sum(_is_valid_char(c) for c in compact) / len(compact) if compact else 0.0
+
+        tokens = [token for text in texts for token in text.split()]
+        plausible = 0
+        for token in tokens:
+            if any(_is_cjk(c) for c in token) or WORD_PATTERN.match(token) or NUMBER_PATTERN.match(token):
+                plausible += 1
+        word_ratio = plausible / len(tokens) if tokens else 0.0
+
+        usable = (len(compact) >= self.min_chars
+                  and valid_ratio >= self.min_valid_ratio
+                  and word_ratio >= self.min_word_ratio)
+        return {"chars": len(compact), "valid_ratio": round(valid_ratio, 3),
+                "word_ratio": round(word_ratio, 3), "usable": usable}
+
+    def extract(self, page):
+        """从页面文本层生成 rec_texts/rec_boxes 等结构(坐标为processing.dpi下的像素)，不可信时返回None"""
+        lines = []
+        for block in page.get_text("dict")["blocks"]:
+            if block.get("type") != 0:
+                continue
+            for line in block["lines"]:
+                text = "".join(span["text"] for span in line["spans"]).strip()
+                if text:
+                    lines.append((text, fitz.Rect(line["bbox"])))
+
+        quality = self.assess([text for text, _ in lines])
+        if not quality["usable"]:
+            return None
+
+        # 文本层坐标为未旋转的页面坐标，按页面旋转与DPI映射到栅格图像像素坐标
+        scale = self.dpi / 72
+        matrix = page.rotation_matrix * fitz.Matrix(scale, scale)
+        boxes = []
+        for _, rect in lines:
+            r = rect * matrix
+            boxes.append([round(r.x0), round(r.y0), round(r.x1), round(r.y1)])
+
+        polys = [[[b[0], b[1]], [b[2], b[1]], [b[2], b[3]], [b[0], b[3]]] for b in boxes]
+        return {
+            "rec_texts": [text for text, _ in lines],
+            "rec_scores": [self.score] * len(lines),
+            "rec_boxes": boxes,
+            "rec_polys": polys,
+            "dt_polys": polys,
+            "text_layer": {k: v for k, v in quality.items() if k != "usable"},
+        }
@@ -0,0 +1,14 @@
+import sys
+from core.distributed import run_worker
+
+
+def main(work_dir, worker_id=None):
+    """在任意能访问共享工作目录的主机上启动一个分布式工作进程"""
+    return run_worker(work_dir, worker_id)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法: python distributed_worker.py <共享工作目录> [工作进程ID]")
+        sys.exit(1)
+    main(*sys.argv[1:3])
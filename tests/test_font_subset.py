@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("fontTools")
+
+from core.font_subset import collect_glyphs, subset_document
+
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+]
+
+
+@pytest.fixture
+def inserted_font_pdf(tmp_path):
+    font = next((path for path in FONT_CANDIDATES if Path(path).exists()), None)
+    if font is None:
+        pytest.skip("没有可嵌入的TrueType字体")
+    path = tmp_path / "insert_font.pdf"
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_font(fontname="F0", fontfile=font)
+    page.insert_text((72, 72), "Hello subset world", fontname="F0", fontsize=12)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_collect_glyphs_matches_insert_font(inserted_font_pdf):
+    # get_fonts() 报告Type0名称，get_texttrace() 报告后代CIDFont名称，两者须按xref对应
+    with fitz.open(inserted_font_pdf) as doc:
+        glyphs = collect_glyphs(doc)
+    assert len(glyphs) == 1
+    assert len(next(iter(glyphs.values()))) == len(set("Hello subset world"))
+
+
+def test_subset_document_shrinks_insert_font(inserted_font_pdf):
+    before, after = subset_document(str(inserted_font_pdf))
+    assert after < before
+    with fitz.open(inserted_font_pdf) as doc:
+        assert doc[0].get_text().strip() == "Hello subset world"
@@ -0,0 +1,70 @@
+import base64
+
+import numpy as np
+from PIL import Image
+
+_DCT_CACHE = {}
+
+
+def _dct_matrix(size):
+    """构造DCT-II变换矩阵(按尺寸缓存)"""
+    if size not in _DCT_CACHE:
+        n = np.arange(size)
+        matrix = np.cos(np.pi * (2 * n[np.newaxis, :] + 1) * n[:, np.newaxis] / (2 * size))
+        matrix[0, :] *= 1 / np.sqrt(2)
+        _DCT_CACHE[size] = matrix * np.sqrt(2 / size)
+    return _DCT_CACHE[size]
+
+
+def phash(image, hash_size=8, highfreq_factor=4):
+    """计算图片的感知哈希(pHash)，返回64位整数"""
+    size = hash_size * highfreq_factor
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    small = image.convert('L').resize((size, size), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.float64)
+
+    matrix = _dct_matrix(size)
+    dct = matrix @ pixels @ matrix.T
+    low = dct[:hash_size, :hash_size]
+    bits = (low > np.median(low)).flatten()
+
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def phash_file(image_path, hash_size=8, highfreq_factor=4):
+    """计算图片文件的感知哈希，JPEG使用draft模式按比例解码以加速"""
+    size = hash_size * highfreq_factor
+    with Image.open(image_path) as img:
+        img.draft('L', (size * 4, size * 4))
+        return phash(img, hash_size, highfreq_factor)
+
+
+def block_signature(image, grid=64):
+    """页面的分块灰度签名：缩小为 grid x grid 的块均值，编码为base64字符串
+
+    用于确认感知哈希找到的候选页面：重复扫描的同一页面各块灰度只有轻微差异，
+    改动过几行文字的页面则有若干块差异明显。
+    """
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    blocks = image.convert('L').resize((grid, grid), Image.BOX)
+    return base64.b64encode(np.asarray(blocks, dtype=np.uint8).tobytes()).decode('ascii')
+
+
+def changed_blocks(a, b, tolerance):
+    """两个分块签名中灰度差超过tolerance的块数，签名尺寸不同时返回None"""
+    blocks_a = np.frombuffer(base64.b64decode(a), dtype=np.uint8)
+    blocks_b = np.frombuffer(base64.b64decode(b), dtype=np.uint8)
+    if blocks_a.shape != blocks_b.shape:
+        return None
+    diff = np.abs(blocks_a.astype(np.int16) - blocks_b.astype(np.int16))
+    return int(np.count_nonzero(diff > tolerance))
+
+
+def hamming_distance(a, b):
+    """两个哈希值之间的汉明距离"""
+    return bin(a ^ b).count('1')
@@ -0,0 +1,31 @@
+import fitz  # PyMuPDF
+import numpy as np
+
+
+def pixmap_to_array(pix):
+    """将fitz Pixmap转换为RGB格式的NumPy数组(H, W, 3)"""
+    array = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    if pix.n == 4:
+        array = array[:, :, :3]
+    elif pix.n == 1:
+        array = np.repeat(array, 3, axis=2)
+    return array
+
+
+def render_page(page, dpi, clip=None):
+    """按指定DPI栅格化页面(可选裁剪区域)，返回RGB数组"""
+    pix = page.get_pixmap(dpi=dpi, clip=clip, colorspace=fitz.csRGB, alpha=False)
+    return pixmap_to_array(pix)
+
+
+def to_builtin(value):
+    """将NumPy数组/标量递归转换为可JSON序列化的Python对象"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: to_builtin(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_builtin(v) for v in value]
+    return value
@@ -0,0 +1,312 @@
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+# 指标名称统一前缀
+METRIC_PREFIX = "pdf_translator"
+
+# API延迟直方图分桶(秒)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+
+# 报告中保留的原始延迟样本上限(用于计算分位数)
+MAX_SAMPLES = 10000
+
+
+def _label_key(labels):
+    """将标签字典转换为可哈希的有序元组"""
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key):
+    """将标签元组格式化为Prometheus标签字符串"""
+    if not key:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in key)
+    return "{" + inner + "}"
+
+
+def _quantile(samples, q):
+    """计算样本的分位数"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class MetricsCollector:
+    """流水线各阶段的结构化指标收集器(线程安全)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._server = None
+        self._stage_listeners = []  # 阶段计时的订阅者(如剖析器)，不随任务重置
+        self.reset()
+
+    def reset(self, job_name=None):
+        """开始新任务时清空所有指标"""
+        with self._lock:
+            self.job_name = job_name
+            self.started_at = time.time()
+            self.counters = defaultdict(float)
+            self.gauges = {}
+            self.gauge_peaks = {}
+            self.histograms = {}
+            self.samples = defaultdict(list)
+            self.page_stages = defaultdict(lambda: defaultdict(float))
+            self.stage_totals = defaultdict(float)
+
+    # ---------- 基础指标 ----------
+
+    def inc(self, name, value=1, **labels):
+        """累加计数器"""
+        with self._lock:
+            self.counters[(name, _label_key(labels))] += value
+
+    def set_gauge(self, name, value, **labels):
+        """设置瞬时值，同时记录峰值"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.gauges[key] = value
+            self.gauge_peaks[key] = max(value, self.gauge_peaks.get(key, value))
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """向直方图中记录一个观测值"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = {"buckets": tuple(buckets), "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+                self.histograms[key] = hist
+            for i, bound in enumerate(hist["buckets"]):
+                if value <= bound:
+                    hist["counts"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+            if len(self.samples[key]) < MAX_SAMPLES:
+                self.samples[key].append(value)
+
+    # ---------- 流水线专用指标 ----------
+
+    def record_stage(self, stage, seconds, page=None):
+        """记录某阶段耗时，page为None时表示文档级阶段"""
+        with self._lock:
+            self.stage_totals[stage] += seconds
+            if page is not None:
+                self.page_stages[int(page)][stage] += seconds
+        self.observe("stage_duration_seconds", seconds, stage=stage)
+        for listener in self._stage_listeners:
+            listener(stage, seconds, page)
+
+    def add_stage_listener(self, listener):
+        """订阅阶段计时，listener(stage, seconds, page)在每次 record_stage 后调用"""
+        self._stage_listeners.append(listener)
+
+    @contextmanager
+    def timer(self, stage, page=None):
+        """计时上下文管理器"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - start, page)
+
+    def record_api_call(self, service, seconds, status="ok"):
+        """记录一次API请求的延迟与结果
+
+        只有扫描件流程(ImageTranslator)自己发出的翻译请求会被计量；非扫描件流程的请求由pdf2zh内部发出，
+        不计入 api_* 指标，其耗时只体现在 stage.translate 等阶段耗时中。
+        """
+        self.observe("api_latency_seconds", seconds, service=service)
+        self.inc("api_requests_total", service=service, status=status)
+
+    def record_retry(self, service):
+        """记录一次API重试"""
+        self.inc("api_retries_total", service=service)
+
+    def record_usage(self, service, usage):
+        """从API响应的usage字段累加token用量"""
+        if not isinstance(usage, dict):
+            return
+        for field, value in usage.items():
+            if isinstance(value, (int, float)) and field.endswith("_tokens"):
+                self.inc("api_tokens_total", value, service=service, kind=field[:-len("_tokens")])
+        # DeepSeek返回上下文缓存命中情况
+        if "prompt_cache_hit_tokens" in usage or "prompt_cache_miss_tokens" in usage:
+            self.inc("cache_requests_total", usage.get("prompt_cache_hit_tokens", 0),
+                     cache="api_prompt", result="hit")
+            self.inc("cache_requests_total", usage.get("prompt_cache_miss_tokens", 0),
+                     cache="api_prompt", result="miss")
+
+    def record_cache(self, cache, hit):
+        """记录缓存命中或未命中"""
+        self.inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+    def set_queue_depth(self, queue, depth):
+        """记录队列深度"""
+        self.set_gauge("queue_depth", depth, queue=queue)
+
+    def peak_rss_bytes(self):
+        """当前进程的峰值常驻内存(字节)"""
+        if resource is None:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux返回KB，macOS返回字节
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    # ---------- 导出 ----------
+
+    def cache_hit_rates(self):
+        """按缓存名称汇总命中率"""
+        totals = defaultdict(lambda: {"hit": 0.0, "miss": 0.0})
+        with self._lock:
+            for (name, key), value in self.counters.items():
+                if name != "cache_requests_total":
+                    continue
+                labels = dict(key)
+                totals[labels["cache"]][labels["result"]] += value
+        return {
+            cache: {
+                "hit": counts["hit"],
+                "miss": counts["miss"],
+                "hit_rate": counts["hit"] / (counts["hit"] + counts["miss"]) if counts["hit"] + counts["miss"] else 0.0
+            }
+            for cache, counts in totals.items()
+        }
+
+    def to_prometheus(self):
+        """导出Prometheus文本格式"""
+        self.set_gauge("peak_rss_bytes", self.peak_rss_bytes())
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, key), value in sorted(self.counters.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} counter")
+                    seen.add(metric)
+                lines.append(f"{metric}{_format_labels(key)} {value}")
+
+            for (name, key), value in sorted(self.gauges.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} gauge")
+                    seen.add(metric)
+                lines.append(f"{metric}{_format_labels(key)} {value}")
+
+            for (name, key), hist in sorted(self.histograms.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} histogram")
+                    seen.add(metric)
+                for bound, count in zip(hist["buckets"], hist["counts"]):
+                    bucket_key = key + (("le", str(bound)),)
+                    lines.append(f"{metric}_bucket{_format_labels(bucket_key)} {count}")
+                lines.append(f"{metric}_bucket{_format_labels(key + (('le', '+Inf'),))} {hist['count']}")
+                lines.append(f"{metric}_sum{_format_labels(key)} {hist['sum']}")
+                lines.append(f"{metric}_count{_format_labels(key)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+    def to_report(self):
+        """导出单个任务的JSON报告"""
+        peak_rss = self.peak_rss_bytes()
+        with self._lock:
+            latencies = {}
+            for (name, key), hist in self.histograms.items():
+                if name != "api_latency_seconds":
+                    continue
+                samples = self.samples[(name, key)]
+                latencies[dict(key).get("service", "")] = {
+                    "count": hist["count"],
+                    "sum": round(hist["sum"], 4),
+                    "p50": round(_quantile(samples, 0.5), 4),
+                    "p95": round(_quantile(samples, 0.95), 4),
+                    "max": round(max(samples), 4) if samples else 0.0
+                }
+            counters = {}
+            for (name, key), value in self.counters.items():
+                label_str = _format_labels(key)
+                counters[f"{name}{label_str}"] = value
+            queue_peaks = {
+                dict(key).get("queue", ""): peak
+                for (name, key), peak in self.gauge_peaks.items() if name == "queue_depth"
+            }
+            report = {
+                "job": self.job_name,
+                "started_at": self.started_at,
+                "wall_seconds": round(time.time() - self.started_at, 3),
+                "stage_totals": {k: round(v, 4) for k, v in self.stage_totals.items()},
+                "pages": {
+                    str(page): {k: round(v, 4) for k, v in stages.items()}
+                    for page, stages in sorted(self.page_stages.items())
+                },
+                "api_latency": latencies,
+                "counters": counters,
+                "queue_depth_peaks": queue_peaks,
+                "peak_rss_bytes": peak_rss
+            }
+        report["cache_hit_rates"] = self.cache_hit_rates()
+        return report
+
+    def write_reports(self, config):
+        """将Prometheus文本文件和JSON报告写入配置的目录"""
+        metrics_cfg = config.get('metrics', {})
+        if not metrics_cfg.get('enabled', False):
+            return None
+
+        report_dir = Path(metrics_cfg.get('report_dir') or Path(config['output']['pdf_dir']) / "metrics")
+        report_dir.mkdir(parents=True, exist_ok=True)
+
+        job = self.job_name or "job"
+        report_path = report_dir / f"{job}_metrics.json"
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_report(), f, ensure_ascii=False, indent=2)
+
+        prom_path = report_dir / "metrics.prom"
+        tmp_path = prom_path.with_suffix(".prom.tmp")
+        tmp_path.write_text(self.to_prometheus(), encoding='utf-8')
+        tmp_path.replace(prom_path)  # 原子替换，便于node_exporter textfile采集
+
+        print(f"指标报告已保存至: {report_path}")
+        return str(report_path)
+
+    def start_http_server(self, port, host="0.0.0.0"):
+        """在后台线程中启动Prometheus文本端点"""
+        if self._server is not None:
+            return self._server
+        collector = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = collector.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 不在控制台输出访问日志
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+        print(f"Prometheus指标端点: http://{host}:{port}/metrics")
+        return self._server
+
+
+# 进程内共享的指标实例
+metrics = MetricsCollector()
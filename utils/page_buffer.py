@@ -0,0 +1,185 @@
+import mmap
+import os
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+
+class PageHandle(NamedTuple):
+    """跨进程传递的页面缓冲区句柄，只包含名称、形状与数据类型，不含像素数据"""
+    name: str
+    shape: tuple
+    dtype: str
+    backend: str
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+
+
+def _open_mapping(handle, create=False, size=0):
+    """打开(或创建)句柄对应的共享内存/内存映射文件，返回 (映射对象, 可写缓冲区)"""
+    if handle.backend == "shm":
+        from multiprocessing import shared_memory
+        if create:
+            shm = shared_memory.SharedMemory(name=handle.name, create=True, size=size)
+        else:
+            try:
+                # Python 3.13+ 可关闭非创建进程的资源跟踪，避免退出时误删共享内存
+                shm = shared_memory.SharedMemory(name=handle.name, track=False)
+            except TypeError:
+                shm = shared_memory.SharedMemory(name=handle.name)
+        return shm, shm.buf
+
+    with open(handle.name, 'w+b' if create else 'r+b') as f:
+        if create:
+            f.truncate(size)
+        mm = mmap.mmap(f.fileno(), 0)
+    return mm, mm
+
+
+def _close_mapping(mapping):
+    try:
+        mapping.close()
+    except BufferError:
+        # 仍有数组引用该缓冲区时交由垃圾回收释放
+        pass
+
+
+@contextmanager
+def open_buffer(handle):
+    """在任意进程中以零拷贝方式访问句柄对应的数组(用于工作进程写入或读取)"""
+    mapping, buf = _open_mapping(handle)
+    try:
+        yield np.ndarray(handle.shape, dtype=handle.dtype, buffer=buf)
+    finally:
+        del buf
+        _close_mapping(mapping)
+
+
+def load_image_into(image_path, handle):
+    """工作进程函数：将图片解码为RGB后写入共享缓冲区"""
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        pixels = np.asarray(img.convert('RGB'))
+    if pixels.shape != tuple(handle.shape):
+        raise ValueError(f"图片尺寸 {pixels.shape} 与缓冲区 {handle.shape} 不一致: {image_path}")
+    with open_buffer(handle) as view:
+        np.copyto(view, pixels)
+        del view  # 关闭映射前释放数组引用
+    return handle
+
+
+class _Buffer:
+    def __init__(self, name, capacity, mapping, buf):
+        self.name = name
+        self.capacity = capacity
+        self.mapping = mapping
+        self.buf = buf
+        self.refs = 0
+
+
+class PageBufferPool:
+    """页面像素缓冲池：在共享内存或暂存目录下的内存映射文件中分配，按引用计数回收并复用
+
+    进程之间只传递PageHandle，由创建缓冲池的进程负责分配、复用与最终释放。
+    """
+
+    def __init__(self, config):
+        buf_cfg = config.get('page_buffers', {})
+        self.backend = buf_cfg.get('backend', 'mmap')  # mmap 或 shm
+        self.max_free = buf_cfg.get('max_free_buffers', 4)  # 保留待复用的空闲缓冲区数
+        scratch = buf_cfg.get('scratch_dir') or ('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+        self.scratch_dir = Path(scratch)
+        self._lock = threading.Lock()
+        self._buffers = {}  # 名称 -> _Buffer
+        self._free = []  # 空闲缓冲区名称
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _new_name(self):
+        token = f"pagebuf_{os.getpid()}_{uuid.uuid4().hex[:12]}"
+        if self.backend == "shm":
+            return token
+        self.scratch_dir.mkdir(parents=True, exist_ok=True)
+        return str(self.scratch_dir / f"{token}.buf")
+
+    def acquire(self, shape, dtype=np.uint8):
+        """分配(或复用)能容纳指定形状数组的缓冲区，返回引用计数为1的句柄"""
+        shape = tuple(int(v) for v in shape)
+        dtype = np.dtype(dtype).str
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+        with self._lock:
+            # 复用容量足够且不超过需求两倍的空闲缓冲区，避免小页面占用大缓冲区
+            for name in self._free:
+                buffer = self._buffers[name]
+                if nbytes <= buffer.capacity <= max(nbytes * 2, 1):
+                    self._free.remove(name)
+                    buffer.refs = 1
+                    return PageHandle(name, shape, dtype, self.backend)
+
+            name = self._new_name()
+            handle = PageHandle(name, shape, dtype, self.backend)
+            mapping, buf = _open_mapping(handle, create=True, size=max(nbytes, 1))
+            buffer = _Buffer(name, max(nbytes, 1), mapping, buf)
+            buffer.refs = 1
+            self._buffers[name] = buffer
+            return handle
+
+    def array(self, handle):
+        """在本进程中获取句柄对应的数组视图(零拷贝)"""
+        buffer = self._buffers[handle.name]
+        return np.ndarray(handle.shape, dtype=handle.dtype, buffer=buffer.buf)
+
+    def retain(self, handle):
+        with self._lock:
+            self._buffers[handle.name].refs += 1
+
+    def release(self, handle):
+        """引用计数归零时放回空闲列表，空闲列表已满则直接释放"""
+        with self._lock:
+            buffer = self._buffers.get(handle.name)
+            if buffer is None:
+                return
+            buffer.refs -= 1
+            if buffer.refs > 0:
+                return
+            if len(self._free) < self.max_free:
+                self._free.append(handle.name)
+            else:
+                self._destroy(buffer)
+
+    def _destroy(self, buffer):
+        self._buffers.pop(buffer.name, None)
+        if buffer.name in self._free:
+            self._free.remove(buffer.name)
+        buffer.buf = None
+        _close_mapping(buffer.mapping)
+        if self.backend == "shm":
+            try:
+                buffer.mapping.unlink()
+            except FileNotFoundError:
+                pass
+        else:
+            try:
+                os.remove(buffer.name)
+            except OSError:
+                pass
+
+    def close(self):
+        """释放全部缓冲区"""
+        with self._lock:
+            for buffer in list(self._buffers.values()):
+                self._destroy(buffer)
+            self._free.clear()
@@ -0,0 +1,197 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+from utils.metrics import metrics
+
+# 环境变量优先于配置：1/timers 只计时，cprofile 或 sampling 同时采集整个任务的剖析数据
+PROFILE_ENV = "PDF_TRANSLATOR_PROFILE"
+MODES = ("timers", "cprofile", "sampling")
+
+
+class _Sampler:
+    """采样剖析：后台线程定时抓取全部线程的调用栈，按折叠栈格式输出(flamegraph.pl、speedscope可直接读取)"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{Path(code.co_filename).stem}:{code.co_name}:{code.co_firstlineno}")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """可选的热点剖析：阶段与热点函数计时，以及整个任务的cProfile/采样剖析
+
+    未启用时计时器只做一次布尔判断。cProfile只覆盖调用run的主线程，
+    采样模式覆盖进程内全部线程；spawn出的子进程均不在剖析范围内。
+    已由 metrics.timer 计时的代码块不再嵌套 timed：剖析器订阅指标的阶段计时，
+    文档级阶段记为 "stage.<阶段>"，逐页阶段记为 "page.<阶段>"；扫描件流程的整个步骤记为 "step.<步骤>"。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.mode = None
+        self.timings = {}  # 名称 -> [调用次数, 累计秒数, 最大秒数]
+        metrics.add_stage_listener(self._on_stage)
+
+    def configure(self, config):
+        """按配置与环境变量决定是否启用，每个任务开始时调用"""
+        prof_cfg = config.get('profiling', {})
+        env = os.environ.get(PROFILE_ENV, "").strip().lower()
+        if env in MODES:
+            mode = env
+        elif env in ("1", "true", "yes", "on"):
+            mode = prof_cfg.get('mode', 'timers')
+        elif prof_cfg.get('enabled', False):
+            mode = prof_cfg.get('mode', 'timers')
+        else:
+            mode = None
+        if mode is not None and mode not in MODES:
+            print(f"未知的剖析模式 {mode}，改为只计时")
+            mode = "timers"
+
+        self.enabled = mode is not None
+        self.mode = mode
+        self.sample_interval = prof_cfg.get('sample_interval', 0.005)
+        metrics_cfg = config.get('metrics', {})
+        self.output_dir = Path(prof_cfg.get('output_dir') or metrics_cfg.get('report_dir')
+                               or Path(config['output']['pdf_dir']) / "metrics")
+        with self._lock:
+            self.timings = {}
+        return self
+
+    def record(self, name, seconds):
+        with self._lock:
+            entry = self.timings.get(name)
+            if entry is None:
+                self.timings[name] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                if seconds > entry[2]:
+                    entry[2] = seconds
+
+    def _on_stage(self, stage, seconds, page):
+        if self.enabled:
+            self.record(f"{'stage' if page is None else 'page'}.{stage}", seconds)
+
+    @contextmanager
+    def timed(self, name):
+        """计时上下文管理器，嵌套计时为包含子调用的时间"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    @contextmanager
+    def capture(self, job_name):
+        """剖析整个任务，结束时写出计时报告及pstats/折叠栈文件"""
+        if not self.enabled:
+            yield
+            return
+
+        profile = cProfile.Profile() if self.mode == "cprofile" else None
+        sampler = _Sampler(self.sample_interval) if self.mode == "sampling" else None
+        if profile is not None:
+            profile.enable()
+        if sampler is not None:
+            sampler.start()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            if sampler is not None:
+                sampler.stop()
+            self._write(job_name or "job", profile, sampler)
+
+    def report(self):
+        with self._lock:
+            items = sorted(self.timings.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            name: {"calls": count, "total": round(total, 4), "mean": round(total / count, 6), "max": round(peak, 4)}
+            for name, (count, total, peak) in items
+        }
+
+    def _write(self, job, profile, sampler):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        report = self.report()
+        for name, entry in report.items():
+            # 计时结果同时进入指标报告与Prometheus输出
+            metrics.inc("profile_seconds_total", entry["total"], section=name)
+            metrics.inc("profile_calls_total", entry["calls"], section=name)
+
+        timings_path = self.output_dir / f"{job}_profile.json"
+        with open(timings_path, 'w', encoding='utf-8') as f:
+            json.dump({"job": job, "mode": self.mode, "timings": report}, f, ensure_ascii=False, indent=2)
+        print(f"剖析计时已保存至: {timings_path}")
+
+        if profile is not None:
+            stats_path = self.output_dir / f"{job}.pstats"
+            profile.dump_stats(str(stats_path))
+            print(f"cProfile数据已保存至: {stats_path} (可用 snakeviz 或 pstats 查看)")
+        if sampler is not None:
+            folded_path = self.output_dir / f"{job}.folded"
+            sampler.write(folded_path)
+            print(f"采样折叠栈已保存至: {folded_path} (可用 flamegraph.pl 或 speedscope 查看)")
+
+
+def profiled(name):
+    """热点函数计时装饰器"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+# 进程内共享的剖析器实例
+profiler = Profiler()
@@ -0,0 +1,99 @@
+import math
+import os
+from pathlib import Path
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+# cgroup v1 未设置内存上限时返回接近 2^63 的值
+_UNLIMITED = 1 << 60
+
+
+def _read(path):
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return None
+
+
+def cpu_quota():
+    """cgroup限制的CPU核数(可为小数)，未限制时返回None"""
+    # cgroup v2: "配额 周期" 或 "max 周期"
+    value = _read(CGROUP_ROOT / "cpu.max")
+    if value:
+        parts = value.split()
+        if parts[0] != "max" and len(parts) == 2:
+            return int(parts[0]) / int(parts[1])
+        return None
+    # cgroup v1
+    quota = _read(CGROUP_ROOT / "cpu" / "cpu.cfs_quota_us") or _read(CGROUP_ROOT / "cpu,cpuacct" / "cpu.cfs_quota_us")
+    period = _read(CGROUP_ROOT / "cpu" / "cpu.cfs_period_us") or _read(CGROUP_ROOT / "cpu,cpuacct" / "cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def affinity_cpus():
+    """进程可调度的CPU核数(taskset/cpuset限制)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def available_cpus():
+    """进程实际可用的CPU核数：取CPU亲和性与cgroup配额中的较小值
+
+    os.cpu_count() 返回宿主机的核数，容器中按它启动进程池会因配额节流反而变慢。
+    """
+    cpus = affinity_cpus()
+    quota = cpu_quota()
+    if quota:
+        cpus = min(cpus, max(1, math.floor(quota)))
+    return cpus
+
+
+def memory_limit():
+    """cgroup内存上限(字节)，未限制时返回None"""
+    value = _read(CGROUP_ROOT / "memory.max") or _read(CGROUP_ROOT / "memory" / "memory.limit_in_bytes")
+    if not value or value == "max" or int(value) >= _UNLIMITED:
+        return None
+    return int(value)
+
+
+def _cgroup_memory_usage():
+    value = _read(CGROUP_ROOT / "memory.current") or _read(CGROUP_ROOT / "memory" / "memory.usage_in_bytes")
+    return int(value) if value else 0
+
+
+def _host_available_memory():
+    """宿主机可用内存(/proc/meminfo的MemAvailable)，无法读取时返回物理内存总量"""
+    meminfo = _read("/proc/meminfo")
+    if meminfo:
+        for line in meminfo.splitlines():
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) * 1024
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def available_memory():
+    """本进程还能使用的内存(字节)：cgroup剩余额度与宿主机可用内存中的较小值，无法确定时返回None"""
+    candidates = [_host_available_memory()]
+    limit = memory_limit()
+    if limit is not None:
+        candidates.append(max(0, limit - _cgroup_memory_usage()))
+    candidates = [value for value in candidates if value is not None]
+    return min(candidates) if candidates else None
+
+
+def describe():
+    """资源探测结果(写入调优报告)"""
+    return {
+        "cpu_count": os.cpu_count(),
+        "affinity_cpus": affinity_cpus(),
+        "cpu_quota": cpu_quota(),
+        "available_cpus": available_cpus(),
+        "memory_limit": memory_limit(),
+        "available_memory": available_memory(),
+    }